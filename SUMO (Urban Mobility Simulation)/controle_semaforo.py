@@ -13,6 +13,10 @@ if 'SUMO_HOME' in os.environ:
 else:
     sys.exit("ERRO: A variável de ambiente SUMO_HOME não está definida.")
 
+# Escritor de telemetria partilhado com o TCC_SUMO (tcc_sumo.simulation.telemetry).
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "TCC_SUMO", "src"))
+from tcc_sumo.simulation.telemetry import TelemetryWriter
+
 # --- Constantes e Configurações ---
 SUMO_CONFIG_FILE = "grid.sumocfg"
 SUMO_BINARY = "sumo-gui"
@@ -39,9 +43,19 @@ PHASE_MAP = {
     }
 }
 
+# --- Telemetria em segundo plano ---
+TELEMETRY_QUEUE_SIZE = 1000
+TELEMETRY_BATCH_SIZE = 32
+TELEMETRY_POLICY = "block"  # o JSONL é o único registo persistido: espera por espaço na fila em vez de descartar
+
 # Estrutura para Manter o Estado dos Semáforos
 tls_states = {}
 
+def read_telemetry(path):
+    """Lê os registos JSONL gravados pelo TelemetryWriter."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
 def get_queue_length(lanes):
     """Calcula o total de veículos parados em uma lista de faixas."""
     total_queue = 0
@@ -132,7 +146,15 @@ def run_simulation(mode):
 
     initialize_tls_states()
     step = 0
-    simulation_data = []
+    output_dir = "dashboard_output"
+    os.makedirs(output_dir, exist_ok=True)
+    # Os registos de cada 60s vão para um JSONL escrito por um thread em segundo plano.
+    telemetry_path = os.path.join(output_dir, "simulation_dashboard_data.jsonl")
+    # O escritor acrescenta ao ficheiro; cada execução começa com um JSONL vazio.
+    open(telemetry_path, "w", encoding="utf-8").close()
+    telemetry = TelemetryWriter(telemetry_path, queue_size=TELEMETRY_QUEUE_SIZE,
+                                batch_size=TELEMETRY_BATCH_SIZE, policy=TELEMETRY_POLICY)
+    telemetry.start()
     
     # <--- NOVO: Loop de simulação interativo ---
     try:
@@ -177,7 +199,7 @@ def run_simulation(mode):
                             "Oeste": {"stopped_vehicles": 0}
                         }
                     }
-                    simulation_data.append(step_data)
+                    telemetry.emit(step_data)
                 
                 step += 1
 
@@ -201,13 +223,12 @@ def run_simulation(mode):
         # Garante que a conexão seja fechada e os dados salvos
         traci.close()
         print("\nConexao com o SUMO fechada.")
-        
-        output_dir = "dashboard_output"
-        os.makedirs(output_dir, exist_ok=True)
-        data_file_path = os.path.join(output_dir, "simulation_dashboard_data.json") 
-        
+        telemetry.close()
+
+        # O dashboard continua a ler a lista JSON completa, reconstruída a partir do JSONL.
+        data_file_path = os.path.join(output_dir, "simulation_dashboard_data.json")
         with open(data_file_path, "w", encoding="utf-8") as f:
-            json.dump(simulation_data, f, indent=4)
+            json.dump(read_telemetry(telemetry_path), f, indent=4)
         print(f"Dados finais da simulacao salvos em: {data_file_path}")
 
 
@@ -2,6 +2,7 @@ import json
 import pandas as pd
 import matplotlib.pyplot as plt
 import os
+import sys
 import xml.etree.ElementTree as ET
 import webbrowser
 import pathlib
@@ -12,6 +13,14 @@ import numpy as np
 from matplotlib.ticker import MaxNLocator
 from scipy.ndimage import gaussian_filter1d
 
+# Leitura dos outputs pela cache colunar do TCC_SUMO (tcc_sumo.tools.output_cache):
+# depois da primeira leitura, o XML deixa de ser relido. Sem o pacote, lê-se o XML.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "TCC_SUMO", "src"))
+try:
+    from tcc_sumo.tools.output_cache import load_output
+except ImportError:
+    load_output = None
+
 # --- Constantes ---
 OUTPUT_DIR = "dashboard_output_final"
 SIM_DATA_JSON = os.path.join("dashboard_output", "simulation_dashboard_data.json")
@@ -65,6 +74,16 @@ REGIONS = ["Norte", "Sul", "Leste", "Oeste"]
 def parse_tripinfo(tripinfo_file_path):
     """Analisa o arquivo tripinfo.xml para obter dados de tempo perdido por viagem"""
     time_loss_data = []
+    if load_output is not None:
+        try:
+            trips = load_output(tripinfo_file_path, "tripinfo", ["depart", "timeLoss"])
+            return pd.DataFrame({"depart_time": trips["depart"], "time_loss_min": trips["timeLoss"] / 60.0})
+        except FileNotFoundError:
+            print(f"AVISO: Arquivo tripinfo '{tripinfo_file_path}' não encontrado.")
+            return pd.DataFrame()
+        except ET.ParseError as e:
+            print(f"ERRO ao analisar '{tripinfo_file_path}': {e}")
+            return pd.DataFrame()
     try:
         if not os.path.exists(tripinfo_file_path):
             print(f"AVISO: Arquivo tripinfo '{tripinfo_file_path}' não encontrado.")
@@ -98,6 +117,17 @@ def parse_tripinfo(tripinfo_file_path):
 def parse_emissions(emission_file_path):
     co2_by_step_dict = {}
     total_co2_emitted_simulation = 0
+    if load_output is not None:
+        try:
+            emissions = load_output(emission_file_path, "emissions", ["time", "CO2"])
+            co2_by_step = emissions.groupby("time")["CO2"].sum()
+            return co2_by_step.to_dict(), float(co2_by_step.sum())
+        except FileNotFoundError:
+            print(f"AVISO: Arquivo de emissões '{emission_file_path}' não encontrado.")
+            return {}, 0
+        except ET.ParseError:
+            print(f"AVISO: Erro ao analisar '{emission_file_path}'. Métricas de CO2 podem estar incompletas.")
+            return {}, 0
     try:
         if not os.path.exists(emission_file_path):
             print(f"AVISO: Arquivo de emissões '{emission_file_path}' não encontrado.")
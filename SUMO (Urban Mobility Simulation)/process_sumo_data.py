@@ -2,36 +2,35 @@ import json
 import pandas as pd
 import matplotlib.pyplot as plt
 import os
+import sys
 import xml.etree.ElementTree as ET # Para ler o emission.xml
 
+# Leitura dos outputs pela cache colunar do TCC_SUMO (tcc_sumo.tools.output_cache):
+# depois da primeira leitura, o XML deixa de ser relido. Sem o pacote, lê-se o XML.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "TCC_SUMO", "src"))
+try:
+    from tcc_sumo.tools.output_cache import load_output
+except ImportError:
+    load_output = None
+
 DATA_FILE = os.path.join("dashboard_output", "simulation_dashboard_data.json")
 EMISSION_FILE = "emission.xml" # Gerado pela simulação
 TRIPINFO_FILE = "tripinfo.xml" # Gerado pela simulação
 OUTPUT_DIR = "dashboard_output"
 
 def parse_emissions(emission_file):
-    """Analisa o arquivo de emissões para obter CO2 total por intervalo."""
+    """Analisa o arquivo de emissões para obter CO2 total (mg) por intervalo."""
     co2_data = {} # step -> total_co2_at_step
     try:
+        if load_output is not None:
+            emissions = load_output(emission_file, "emissions", ["time", "CO2"])
+            return emissions.groupby("time")["CO2"].sum().to_dict()
         tree = ET.parse(emission_file)
         root = tree.getroot()
         for timestep in root.findall('timestep'):
             time = float(timestep.get('time'))
-            # Coleta CO2 de todos os veículos naquele timestep
-            # A estrutura pode variar um pouco dependendo da versão do SUMO e das opções de saída
-            # Este é um exemplo genérico. Pode ser necessário ajustar para CO2_abs ou similar.
-            # Para este exemplo, vamos apenas contar o número de entradas de emissão como proxy
-            # ou somar um atributo específico se conhecido.
-            # Se você tem CO2_abs:
-            # current_co2 = sum(float(vehicle.get('CO2_abs', 0)) for vehicle in timestep.findall('vehicle'))
-            # Por simplicidade, vamos apenas verificar se há dados de emissão.
-            # Para um cálculo real de CO2, você precisaria garantir que 'CO2_abs' ou similar está no output.
-            # Aqui, vamos simular um aumento de CO2 para demonstração.
-            # Em uma implementação real, você extrairia o valor real de CO2.
-            if time not in co2_data:
-                co2_data[time] = 0
-            # Exemplo simulado:
-            co2_data[time] += random.uniform(50, 200) * len(timestep.findall('vehicle')) # Simulação de valor de CO2
+            # Soma o CO2 (mg) emitido por todos os veículos naquele timestep
+            co2_data[time] = co2_data.get(time, 0) + sum(float(vehicle.get('CO2', 0)) for vehicle in timestep.findall('vehicle'))
     except FileNotFoundError:
         print(f"Arquivo de emissões '{emission_file}' não encontrado.")
     except ET.ParseError:
@@ -44,6 +43,11 @@ def parse_tripinfo(tripinfo_file):
     total_time_loss = 0
     num_trips = 0
     try:
+        if load_output is not None:
+            trips = load_output(tripinfo_file, "tripinfo", ["duration", "timeLoss"])
+            num_trips = len(trips)
+            total_duration, total_time_loss = float(trips["duration"].sum()), float(trips["timeLoss"].sum())
+            return (total_duration / num_trips, total_time_loss / num_trips, num_trips) if num_trips else (0, 0, 0)
         tree = ET.parse(tripinfo_file)
         root = tree.getroot()
         for tripinfo in root.findall('tripinfo'):
@@ -194,9 +198,9 @@ def main():
 
         plt.figure(figsize=(10, 5))
         plt.plot(df["step"], df["co2_simulated"].cumsum(), marker='.', linestyle='-', color='brown')
-        plt.title("Emissão de CO2 (Simulada) Acumulada")
+        plt.title("Emissão de CO2 Acumulada")
         plt.xlabel("Passo da Simulação (s)")
-        plt.ylabel("CO2 (Simulado) Acumulado")
+        plt.ylabel("CO2 Acumulado (mg)")
         plt.grid(True)
         chart_path = os.path.join(OUTPUT_DIR, "co2_over_time.png")
         plt.savefig(chart_path)
@@ -15,8 +15,7 @@ import yaml
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '.')))
 
-from tcc_sumo.simulation.manager import SimulationManager
-from tcc_sumo.utils.helpers import task_start, task_success, task_fail, setup_logging
+from tcc_sumo.utils.helpers import task_start, task_success, task_fail, setup_logging, select_traci_backend
 
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 
@@ -45,6 +44,7 @@ def main():
     parser = argparse.ArgumentParser(description="Executa uma simulação de tráfego com SUMO.")
     parser.add_argument('--scenario', type=str, required=True, choices=['osm', 'api'], help="Cenário a ser executado.")
     parser.add_argument('--mode', type=str, required=True, choices=['STATIC', 'ADAPTIVE'], help="Modo de controlo dos semáforos.")
+    parser.add_argument('--resume', action='store_true', help="Retoma a simulação a partir do último checkpoint gravado.")
     args = parser.parse_args()
 
     os.chdir(PROJECT_ROOT)
@@ -54,7 +54,11 @@ def main():
     try:
         config_path = os.path.join(PROJECT_ROOT, 'config/config.yaml')
         config = load_configuration(config_path)
-        manager = SimulationManager(config=config, scenario_name=args.scenario, mode_name=args.mode)
+        # O backend TraCI (socket ou libsumo) tem de ser fixado antes do primeiro
+        # `import traci`, por isso o SimulationManager só é importado aqui.
+        select_traci_backend(config.get('traci_backend', 'socket'), config.get('sumo_executable', 'sumo-gui'))
+        from tcc_sumo.simulation.manager import SimulationManager
+        manager = SimulationManager(config=config, scenario_name=args.scenario, mode_name=args.mode, resume=args.resume)
         manager.run()
     except FileNotFoundError:
         logger.critical("Execução interrompida: arquivo de configuração não encontrado.")
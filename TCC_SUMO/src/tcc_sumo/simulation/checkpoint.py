@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de checkpoints periódicos da simulação, permitindo retomar execuções longas.
+
+PILAR DE QUALIDADE: Fiabilidade
+DESCRIÇÃO: Uma simulação de horas (ex.: 75k veículos sem teletransporte) não deve
+perder todo o progresso por uma falha ou um CTRL+C. Em intervalos configuráveis,
+o estado do SUMO é gravado com `saveState` e o estado interno do controlador
+(fases, último passo de troca, contador de passos) num JSON ao lado. Ao retomar,
+o SUMO arranca já com o estado gravado ('--load-state'), os outputs XML parciais
+são cortados no instante do checkpoint e, no fim, juntos com os outputs da
+execução retomada, para que a análise veja uma única execução.
+
+A retoma é aproximada, não idêntica: mesmo com os geradores aleatórios gravados,
+o estado do SUMO não inclui tudo (ex.: os dispositivos de emissões por veículo e
+parte do estado dos veículos a atravessar cruzamentos), pelo que as viagens que
+terminam depois do checkpoint divergem ligeiramente das de uma execução sem
+interrupção (ver tools/resume_check.py).
+"""
+import csv
+import gzip
+import json
+import os
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import traci
+
+from tcc_sumo.tools.output_formats import OUTPUT_FORMATS, OUTPUT_KINDS, open_output
+from tcc_sumo.utils.helpers import get_logger
+
+logger = get_logger("Checkpoint")
+
+# (elemento raiz, elemento cortado no instante do checkpoint, atributo de tempo) de
+# cada output do SUMO. Nos CSV, o tempo está na coluna '<elemento>_<atributo>'.
+RESUME_LAYOUT = {
+    "tripinfo": ("tripinfos", "tripinfo", "arrival"),
+    "emissions": ("emission-export", "timestep", "time"),
+    "queueinfo": ("queue-export", "data", "timestep"),
+}
+PREFIX_SUFFIX = ".before_resume"
+# Opções do SUMO para os estados gravados: geradores aleatórios e valores internos
+# (posições, velocidades) sem o arredondamento a 2 casas decimais por omissão.
+SAVE_STATE_ARGS = ["--save-state.rng", "--save-state.precision", "8"]
+
+class CheckpointManager:
+    """
+    Grava, lista e restaura checkpoints de uma simulação num diretório próprio.
+    """
+    def __init__(self, directory: Path, interval_steps: int, keep: int = 2):
+        self.directory = Path(directory)
+        self.interval_steps = interval_steps
+        self.keep = max(1, keep)
+        self.saved_count = 0
+        self.total_cost_s = 0.0
+        self.last_cost_s = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval_steps > 0
+
+    def next_checkpoint_step(self, step: int) -> int | None:
+        """Próximo passo (>= `step`) em que um checkpoint deve ser gravado."""
+        if not self.enabled:
+            return None
+        return max(self.interval_steps, -(-step // self.interval_steps) * self.interval_steps)
+
+    def save(self, step: int, state: dict) -> None:
+        """Grava o estado do SUMO e do controlador referente ao fim do passo `step`."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        started = time.perf_counter()
+        state_file = self.directory / f"state_{step:09d}.xml.gz"
+        traci.simulation.saveState(str(state_file.resolve()))
+        metadata = {"step": step, "sim_time": traci.simulation.getTime(), "state_file": state_file.name, **state}
+        # O JSON é escrito por último e de forma atómica: a sua presença marca o checkpoint como completo.
+        json_file = self.directory / f"state_{step:09d}.json"
+        tmp_file = json_file.with_suffix(".json.tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f)
+        os.replace(tmp_file, json_file)
+        self.last_cost_s = time.perf_counter() - started
+        self.total_cost_s += self.last_cost_s
+        self.saved_count += 1
+        logger.info(f"Checkpoint gravado no passo {step} em {self.last_cost_s:.2f}s "
+                    f"({state_file.stat().st_size / 1e6:.1f} MB, intervalo de {self.interval_steps} passos).")
+        self._prune()
+
+    def _prune(self) -> None:
+        """Mantém apenas os `keep` checkpoints mais recentes."""
+        for json_file in sorted(self.directory.glob("state_*.json"))[:-self.keep]:
+            (self.directory / json_file.name.replace(".json", ".xml.gz")).unlink(missing_ok=True)
+            json_file.unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        """Remove todos os checkpoints (usado quando a simulação termina normalmente)."""
+        for path in self.directory.glob("state_*"):
+            path.unlink(missing_ok=True)
+
+    def latest(self) -> dict | None:
+        """Devolve os metadados do checkpoint completo mais recente, ou None."""
+        for json_file in sorted(self.directory.glob("state_*.json"), reverse=True):
+            with open(json_file, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+            if (self.directory / metadata["state_file"]).is_file():
+                return metadata
+        return None
+
+    def sumo_args(self, resume_from: dict | None = None) -> list:
+        """
+        Opções do SUMO para gravar checkpoints e, com `resume_from`, para arrancar no seu estado.
+
+        O estado é carregado no arranque ('--load-state') e não com loadState por
+        TraCI: só assim o SUMO ignora, nos ficheiros de rotas, os veículos que já
+        tinham partido antes do checkpoint, em vez de os voltar a inserir.
+        """
+        args = list(SAVE_STATE_ARGS) if self.enabled or resume_from else []
+        if resume_from:
+            args += ["--load-state", str((self.directory / resume_from["state_file"]).resolve())]
+        return args
+
+    def summary(self, wall_time_s: float) -> str:
+        """Resumo do custo dos checkpoints para afinar o intervalo."""
+        if not self.saved_count:
+            return "Nenhum checkpoint gravado."
+        overhead = (self.total_cost_s / wall_time_s * 100) if wall_time_s > 0 else 0.0
+        return (f"{self.saved_count} checkpoints a cada {self.interval_steps} passos: "
+                f"{self.total_cost_s:.2f}s no total, {self.total_cost_s / self.saved_count:.2f}s em média "
+                f"({overhead:.1f}% do tempo de simulação).")
+
+def _resume_files(output_dir: Path):
+    """(tipo, formato, output atual, prefixo) de cada output presente em `output_dir`."""
+    for kind, (_, base_name, _) in OUTPUT_KINDS.items():
+        for output_format in OUTPUT_FORMATS:
+            current = output_dir / f"{base_name}.{output_format}"
+            prefix = output_dir / f"{base_name}{PREFIX_SUFFIX}.{output_format}"
+            if current.is_file() or prefix.is_file():
+                yield kind, output_format, current, prefix
+
+def _open_text(path: Path, mode: str, output_format: str):
+    """Abre um output em modo texto, comprimindo/descomprimindo nos formatos '.gz'."""
+    if output_format.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8", newline="")
+
+def _iter_records(path: Path, record_tag: str, output_format: str):
+    """
+    Percorre os registos de um output, tolerando um ficheiro truncado por uma falha.
+
+    Em XML devolve os elementos `record_tag`; em CSV devolve (cabeçalho, linha).
+    """
+    try:
+        if output_format.startswith("csv"):
+            with _open_text(path, "r", output_format) as f:
+                reader = csv.reader(f, delimiter=";")
+                header = next(reader, None)
+                for row in reader:
+                    yield header, row
+        else:
+            with open_output(path) as f:
+                for _, elem in ET.iterparse(f):
+                    if elem.tag == record_tag:
+                        yield elem
+                        elem.clear()
+    except (ET.ParseError, csv.Error, EOFError, gzip.BadGzipFile) as e:
+        logger.warning(f"Output '{path.name}' truncado ({e}); a usar os registos lidos até aí.")
+
+def _write_records(out_path: Path, kind: str, output_format: str, sources: list, sim_time: float | None = None):
+    """
+    Escreve em `out_path` os registos das `sources`, pela ordem, no formato do output.
+
+    Com `sim_time`, só ficam os registos anteriores a esse instante. Devolve o
+    número de registos escritos e o instante do último.
+    """
+    root_tag, record_tag, time_attr = RESUME_LAYOUT[kind]
+    kept, last_time = 0, None
+    with _open_text(out_path, "w", output_format) as out:
+        if output_format.startswith("csv"):
+            writer, time_index = csv.writer(out, delimiter=";", lineterminator="\n"), None
+            for header, row in (record for source in sources for record in _iter_records(source, record_tag, output_format)):
+                if time_index is None:
+                    writer.writerow(header)
+                    time_index = header.index(f"{record_tag}_{time_attr}")
+                record_time = float(row[time_index] or 0)
+                if sim_time is None or record_time < sim_time:
+                    writer.writerow(row)
+                    kept += 1
+                    last_time = record_time
+        else:
+            out.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<{root_tag}>\n')
+            for source in sources:
+                for elem in _iter_records(source, record_tag, output_format):
+                    record_time = float(elem.get(time_attr, 0))
+                    if sim_time is None or record_time < sim_time:
+                        out.write(ET.tostring(elem, encoding='unicode'))
+                        kept += 1
+                        last_time = record_time
+            out.write(f'</{root_tag}>\n')
+    return kept, last_time
+
+def prepare_outputs_for_resume(output_dir: Path, sim_time: float) -> None:
+    """
+    Antes de retomar, guarda em '<output>.before_resume.<formato>' os registos anteriores a `sim_time`.
+
+    O SUMO retomado recria os outputs do zero; os registos anteriores ao checkpoint
+    vêm do prefixo já existente (retomas encadeadas) e do output parcial atual.
+    """
+    for kind, output_format, current, prefix in _resume_files(output_dir):
+        sources = [path for path in (prefix, current) if path.is_file()]
+        tmp_file = prefix.with_name(prefix.name + ".tmp")
+        # O passo que começa em `sim_time` é reexecutado (e reescrito) após a retoma.
+        kept, last_time = _write_records(tmp_file, kind, output_format, sources, sim_time)
+        os.replace(tmp_file, prefix)
+        if kind != "tripinfo" and (last_time is None or last_time < sim_time - 1):
+            logger.warning(f"'{current.name}' só tem registos até {last_time}s; o checkpoint é de {sim_time}s "
+                           "(dados não gravados em disco antes da falha foram perdidos).")
+        logger.info(f"{kept} registos de '{current.name}' anteriores a {sim_time}s preservados para a retoma.")
+
+def merge_resumed_outputs(output_dir: Path) -> None:
+    """Junta os prefixos '.before_resume' com os outputs da execução retomada."""
+    for kind, output_format, current, prefix in _resume_files(output_dir):
+        if not prefix.is_file():
+            continue
+        tmp_file = current.with_name(current.name + ".merged.tmp")
+        _write_records(tmp_file, kind, output_format, [path for path in (prefix, current) if path.is_file()])
+        os.replace(tmp_file, current)
+        prefix.unlink()
+        logger.info(f"Output '{current.name}' reconstituído a partir da execução original e da retomada.")
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Recolha de KPIs por veículo dentro do loop, através de subscrições TraCI.
+
+PILAR DE QUALIDADE: Eficiência, Robustez
+DESCRIÇÃO: O Reporter pedia em cada passo a lista de veículos e depois a
+emissão de CO2 de cada um (uma chamada TraCI por veículo e por passo), e lia o
+tempo de espera de veículos que já tinham chegado, o que falha. Aqui o
+simulador envia, junto com a resposta de cada simulationStep, as listas de
+partidas e chegadas e as variáveis subscritas de cada veículo; só a partida
+custa uma chamada (a subscrição). Os valores acumulam-se em arrays NumPy
+pré-alocados, indexados pelo id do veículo internado, e o valor de um veículo
+que chegou é o último recebido antes da chegada.
+
+Os totais são os mesmos do emissions.xml, pelo que, quando só interessam os
+KPIs agregados, o emission-output pode ser desligado (chave kpi_collector).
+"""
+from typing import Dict, List
+
+import numpy as np
+import traci
+import traci.constants as tc
+
+from tcc_sumo.tools.log_analyzer import EmissionAggregate
+from tcc_sumo.utils.helpers import get_logger
+
+logger = get_logger("KpiCollector")
+
+# Variáveis subscritas por veículo e poluente do emissions.xml correspondente.
+EMISSION_VARIABLES = {tc.VAR_CO2EMISSION: "CO2", tc.VAR_FUELCONSUMPTION: "fuel",
+                      tc.VAR_NOXEMISSION: "NOx", tc.VAR_PMXEMISSION: "PMx"}
+VEHICLE_VARIABLES = (*EMISSION_VARIABLES, tc.VAR_SPEED, tc.VAR_TIMELOSS)
+SIMULATION_VARIABLES = (tc.VAR_TIME, tc.VAR_DEPARTED_VEHICLES_IDS, tc.VAR_ARRIVED_VEHICLES_IDS)
+# Velocidade (m/s) abaixo da qual o veículo conta como parado, como no waitingTime do tripinfo.
+WAITING_SPEED = 0.1
+# Arrays por veículo: nome e valor inicial.
+_ARRAYS = {"depart": np.nan, "arrival": np.nan, "last_seen": np.nan, "waiting": 0.0, "time_loss": 0.0,
+           **{pollutant: 0.0 for pollutant in EMISSION_VARIABLES.values()}}
+
+class KpiCollector:
+    """
+    Acumula, por veículo, emissões, tempo parado, tempo perdido e tempo de viagem.
+    """
+    def __init__(self, capacity: int = 1024):
+        self.vehicle_index: Dict[str, int] = {}
+        self.vehicle_ids: List[str] = []
+        self.capacity = max(1, capacity)
+        self.arrays = {name: np.full(self.capacity, fill) for name, fill in _ARRAYS.items()}
+        self.dt = 1.0
+        self.traci_calls_last_step = 0
+        self.traci_calls_total = 0
+
+    @property
+    def size(self) -> int:
+        return len(self.vehicle_ids)
+
+    def setup(self) -> None:
+        """Subscreve as listas de partidas e chegadas (chamado após a ligação ao SUMO)."""
+        self.dt = traci.simulation.getDeltaT()
+        traci.simulation.subscribe(SIMULATION_VARIABLES)
+        # Veículos já na rede (ex.: numa retoma) ficam subscritos desde já.
+        vehicle_ids = traci.vehicle.getIDList()
+        for vehicle_id in vehicle_ids:
+            self._intern(vehicle_id)
+            traci.vehicle.subscribe(vehicle_id, VEHICLE_VARIABLES)
+        self.traci_calls_total += 3 + len(vehicle_ids)
+
+    def _intern(self, vehicle_id: str) -> int:
+        index = self.vehicle_index.get(vehicle_id)
+        if index is None:
+            index = self.vehicle_index[vehicle_id] = len(self.vehicle_ids)
+            self.vehicle_ids.append(vehicle_id)
+            if index >= self.capacity:
+                # Crescimento geométrico: o custo de cópia fica amortizado por veículo.
+                extra = self.capacity
+                for name, fill in _ARRAYS.items():
+                    self.arrays[name] = np.concatenate([self.arrays[name], np.full(extra, fill)])
+                self.capacity += extra
+        return index
+
+    def collect_step(self) -> None:
+        """Processa os resultados do passo acabado de simular (sem chamadas TraCI além das partidas)."""
+        self.traci_calls_last_step = 0
+        results = traci.simulation.getSubscriptionResults()
+        if not results:
+            return
+        # VAR_TIME já é o instante seguinte; os outputs do SUMO datam o passo pelo seu início.
+        time = results[tc.VAR_TIME] - self.dt
+        arrays = self.arrays
+        for vehicle_id in results[tc.VAR_DEPARTED_VEHICLES_IDS]:
+            index = self._intern(vehicle_id)
+            arrays["depart"][index] = time
+            # A resposta da subscrição já traz os valores do passo da partida.
+            traci.vehicle.subscribe(vehicle_id, VEHICLE_VARIABLES)
+            self.traci_calls_last_step += 1
+        arrived = results[tc.VAR_ARRIVED_VEHICLES_IDS]
+        if arrived:
+            arrays["arrival"][[self.vehicle_index[vehicle_id] for vehicle_id in arrived
+                               if vehicle_id in self.vehicle_index]] = time
+        self.traci_calls_total += self.traci_calls_last_step
+
+        vehicles = traci.vehicle.getAllSubscriptionResults()
+        if not vehicles:
+            return
+        vehicle_index = self.vehicle_index
+        indices = np.fromiter((vehicle_index[vehicle_id] for vehicle_id in vehicles), dtype=np.int64, count=len(vehicles))
+        values = list(vehicles.values())
+        for variable, pollutant in EMISSION_VARIABLES.items():
+            arrays[pollutant][indices] += np.fromiter((v[variable] for v in values), dtype=np.float64, count=len(values)) * self.dt
+        speeds = np.fromiter((v[tc.VAR_SPEED] for v in values), dtype=np.float64, count=len(values))
+        arrays["waiting"][indices[speeds <= WAITING_SPEED]] += self.dt
+        arrays["time_loss"][indices] = np.fromiter((v[tc.VAR_TIMELOSS] for v in values), dtype=np.float64, count=len(values))
+        arrays["last_seen"][indices] = time
+
+    def trip_summary(self) -> dict:
+        """Médias das viagens concluídas (veículos que chegaram)."""
+        size = self.size
+        arrival = self.arrays["arrival"][:size]
+        completed = ~np.isnan(arrival)
+        count = int(completed.sum())
+        if not count:
+            return {"completed_trips": 0, "avg_duration": 0.0, "avg_time_loss": 0.0, "avg_waiting_time": 0.0}
+        return {
+            "completed_trips": count,
+            "avg_duration": float((arrival[completed] - self.arrays["depart"][:size][completed]).mean()),
+            "avg_time_loss": float(self.arrays["time_loss"][:size][completed].mean()),
+            "avg_waiting_time": float(self.arrays["waiting"][:size][completed].mean()),
+        }
+
+    def emission_aggregate(self) -> EmissionAggregate:
+        """O mesmo agregado que a análise obtém do emissions.xml (totais e primeiro/último instante)."""
+        aggregate = EmissionAggregate()
+        size = self.size
+        for pollutant in EMISSION_VARIABLES.values():
+            aggregate.totals[pollutant] = float(self.arrays[pollutant][:size].sum())
+        # Só contam os veículos que chegaram a estar na rede num fim de passo.
+        seen = ~np.isnan(self.arrays["last_seen"][:size])
+        for index in np.flatnonzero(seen):
+            aggregate.vehicle_index[self.vehicle_ids[index]] = len(aggregate.first_seen)
+            aggregate.first_seen.append(float(self.arrays["depart"][index]))
+            aggregate.last_seen.append(float(self.arrays["last_seen"][index]))
+        return aggregate
+
+    def get_state(self) -> dict:
+        """Estado serializável em JSON, gravado nos checkpoints."""
+        size = self.size
+        return {"vehicle_ids": list(self.vehicle_ids),
+                "arrays": {name: [None if np.isnan(v) else v for v in values[:size].tolist()]
+                           for name, values in self.arrays.items()}}
+
+    def set_state(self, state: dict) -> None:
+        indices = [self._intern(vehicle_id) for vehicle_id in state.get("vehicle_ids", [])]
+        for name, values in state.get("arrays", {}).items():
+            if name in self.arrays:
+                self.arrays[name][indices] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
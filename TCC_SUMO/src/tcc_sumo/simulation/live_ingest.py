@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Leitura dos outputs do SUMO durante a simulação.
+
+PILAR DE QUALIDADE: Eficiência, Usabilidade
+DESCRIÇÃO: A análise só começava depois de o SUMO terminar, e o operador
+esperava pela leitura completa dos outputs no fim de uma execução longa. Aqui
+um thread em segundo plano acompanha os ficheiros à medida que o SUMO os
+escreve (como um 'tail -f'), alimenta com os bytes novos um parser incremental
+e mantém os mesmos agregados da análise final: as viagens concluídas, o
+EmissionAggregate e o QueueAnalyzer. Quando o último passo termina resta ler
+apenas o final dos ficheiros. A cada leitura, os KPIs parciais são gravados em
+'live_kpis.json' junto aos outputs (e estão disponíveis em `snapshot()`).
+
+Só os formatos sem compressão ('xml' e 'csv') podem ser lidos assim; com
+outputs comprimidos ou numa retoma a análise corre, como antes, no fim.
+"""
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from tcc_sumo.tools.log_analyzer import EmissionAggregate, POLLUTANTS
+from tcc_sumo.tools.output_formats import IncrementalOutputParser, LIVE_FORMATS, OUTPUT_READ_ERRORS, detect_format
+from tcc_sumo.tools.queue_analyzer import QueueAnalyzer, load_lane_junctions
+from tcc_sumo.tools.tripinfo_parsers import TRIP_ANALYSIS_COLUMNS, TRIPINFO_LAYOUT
+from tcc_sumo.utils.helpers import get_logger
+
+logger = get_logger("LiveIngest")
+
+LIVE_KPIS_NAME = "live_kpis.json"
+# Bytes lidos de cada vez de um output (o ficheiro é lido até ao fim em cada ciclo).
+READ_CHUNK_BYTES = 4 * 1024 * 1024
+
+class _TailedOutput:
+    """Um output em escrita: lê os bytes novos desde a última leitura e devolve os registos completos."""
+    def __init__(self, path: Path, kind: str):
+        self.path = Path(path)
+        self.parser = IncrementalOutputParser(kind, detect_format(self.path))
+        self.offset = 0
+        self._file = None
+
+    def read_new_records(self):
+        if self._file is None:
+            if not self.path.is_file():
+                return
+            self._file = open(self.path, "rb")
+        if os.fstat(self._file.fileno()).st_size < self.offset:
+            raise OSError(f"'{self.path.name}' foi truncado durante a leitura.")
+        while True:
+            data = self._file.read(READ_CHUNK_BYTES)
+            if not data:
+                return
+            self.offset += len(data)
+            yield from self.parser.feed(data)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+class LiveIngester:
+    """
+    Acompanha os três outputs do SUMO num thread e mantém os agregados da análise.
+    """
+    def __init__(self, paths: Dict[str, Path], poll_interval_s: float = 1.0, net_path: Path | None = None,
+                 queue_threshold_m: float = 50.0, queue_bucket_s: float = 300.0, snapshot_path: Path | None = None):
+        self.outputs = {kind: _TailedOutput(path, kind) for kind, path in paths.items()}
+        self.poll_interval_s = poll_interval_s
+        self.net_path = Path(net_path) if net_path else None
+        self.snapshot_path = Path(snapshot_path) if snapshot_path else None
+        self.trips = {name: [] for name in TRIP_ANALYSIS_COLUMNS}
+        self.emissions = EmissionAggregate()
+        self.queue = QueueAnalyzer(queue_threshold_m, queue_bucket_s)
+        self.error: Exception | None = None
+        self._trip_sums = {"duration": 0.0, "timeLoss": 0.0, "waitingTime": 0.0}
+        self._sim_time = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @staticmethod
+    def supports(paths: Dict[str, Path]) -> bool:
+        """Os outputs podem ser lidos durante a simulação (todos em formato sem compressão)?"""
+        try:
+            return all(detect_format(path) in LIVE_FORMATS for path in paths.values())
+        except ValueError:
+            return False
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="LiveIngester", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        try:
+            if self.net_path and self.net_path.is_file():
+                # O mapa faixa → cruzamento tem de existir antes dos primeiros registos de filas.
+                self.queue.lane_junctions = load_lane_junctions(self.net_path)
+            while not self._stop.wait(self.poll_interval_s):
+                self._poll()
+                self._write_snapshot()
+        except OUTPUT_READ_ERRORS as e:
+            self.error = e
+            logger.error(f"Leitura dos outputs durante a simulação interrompida: {e}. A análise será feita no fim.")
+
+    def _poll(self) -> None:
+        """Lê o que o SUMO escreveu desde a última leitura e atualiza os agregados."""
+        with self._lock:
+            tripinfo = self.outputs.get("tripinfo")
+            if tripinfo:
+                self._add_trips(tripinfo.read_new_records())
+            emissions = self.outputs.get("emissions")
+            if emissions:
+                add_row = self.emissions.add_row
+                for time, attributes in emissions.read_new_records():
+                    add_row(time, attributes)
+                    self._sim_time = time
+            queueinfo = self.outputs.get("queueinfo")
+            if queueinfo:
+                self.queue.add_records(queueinfo.read_new_records())
+                self.queue.flush_records()
+
+    def _add_trips(self, records) -> None:
+        columns, sums = self.trips, self._trip_sums
+        for _, attributes in records:
+            for name in TRIP_ANALYSIS_COLUMNS:
+                value = attributes.get(name)
+                kind = TRIPINFO_LAYOUT[name]
+                if kind is str:
+                    columns[name].append(value)
+                elif kind is int:
+                    columns[name].append(int(value) if value else 0)
+                else:
+                    columns[name].append(float(value) if value else np.nan)
+            for name in sums:
+                sums[name] += columns[name][-1]
+
+    def snapshot(self) -> dict:
+        """KPIs parciais da execução, calculados com os outputs lidos até agora."""
+        with self._lock:
+            trips = len(self.trips["id"])
+            queue_parents = self.outputs["queueinfo"].parser.parent_count if "queueinfo" in self.outputs else 0
+            return {
+                "updated_at": datetime.now().isoformat(),
+                "sim_time_s": self._sim_time,
+                "vehicles_seen": self.emissions.vehicle_count,
+                "completed_trips": trips,
+                "avg_trip_duration_s": round(self._trip_sums["duration"] / trips, 2) if trips else None,
+                "avg_time_loss_s": round(self._trip_sums["timeLoss"] / trips, 2) if trips else None,
+                "avg_waiting_time_s": round(self._trip_sums["waitingTime"] / trips, 2) if trips else None,
+                "pollution": {poll: round(self.emissions.totals[poll] / divisor, 2) for poll, divisor in POLLUTANTS.items()},
+                "queue_metrics": self.queue.global_metrics(queue_parents),
+            }
+
+    def _write_snapshot(self) -> None:
+        if self.snapshot_path is None:
+            return
+        tmp_path = self.snapshot_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, self.snapshot_path)
+
+    def finish(self) -> tuple | None:
+        """
+        Termina a leitura (com o SUMO já encerrado, os outputs estão completos) e
+        devolve (viagens, emissões, filas) para `LogAnalyzer.run_analysis`, ou
+        None se a leitura falhou e a análise deve reler os ficheiros.
+        """
+        if self._thread is None:
+            return None
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        try:
+            if self.error is None:
+                self._poll()
+                self._write_snapshot()
+        except OUTPUT_READ_ERRORS as e:
+            self.error = e
+        finally:
+            for output in self.outputs.values():
+                output.close()
+        if self.error is not None:
+            return None
+        queueinfo = self.outputs.get("queueinfo")
+        self.queue.finish(queueinfo.parser.parent_count if queueinfo else 0)
+        trip_df = pd.DataFrame({name: np.array(values, dtype=object) if TRIPINFO_LAYOUT[name] is str
+                                else np.asarray(values, dtype=np.float64 if TRIPINFO_LAYOUT[name] is float else np.int64)
+                                for name, values in self.trips.items()})
+        logger.info(f"Outputs lidos durante a simulação: {len(trip_df)} viagens, "
+                    f"{self.emissions.vehicle_count} veículos nas emissões.")
+        return trip_df, self.emissions, self.queue
@@ -10,40 +10,123 @@ outras classes. Isso mantém o código organizado e fácil de manter.
 import logging
 import os
 import sys
+import time
 from pathlib import Path
 import traci
 from traci.exceptions import TraCIException, FatalTraCIError
 import pandas as pd
 
+from tcc_sumo.simulation.step_profiler import StepProfiler, last_departure_time
+from tcc_sumo.simulation.telemetry import TelemetryWriter
+from tcc_sumo.simulation.kpi_collector import KpiCollector
+from tcc_sumo.simulation.live_ingest import LiveIngester, LIVE_KPIS_NAME
+from tcc_sumo.simulation.checkpoint import CheckpointManager, prepare_outputs_for_resume, merge_resumed_outputs
+from tcc_sumo.tools.output_formats import OUTPUT_KINDS, find_output, output_file_name, sumo_output_args, sumocfg_without_outputs
 from tcc_sumo.simulation.traci_connection import TraciConnection
 from tcc_sumo.tools.log_analyzer import LogAnalyzer
+from tcc_sumo.tools.queue_analyzer import net_file_from_sumocfg
 from tcc_sumo.traffic_logic.controllers import StaticController, AdaptiveController, BaseController
+from tcc_sumo.traffic_logic.vectorized_controller import VectorizedAdaptiveController
 from tcc_sumo.utils.helpers import task_start, task_success, task_fail, PROJECT_ROOT, format_time
 
 logger = logging.getLogger(__name__)
 
+# Intervalo (em passos) entre registos de progresso no log.
+PROGRESS_INTERVAL = 100
+
 class SimulationManager:
     """
     Orquestra a inicialização, execução e finalização da simulação SUMO.
     """
-    def __init__(self, config: dict, scenario_name: str, mode_name: str):
+    def __init__(self, config: dict, scenario_name: str, mode_name: str,
+                 output_dir: str | None = None, seed: int | None = None, consolidate: bool = True,
+                 resume: bool = False):
         self.config = config
         self.scenario_name = scenario_name
         self.mode_name = mode_name.upper()
         self.step = 0
+        # Instante inicial e duração do passo da simulação, e se terminou por já não haver veículos.
+        self.start_time = 0.0
+        self.step_length = 1.0
+        self.ended_by_arrivals = False
         self.controller: BaseController
+        self.results: dict = {}
+        self.last_step: int | None = None
+        # Sem tempo final no .sumocfg, o ETA parte da última partida das rotas (ver step_profiler.py).
+        self.last_departure_step: int | None = None
+        # Tempos por secção do loop e chamadas TraCI (ver step_timings.json da execução).
+        self.profiler = StepProfiler()
+        self.timings: dict = {}
+
+        # Ponto de isolamento: com `output_dir` os outputs do SUMO, os dados brutos e
+        # o relatório vão para um diretório próprio, permitindo execuções em paralelo.
+        # Sem ele, os outputs ficam junto ao .sumocfg, como definido no cenário.
+        config_file = config['scenarios'][scenario_name]
+        self.config_file = config_file
+        self.output_dir = Path(output_dir) if output_dir else Path(config_file).parent
+        self.consolidate = consolidate
+        self.report_path = (self.output_dir if output_dir else PROJECT_ROOT / "logs") / "human_analysis_report.log"
+        # Formato dos outputs pedidos ao SUMO (ver output_formats.py); sem `output_dir`
+        # vale o formato definido no .sumocfg do cenário.
+        self.output_format = config.get('output_format', 'xml')
+        # Recolha de KPIs por subscrições TraCI (ver kpi_collector.py). Com emission_output
+        # desligado, os totais de emissões vêm do coletor e o SUMO não escreve o emissions.xml
+        # (exceto numa retoma, cujos outputs anteriores ao checkpoint já o incluem).
+        collector_config = config.get('kpi_collector', {})
+        self.kpi_collector = KpiCollector() if collector_config.get('enabled', False) else None
+        self.emission_output = not (self.kpi_collector and not collector_config.get('emission_output', True) and not resume)
+        self.output_kinds = [kind for kind in OUTPUT_KINDS if self.emission_output or kind != 'emissions']
+        if not self.emission_output:
+            config_file = str(sumocfg_without_outputs(config_file, ['emissions']))
+        sumo_args = []
+        if output_dir:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            sumo_args += ["--no-step-log", *sumo_output_args(self.output_dir.resolve(), self.output_format,
+                                                               self.output_kinds)]
+        if seed is not None:
+            sumo_args += ["--seed", seed]
+
+        # Checkpoints periódicos (estado do SUMO + do controlador) para retomar execuções longas.
+        checkpoint_config = config.get('checkpoint', {})
+        self.checkpoints = CheckpointManager(self.output_dir / "checkpoints",
+                                             checkpoint_config.get('interval_steps', 0),
+                                             checkpoint_config.get('keep', 2))
+        self.resume_from = self.checkpoints.latest() if resume else None
+        if resume and self.resume_from is None:
+            logger.warning(f"Nenhum checkpoint encontrado em '{self.checkpoints.directory}'. A simulação começa do início.")
+        # Numa retoma, o SUMO arranca já no estado do checkpoint.
+        sumo_args += self.checkpoints.sumo_args(self.resume_from)
 
         self.traci_connection = TraciConnection(
             config.get('sumo_executable', 'sumo-gui'),
-            config['scenarios'][scenario_name],
-            config.get('traci_port', 8813)
+            config_file,
+            config.get('traci_port', 8813),
+            config.get('traci_backend', 'socket'),
+            extra_args=sumo_args
         )
         self._setup_controller()
+
+        # Telemetria: o loop só coloca registos numa fila; um thread em segundo plano
+        # escreve-os em 'telemetry.jsonl' e regista as linhas de progresso no log.
+        self.telemetry: TelemetryWriter | None = None
+        telemetry_config = config.get('telemetry', {})
+        if telemetry_config.get('enabled', True):
+            telemetry_path = self.output_dir / "telemetry.jsonl"
+            if not self.resume_from:
+                telemetry_path.unlink(missing_ok=True)
+            self.telemetry = TelemetryWriter(telemetry_path,
+                                             queue_size=telemetry_config.get('queue_size', 10000),
+                                             batch_size=telemetry_config.get('batch_size', 256),
+                                             policy=telemetry_config.get('policy', 'drop'),
+                                             on_record=self._log_progress_record)
+        self.live_ingester: LiveIngester | None = None
         task_success(f"Sistema inicializado em modo '{self.mode_name}'")
 
     def _setup_controller(self):
         """Inicializa o controlador de tráfego correto com base no modo."""
-        if self.mode_name == 'ADAPTIVE':
+        if self.mode_name == 'ADAPTIVE' and self.config.get('adaptive_engine', 'python') == 'vectorized':
+            self.controller = VectorizedAdaptiveController()
+        elif self.mode_name == 'ADAPTIVE':
             self.controller = AdaptiveController()
         else:
             self.controller = StaticController()
@@ -52,10 +135,21 @@ class SimulationManager:
     def run(self):
         """Ponto principal de execução do ciclo de vida da simulação."""
         try:
+            if self.resume_from:
+                # O SUMO recria os outputs ao arrancar: os registos até ao checkpoint são preservados antes.
+                prepare_outputs_for_resume(self.output_dir, self.resume_from['sim_time'])
             task_start("Conectando ao SUMO")
             self.traci_connection.start()
             task_success("Conectado ao SUMO")
-            self.controller.setup()
+            if self.telemetry:
+                self.telemetry.start()
+            self._start_live_ingester()
+            if self.resume_from:
+                self._restore_checkpoint(self.resume_from)
+            else:
+                self.controller.setup()
+                if self.kpi_collector:
+                    self.kpi_collector.setup()
             self._simulation_loop()
         except KeyboardInterrupt:
             task_fail("Simulação interrompida pelo teclado")
@@ -69,34 +163,185 @@ class SimulationManager:
         finally:
             self._cleanup()
 
+    def _restore_checkpoint(self, checkpoint: dict):
+        """Repõe o estado do controlador (o do SUMO foi carregado no arranque) e continua no passo seguinte."""
+        task_start(f"Retomando a simulação a partir do passo {checkpoint['step']}")
+        self.controller.setup()
+        self.controller.set_state(checkpoint.get('controller', {}))
+        if self.kpi_collector:
+            self.kpi_collector.setup()
+            self.kpi_collector.set_state(checkpoint.get('kpi_collector', {}))
+        self.step = checkpoint['step'] + 1
+        task_success(f"Simulação retomada em {format_time(checkpoint['sim_time'])}")
+
+    def _output_paths(self) -> dict:
+        """Outputs da execução, em qualquer formato; sem ficheiro, fica o nome esperado."""
+        return {kind: find_output(self.output_dir, kind) or self.output_dir / output_file_name(kind, self.output_format)
+                for kind in self.output_kinds}
+
+    def _start_live_ingester(self):
+        """Começa a ler os outputs enquanto o SUMO os escreve (ver live_ingest.py), se possível."""
+        live_config = self.config.get('live_analysis', {})
+        if not live_config.get('enabled', True):
+            return
+        if self.resume_from:
+            logger.info("Execução retomada: os outputs serão analisados no fim da simulação.")
+            return
+        # Com o SUMO já arrancado, os outputs desta execução existem (vazios ou quase).
+        paths = self._output_paths()
+        if not LiveIngester.supports(paths):
+            logger.info("Outputs comprimidos não podem ser lidos durante a simulação: análise no fim.")
+            return
+        queue_config = self.config.get('queue_analysis', {})
+        self.live_ingester = LiveIngester(paths,
+                                          poll_interval_s=live_config.get('poll_interval_s', 1.0),
+                                          net_path=net_file_from_sumocfg(self.config_file),
+                                          queue_threshold_m=queue_config.get('threshold_m', 50.0),
+                                          queue_bucket_s=queue_config.get('bucket_s', 300.0),
+                                          snapshot_path=self.output_dir / LIVE_KPIS_NAME)
+        self.live_ingester.start()
+        logger.info(f"KPIs parciais da execução em '{self.output_dir / LIVE_KPIS_NAME}'.")
+
     def _simulation_loop(self):
         """Executa o loop principal da simulação, avançando os passos."""
         task_start(f"Simulação iniciada em modo '{self.mode_name}'...")
         logger.info(f"Loop de simulação iniciado. Modo: {self.mode_name}.")
+        # PILAR DE QUALIDADE: Eficiência
+        # DESCRIÇÃO: Em vez de avançar um segundo de cada vez, o loop pergunta ao
+        # controlador em que passo volta a precisar de atuar e salta diretamente
+        # para ele (ou para o próximo registo de progresso) com um único
+        # simulationStep(tempoAlvo). O modo STATIC passa a fazer poucas chamadas
+        # TraCI. Como o fim dos veículos só é verificado nesses pontos, o loop pode
+        # terminar até PROGRESS_INTERVAL passos depois da última chegada; a duração
+        # registada na análise é então a da última chegada (ver run_analysis).
+        dt = traci.simulation.getDeltaT()
+        # Numa retoma, `self.step` já aponta para o passo seguinte ao checkpoint.
+        start_time = traci.simulation.getTime() - self.step * dt
+        self.start_time, self.step_length = start_time, dt
+        # Com o libsumo não há '--quit-on-end' a fechar a conexão, por isso o fim
+        # configurado no .sumocfg (se existir) é respeitado explicitamente.
+        end_time = traci.simulation.getEndTime()
+        last_step = round((end_time - start_time) / dt) - 1 if end_time >= 0 else None
+        self.last_step = last_step
+        if last_step is None:
+            departure = last_departure_time(self.config_file)
+            self.last_departure_step = round((departure - start_time) / dt) if departure is not None else None
+        profiler = self.profiler
+        profiler.start(self.step)
+        clock = time.perf_counter
         # Melhoria: O loop agora verifica se ainda há veículos na simulação.
         while traci.simulation.getMinExpectedNumber() > 0:
-            traci.simulationStep()
-            self.controller.manage_traffic_lights(self.step)
-            if self.step % 100 == 0:
+            # getMinExpectedNumber + simulationStep
+            profiler.count_traci_calls("manager", 2)
+            if last_step is not None and self.step > last_step:
+                logger.info(f"Tempo final da simulação ({end_time}s) atingido.")
+                break
+            wakeup = self.controller.next_wakeup_step(self.step)
+            next_progress = -(-self.step // PROGRESS_INTERVAL) * PROGRESS_INTERVAL
+            target = next_progress if wakeup is None else min(wakeup, next_progress)
+            next_checkpoint = self.checkpoints.next_checkpoint_step(self.step)
+            if next_checkpoint is not None:
+                target = min(target, next_checkpoint)
+            if last_step is not None:
+                target = min(target, last_step)
+            # O coletor de KPIs precisa dos resultados de cada passo: sem saltos.
+            if self.kpi_collector:
+                target = self.step
+            started = clock()
+            if target > self.step:
+                self.step = target
+                traci.simulationStep(start_time + (self.step + 1) * dt)
+            else:
+                traci.simulationStep()
+            profiler.record("simulation_step", clock() - started)
+            if self.kpi_collector:
+                started = clock()
+                self.kpi_collector.collect_step()
+                profiler.record("kpi_collector", clock() - started)
+                profiler.count_traci_calls("kpi_collector", self.kpi_collector.traci_calls_last_step)
+            if wakeup is not None and self.step >= wakeup:
+                started = clock()
+                self.controller.manage_traffic_lights(self.step)
+                profiler.record("controller", clock() - started)
+                profiler.count_traci_calls("controller", self.controller.traci_calls_last_step)
+            if self.step % PROGRESS_INTERVAL == 0:
+                started = clock()
                 self._log_progress()
+                profiler.record("progress_log", clock() - started)
+            if self.step == next_checkpoint:
+                started = clock()
+                state = {"controller": self.controller.get_state()}
+                if self.kpi_collector:
+                    state["kpi_collector"] = self.kpi_collector.get_state()
+                self.checkpoints.save(self.step, state)
+                profiler.record("checkpoint", clock() - started)
             self.step += 1
+        else:
+            self.ended_by_arrivals = True
+        profiler.finish()
         logger.info("Todos os veículos concluíram suas rotas ou foram removidos. Encerrando simulação.")
+        if self.step > 0:
+            logger.info(f"Chamadas TraCI do controlador: {self.controller.traci_calls_total} no total "
+                        f"({self.controller.traci_calls_total / self.step:.2f} por passo).")
+        if self.checkpoints.enabled:
+            logger.info(f"Checkpoints: {self.checkpoints.summary(profiler.elapsed())}")
+            # A execução terminou: os checkpoints deixam de ser necessários.
+            self.checkpoints.clear()
 
     def _log_progress(self):
-        """Registra o progresso da simulação no log."""
+        """Recolhe o progresso da simulação e envia-o para a telemetria (ou diretamente para o log)."""
         try:
-            active = traci.vehicle.getIDCount()
-            arrived = traci.simulation.getArrivedNumber()
-            logger.info(f"Progresso - Passo: {self.step} ({format_time(self.step)}) | Ativos: {active} | Chegaram: {arrived}")
+            last_step = self.last_step
+            if last_step is None:
+                last_step = self.profiler.estimated_last_step(self.step, traci.simulation.getMinExpectedNumber(),
+                                                              self.last_departure_step)
+                self.profiler.count_traci_calls("manager", 1)
+            eta = self.profiler.eta_seconds(self.step, last_step)
+            record = {
+                "type": "progress",
+                "step": self.step,
+                "active": traci.vehicle.getIDCount(),
+                "arrived": traci.simulation.getArrivedNumber(),
+                "controller_traci_calls": self.controller.traci_calls_last_step,
+                "wall_time_s": round(self.profiler.elapsed(), 3),
+                "steps_per_s": round(self.profiler.steps_per_second(self.step), 2),
+                "eta_s": round(eta, 1) if eta is not None else None,
+                "eta_estimated": self.last_step is None,
+            }
+            self.profiler.count_traci_calls("manager", 2)
         except traci.TraCIException as e:
             logger.warning(f"Não foi possível obter dados de progresso no passo {self.step}: {e}")
+            return
+        if self.telemetry:
+            self.telemetry.emit(record)
+        else:
+            self._log_progress_record(record)
+
+    @staticmethod
+    def _log_progress_record(record: dict):
+        """Registra no log uma linha de progresso (no thread de telemetria, se ativo)."""
+        if record.get("type") != "progress":
+            return
+        eta = record['eta_s']
+        eta_text = format_time(eta) if eta is not None else 'N/D'
+        if eta is not None and record.get('eta_estimated'):
+            eta_text = f"~{eta_text}"
+        logger.info(f"Progresso - Passo: {record['step']} ({format_time(record['step'])}) | Ativos: {record['active']} "
+                    f"| Chegaram: {record['arrived']} | Chamadas TraCI do controlador: {record['controller_traci_calls']} "
+                    f"| {record['steps_per_s']:.1f} passos/s | ETA: {eta_text}")
 
     def _cleanup(self):
         """Encerra a conexão e dispara a análise de resultados."""
         task_start("Encerrando conexão")
         self.traci_connection.close()
         task_success("Conexão encerrada")
+        if self.telemetry:
+            self.telemetry.close()
         if self.step > 0:
+            try:
+                self.timings = self.profiler.save(self.output_dir, self.step)
+            except OSError as e:
+                logger.warning(f"Não foi possível gravar os tempos por passo: {e}")
             task_start("Analisando resultados")
             self._analyze_and_report()
         else:
@@ -109,13 +354,31 @@ class SimulationManager:
         """
         try:
             logger.info("Iniciando fase de análise e geração de relatórios.")
-            output_dir = Path(self.config['scenarios'][self.scenario_name]).parent
+            output_dir = self.output_dir
+            merge_resumed_outputs(output_dir)
+            # Os outputs são procurados em qualquer formato; sem ficheiro, fica o nome esperado
+            # (a análise pode então usar a cache colunar de um output já apagado).
+            paths = self._output_paths()
+            live_outputs = self.live_ingester.finish() if self.live_ingester else None
+            queue_config = self.config.get('queue_analysis', {})
             analyzer = LogAnalyzer(
-                trip_info_path=str(output_dir / "tripinfo.xml"),
-                emission_path=str(output_dir / "emissions.xml"),
-                queue_info_path=str(output_dir / "queueinfo.xml")
+                trip_info_path=str(paths["tripinfo"]),
+                emission_path=str(paths["emissions"]) if "emissions" in paths else None,
+                queue_info_path=str(paths["queueinfo"]),
+                tripinfo_backend=self.config.get('tripinfo_parser', 'auto'),
+                use_cache=self.config.get('output_cache', True),
+                workers=self.config.get('analysis_workers', 0),
+                net_path=net_file_from_sumocfg(self.config_file),
+                queue_threshold_m=queue_config.get('threshold_m', 50.0),
+                queue_bucket_s=queue_config.get('bucket_s', 300.0)
             )
-            data = analyzer.run_analysis({"scenario": self.scenario_name, "mode": self.mode_name}, self.step)
+            data = analyzer.run_analysis({"scenario": self.scenario_name, "mode": self.mode_name}, self.step,
+                                         consolidate=self.consolidate, live_outputs=live_outputs,
+                                         simulation_start_s=self.start_time if self.ended_by_arrivals else None,
+                                         step_length_s=self.step_length,
+                                         collected_emissions=None if self.emission_output
+                                         else self.kpi_collector.emission_aggregate())
+            self.results = data
             self.generate_reports(data)
             self._display_summary_labels(data)
             task_success("Análise e relatórios concluídos")
@@ -128,7 +391,7 @@ class SimulationManager:
         FUNCIONALIDADE RESTAURADA:
         Gera o relatório de análise em formato de "ticket".
         """
-        report_ticket_path = PROJECT_ROOT / "logs" / "human_analysis_report.log"
+        report_ticket_path = self.report_path
         metrics, pollution, queue = data.get("metrics",{}), data.get("pollution",{}), data.get("queue_metrics",{})
         total = metrics.get('Veículos Processados (Entraram na Malha)',0)
         completed = metrics.get('Veículos que Concluíram a Viagem',0)
@@ -143,6 +406,8 @@ class SimulationManager:
         else:
             summary_text = "A simulação demonstrou um FLUXO DE TRÁFEGO ESTÁVEL, com congestionamentos mínimos ou inexistentes."
 
+        performance_text = self._format_timings(self.timings)
+
         ticket_template = f"""
 #########################################################################
 #                                                                       #
@@ -191,6 +456,12 @@ DURAÇÃO TOTAL: {format_time(metrics.get('simulation_duration_seconds', 0))}
   - Emissão Total de CO2..........: {pollution.get('Total de CO2', '0.00 kg')}
   - Emissão Total de NOx..........: {pollution.get('Total de NOx', '0.00 kg')}
 
+-------------------------------------------------------------------------
+                        DESEMPENHO DA EXECUÇÃO
+-------------------------------------------------------------------------
+
+{performance_text}
+
 #########################################################################
 #                         FIM DO RELATÓRIO                              #
 #########################################################################
@@ -198,6 +469,26 @@ DURAÇÃO TOTAL: {format_time(metrics.get('simulation_duration_seconds', 0))}
         with open(report_ticket_path, 'a', encoding='utf-8') as f: f.write(ticket_template)
         logger.info(f"Relatório de análise humana (ticket) salvo em '{report_ticket_path}'.")
 
+    @staticmethod
+    def _format_timings(timings: dict) -> str:
+        """Resume os tempos por passo (step_timings.json) para o relatório."""
+        if not timings:
+            return "  Sem dados de desempenho."
+        calls = timings['traci_calls']
+        lines = [
+            f"  - Passos / Tempo Real.............: {timings['steps']} passos em {format_time(timings['wall_time_s'])} ({timings['steps_per_s']:.1f} passos/s)",
+            f"  - Chamadas TraCI..................: {calls['total']} (simulação: {calls['manager']}, controlador: {calls['controller']})",
+            "  - Tempos por chamada (p50 / p95 / p99 / máx, em ms):",
+        ]
+        labels = {"simulation_step": "simulationStep", "controller": "Controlador",
+                  "progress_log": "Registo de Progresso", "checkpoint": "Checkpoints"}
+        for name, label in labels.items():
+            section = timings['sections'].get(name, {})
+            if section.get('count'):
+                lines.append(f"      - {label:.<27}: {section['p50_ms']:.3f} / {section['p95_ms']:.3f} / "
+                             f"{section['p99_ms']:.3f} / {section['max_ms']:.3f} ({section['count']}x, {section['total_s']:.1f}s)")
+        return "\n".join(lines)
+
     def _display_summary_labels(self, data: dict):
         """
         FUNCIONALIDADE RESTAURADA:
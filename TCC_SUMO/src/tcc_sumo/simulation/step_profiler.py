@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de instrumentação de tempos por passo da simulação.
+
+PILAR DE QUALIDADE: Mensurabilidade
+DESCRIÇÃO: Para saber onde se gasta o tempo de uma execução, o SimulationManager
+mede cada secção do loop (simulationStep, decisão do controlador, registo de
+progresso, checkpoints, recolha de KPIs) e conta as chamadas TraCI. Cada tempo vai para um
+histograma logarítmico compacto (4 classes por oitava, de 1µs a ~1 min), do qual
+saem os percentis p50/p95/p99 sem guardar as amostras: a memória é constante
+mesmo em execuções de centenas de milhares de passos.
+
+O ETA do progresso usa o tempo final do .sumocfg; sem ele (os cenários gerados
+não o definem), o passo final é estimado: até à última partida das rotas é essa
+partida, depois é extrapolado do ritmo a que a rede esvazia.
+"""
+import csv
+import json
+import math
+import re
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Dict
+
+from tcc_sumo.utils.helpers import get_logger
+
+logger = get_logger("StepProfiler")
+
+BUCKETS_PER_OCTAVE = 4
+BUCKET_COUNT = 26 * BUCKETS_PER_OCTAVE  # 1µs · 2^26 ≈ 67s
+PERCENTILES = (50, 95, 99)
+# Bytes lidos do fim de cada ficheiro de rotas à procura da última partida.
+ROUTE_TAIL_BYTES = 64 * 1024
+_DEPART_RE = re.compile(rb'depart="([0-9.]+)"')
+
+def last_departure_time(sumocfg_path: Path) -> float | None:
+    """
+    Instante da última partida dos ficheiros de rotas de um .sumocfg.
+
+    As rotas geradas estão ordenadas por partida, por isso basta ler o fim de
+    cada ficheiro (os comprimidos são ignorados).
+    """
+    sumocfg_path = Path(sumocfg_path)
+    try:
+        route_files = ET.parse(sumocfg_path).find("input/route-files")
+    except (ET.ParseError, OSError):
+        return None
+    if route_files is None or not route_files.get("value"):
+        return None
+    departures = []
+    for name in route_files.get("value").split(","):
+        path = sumocfg_path.parent / name.strip()
+        if path.suffix == ".gz" or not path.is_file():
+            continue
+        with open(path, "rb") as f:
+            f.seek(max(0, path.stat().st_size - ROUTE_TAIL_BYTES))
+            matches = _DEPART_RE.findall(f.read())
+        if matches:
+            departures.append(max(float(match) for match in matches))
+    return max(departures) if departures else None
+
+def _bucket_upper_us(index: int) -> float:
+    """Limite superior (em µs) de uma classe do histograma."""
+    return 2 ** ((index + 1) / BUCKETS_PER_OCTAVE)
+
+class TimingHistogram:
+    """Histograma logarítmico de durações com contagem, soma e máximo exatos."""
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+
+    def record(self, seconds: float) -> None:
+        micros = seconds * 1e6
+        index = int(math.log2(micros) * BUCKETS_PER_OCTAVE) if micros > 1 else 0
+        self.counts[min(index, BUCKET_COUNT - 1)] += 1
+        self.count += 1
+        self.total_s += seconds
+        if seconds > self.max_s:
+            self.max_s = seconds
+
+    def percentile(self, p: float) -> float:
+        """Percentil `p` em segundos (limite superior da classe, nunca acima do máximo)."""
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * p / 100)
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return min(_bucket_upper_us(index) / 1e6, self.max_s)
+        return self.max_s
+
+    def summary(self) -> dict:
+        result = {
+            "count": self.count,
+            "total_s": round(self.total_s, 4),
+            "mean_ms": round(self.total_s / self.count * 1e3, 4) if self.count else 0.0,
+            "max_ms": round(self.max_s * 1e3, 4),
+        }
+        for p in PERCENTILES:
+            result[f"p{p}_ms"] = round(self.percentile(p) * 1e3, 4)
+        return result
+
+class StepProfiler:
+    """
+    Agrega os tempos das secções do loop e as chamadas TraCI de uma execução.
+    """
+    SECTIONS = ("simulation_step", "controller", "kpi_collector", "progress_log", "checkpoint")
+
+    def __init__(self):
+        self.histograms: Dict[str, TimingHistogram] = {name: TimingHistogram() for name in self.SECTIONS}
+        self.traci_calls: Dict[str, int] = {"manager": 0, "controller": 0, "kpi_collector": 0}
+        self.first_step = 0
+        self.started_at = time.perf_counter()
+        self.finished_at: float | None = None
+        # (passo, veículos por terminar) de referência para estimar o ritmo de esvaziamento da rede.
+        self._drain_reference: tuple[int, int] | None = None
+
+    def start(self, first_step: int) -> None:
+        """Marca o início do loop (numa retoma, `first_step` é o passo retomado)."""
+        self.first_step = first_step
+        self.started_at = time.perf_counter()
+
+    def record(self, section: str, seconds: float) -> None:
+        self.histograms[section].record(seconds)
+
+    def count_traci_calls(self, source: str, calls: int) -> None:
+        self.traci_calls[source] += calls
+
+    def finish(self) -> None:
+        self.finished_at = time.perf_counter()
+
+    def elapsed(self) -> float:
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    def steps_per_second(self, step: int) -> float:
+        elapsed = self.elapsed()
+        return (step - self.first_step) / elapsed if elapsed > 0 else 0.0
+
+    def estimated_last_step(self, step: int, remaining_vehicles: int, last_departure_step: int | None) -> int | None:
+        """
+        Passo final estimado quando o .sumocfg não define o tempo final.
+
+        Antes da última partida devolve essa partida; depois, extrapola o ritmo a que
+        `remaining_vehicles` (getMinExpectedNumber) desce desde a primeira estimativa.
+        """
+        if last_departure_step is not None and step < last_departure_step:
+            return last_departure_step
+        if self._drain_reference is None:
+            self._drain_reference = (step, remaining_vehicles)
+            return None
+        reference_step, reference_remaining = self._drain_reference
+        drained = reference_remaining - remaining_vehicles
+        if drained <= 0:
+            return None
+        return step + math.ceil(remaining_vehicles * (step - reference_step) / drained)
+
+    def eta_seconds(self, step: int, last_step: int | None) -> float | None:
+        """Tempo real estimado até ao fim, se o passo final for conhecido (ou estimado)."""
+        rate = self.steps_per_second(step)
+        if last_step is None or rate <= 0:
+            return None
+        return max(0, last_step - step) / rate
+
+    def summary(self, step: int) -> dict:
+        return {
+            "steps": step - self.first_step,
+            "wall_time_s": round(self.elapsed(), 3),
+            "steps_per_s": round(self.steps_per_second(step), 2),
+            "traci_calls": {**self.traci_calls, "total": sum(self.traci_calls.values())},
+            "sections": {name: histogram.summary() for name, histogram in self.histograms.items()},
+        }
+
+    def save(self, output_dir: Path, step: int) -> dict:
+        """Grava o resumo em 'step_timings.json' e os histogramas em 'step_timings.csv'."""
+        summary = self.summary(step)
+        json_path = Path(output_dir) / "step_timings.json"
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=4)
+        with open(Path(output_dir) / "step_timings.csv", 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["section", "bucket_upper_us", "count"])
+            for name, histogram in self.histograms.items():
+                for index, bucket_count in enumerate(histogram.counts):
+                    if bucket_count:
+                        writer.writerow([name, round(_bucket_upper_us(index), 3), bucket_count])
+        logger.info(f"Tempos por passo salvos em '{json_path}'.")
+        return summary
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de telemetria assíncrona do loop de simulação.
+
+PILAR DE QUALIDADE: Eficiência
+DESCRIÇÃO: Tudo o que o loop emite (progresso, contadores, KPIs parciais) era
+escrito no próprio thread da simulação, que assim esperava pelo disco. Aqui o
+loop apenas coloca registos compactos numa fila limitada; um thread de escrita
+em segundo plano junta-os em lotes e grava-os em JSONL (um registo por linha).
+Se o escritor ficar para trás, a política configurada decide: 'drop' descarta o
+registo (e conta-o) para que o loop nunca pare, 'block' espera por espaço na
+fila (nunca pelo disco) para não perder nenhum registo.
+"""
+import json
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+from tcc_sumo.utils.helpers import get_logger
+
+logger = get_logger("Telemetry")
+
+TELEMETRY_POLICIES = ('drop', 'block')
+_STOP = object()
+
+class TelemetryWriter:
+    """
+    Escreve em segundo plano, em lotes, os registos emitidos pelo loop de simulação.
+    """
+    def __init__(self, path: Path, queue_size: int = 10000, batch_size: int = 256,
+                 policy: str = 'drop', flush_interval_s: float = 1.0,
+                 on_record: Callable[[dict], None] | None = None):
+        if policy not in TELEMETRY_POLICIES:
+            raise ValueError(f"Política de telemetria inválida: '{policy}'. Opções: {', '.join(TELEMETRY_POLICIES)}.")
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self.policy = policy
+        self.flush_interval_s = flush_interval_s
+        # Chamado no thread de escrita para cada registo (ex.: linha de progresso no log).
+        self.on_record = on_record
+        self.records: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.emitted = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="TelemetryWriter", daemon=True)
+        self._thread.start()
+
+    def emit(self, record: dict) -> bool:
+        """Coloca um registo na fila sem tocar no disco. Devolve False se foi descartado."""
+        self.emitted += 1
+        if self.policy == 'block':
+            self.records.put(record)
+            return True
+        try:
+            self.records.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def close(self) -> None:
+        """Escreve os registos pendentes e termina o thread de escrita."""
+        if self._thread is None:
+            return
+        self.records.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        logger.info(f"Telemetria: {self.written} registos em {self.batches} lotes gravados em '{self.path}' "
+                    f"({self.dropped} descartados pela política '{self.policy}').")
+
+    def _run(self) -> None:
+        with open(self.path, 'a', encoding='utf-8') as f:
+            stopping = False
+            while not stopping:
+                batch = []
+                deadline = time.monotonic() + self.flush_interval_s
+                # Junta registos até encher o lote ou esgotar o intervalo de escrita.
+                while len(batch) < self.batch_size:
+                    try:
+                        record = self.records.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if record is _STOP:
+                        stopping = True
+                        break
+                    batch.append(record)
+                if batch:
+                    self._write_batch(f, batch)
+
+    def _write_batch(self, f, batch: list) -> None:
+        f.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in batch))
+        f.flush()
+        self.written += len(batch)
+        self.batches += 1
+        if self.on_record:
+            for record in batch:
+                try:
+                    self.on_record(record)
+                except Exception as e:
+                    logger.warning(f"Falha ao processar registo de telemetria: {e}")
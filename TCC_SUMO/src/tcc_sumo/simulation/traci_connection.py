@@ -13,25 +13,34 @@ from tcc_sumo.utils.helpers import get_logger
 
 logger = get_logger("tcc_sumo.simulation.traci_connection")
 
+# Segundos de espera para o SUMO terminar sozinho após o fecho da conexão.
+SUMO_SHUTDOWN_TIMEOUT = 30
+
 class TraciConnection:
     """
     Encapsula a lógica para iniciar o SUMO como um subprocesso e conectar via TraCI.
+
+    Com o backend 'libsumo' a simulação corre no próprio processo Python e não
+    há subprocesso nem porta TCP; o resto do código continua a usar `traci`.
     """
-    def __init__(self, sumo_executable: str, config_file: str, port: int):
+    def __init__(self, sumo_executable: str, config_file: str, port: int, backend: str = "socket",
+                 extra_args: list | None = None):
         self.sumo_executable = sumo_executable
         self.config_file = config_file
         self.port = port
+        self.backend = backend
+        # Argumentos adicionais para o SUMO (ex.: redirecionar outputs, semente).
+        self.extra_args = [str(arg) for arg in extra_args or []]
         self.sumo_process = None
+        if (backend == "libsumo") != traci.isLibsumo():
+            raise RuntimeError(f"Backend '{backend}' configurado, mas o módulo 'traci' foi carregado como "
+                               f"'{'libsumo' if traci.isLibsumo() else 'socket'}'. Use select_traci_backend() antes de importar 'traci'.")
 
-    def start(self) -> None:
-        """
-        Inicia o processo do SUMO e estabelece a conexão TraCI.
-        """
-        sumo_cmd = [
+    def _base_command(self) -> list:
+        """Argumentos do SUMO comuns aos dois backends."""
+        return [
             self.sumo_executable,
             "-c", self.config_file,
-            "--remote-port", str(self.port),
-            "--start",
             "--quit-on-end",
             # --- CORREÇÃO DEFINITIVA ---
             # PILAR DE QUALIDADE: Realismo da Simulação
@@ -39,8 +48,22 @@ class TraciConnection:
             # desabilitar completamente o teletransporte de veículos. Agora,
             # se um veículo ficar preso, ele permanecerá preso, refletindo
             # um congestionamento real, o que é crucial para a análise.
-            "--time-to-teleport", "-1"
+            "--time-to-teleport", "-1",
+            *self.extra_args
         ]
+
+    def start(self) -> None:
+        """
+        Inicia o processo do SUMO e estabelece a conexão TraCI.
+        """
+        if self.backend == "libsumo":
+            sumo_cmd = self._base_command()
+            logger.info(f"Iniciando SUMO em processo (libsumo): {' '.join(sumo_cmd)}")
+            traci.start(sumo_cmd)
+            logger.info("Simulação libsumo carregada no processo atual.")
+            return
+
+        sumo_cmd = self._base_command() + ["--remote-port", str(self.port), "--start"]
         logger.info(f"Iniciando processo do SUMO: {' '.join(sumo_cmd)}")
 
         self.sumo_process = subprocess.Popen(sumo_cmd, stdout=sys.stdout, stderr=sys.stderr)
@@ -72,7 +95,12 @@ class TraciConnection:
             logger.warning("Tentativa de fechar uma conexão TraCI já inexistente.")
         finally:
             if self.sumo_process:
-                self.sumo_process.terminate()
-                self.sumo_process.wait()
+                # Dá ao SUMO tempo para fechar os ficheiros de output antes de o terminar;
+                # um terminate imediato deixava tripinfo/emissions truncados.
+                try:
+                    self.sumo_process.wait(timeout=SUMO_SHUTDOWN_TIMEOUT)
+                except subprocess.TimeoutExpired:
+                    self.sumo_process.terminate()
+                    self.sumo_process.wait()
                 logger.info("Processo do SUMO finalizado.")
                 self.sumo_process = None
\ No newline at end of file
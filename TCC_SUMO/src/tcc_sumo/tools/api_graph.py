@@ -0,0 +1,411 @@
+# -*- coding: utf-8 -*-
+"""
+Conversão em streaming do grafo exportado pela API (dados_api.json) para os
+ficheiros plain do netconvert (nod.xml e edg.xml).
+
+PILAR DE QUALIDADE: Escalabilidade, Eficiência
+DESCRIÇÃO: O gerador fazia json.load do documento inteiro e escrevia cada nó e
+cada aresta com uma chamada f.write; com as exportações de uma cidade inteira
+(vários GB) o documento não cabe em memória. Aqui o ficheiro é lido em blocos
+e os elementos dos arrays 'nodes' e 'relationships' são descodificados um a um
+(json.JSONDecoder.raw_decode, em C), sem nunca materializar o documento. As
+linhas XML são acumuladas em lotes e escritas de uma só vez. A memória fica
+limitada ao conjunto de ids dos nós válidos, necessário para filtrar as
+arestas.
+
+Antes da escrita, o grafo é limpo (ver `preprocess_graph`): as exportações
+trazem nós OSM quase duplicados, relações cujas pontas não são nós com
+coordenadas (ex.: HAS_NODE, de vias para nós) e pequenos fragmentos isolados,
+que o netconvert (com --junctions.join e --roundabouts.guess) processaria na
+mesma, com custo de tempo e memória. Os nós a menos de MERGE_TOLERANCE_M
+metros são fundidos com um índice espacial em grelha (hash das células de
+lado igual à tolerância, comparando só células vizinhas), e as componentes
+ligadas com menos de MIN_COMPONENT_NODES nós são descartadas. O relatório com
+as contagens de cada etapa é gravado junto ao cenário; a comparação do tempo
+do netconvert com e sem pré-processamento é feita com
+python3 -m tcc_sumo.tools.api_graph <dados_api.json>.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tcc_sumo.utils.helpers import get_logger
+
+logger = get_logger("ApiGraph")
+
+# Caracteres lidos de cada vez do JSON; duplica enquanto um elemento não couber no buffer.
+READ_CHUNK_CHARS = 1024 * 1024
+# Linhas XML acumuladas antes de cada escrita.
+WRITE_BATCH_LINES = 10000
+# Distância (m) abaixo da qual dois nós são o mesmo cruzamento; 0 desativa a fusão.
+MERGE_TOLERANCE_M = 1.0
+# Componentes ligadas com menos nós são descartadas; 0 ou 1 mantém todas.
+MIN_COMPONENT_NODES = 10
+EARTH_RADIUS_M = 6371008.8
+_WHITESPACE = " \t\n\r"
+_DECODER = json.JSONDecoder()
+
+class _JsonStream:
+    """Buffer sobre um ficheiro JSON em texto, com descodificação incremental de valores."""
+    def __init__(self, f):
+        self.file = f
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.chunk_chars = READ_CHUNK_CHARS
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        data = self.file.read(self.chunk_chars)
+        if not data:
+            self.eof = True
+            return False
+        # Descarta o que já foi consumido antes de acrescentar o bloco novo.
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Próximo carácter significativo (sem o consumir); '' no fim do ficheiro."""
+        while True:
+            buffer, pos = self.buffer, self.pos
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            self.pos = pos
+            if pos < len(buffer):
+                return buffer[pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"JSON inválido: esperado '{char}', encontrado '{found or 'fim do ficheiro'}'.")
+        self.pos += 1
+
+    def value(self):
+        """Descodifica o próximo valor JSON completo."""
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buffer, self.pos)
+                # Um valor que termina no fim do buffer pode estar cortado (ex.: um número).
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if not self._fill():
+                # Fim do ficheiro: a próxima tentativa aceita o valor ou propaga o erro.
+                continue
+            # Leituras do tamanho do buffer: um elemento grande precisa de O(log n) tentativas.
+            self.chunk_chars = max(self.chunk_chars, len(self.buffer))
+
+def iter_json_arrays(path: Path, keys: Iterable[str]) -> Iterator[Tuple[str, object]]:
+    """
+    Percorre um objeto JSON de topo e devolve (chave, elemento) para cada
+    elemento dos arrays `keys`, pela ordem do documento. Os restantes arrays
+    são descodificados elemento a elemento e descartados.
+    """
+    keys = set(keys)
+    with open(path, "r", encoding="utf-8") as f:
+        stream = _JsonStream(f)
+        stream.expect("{")
+        while stream.peek() != "}":
+            key = stream.value()
+            stream.expect(":")
+            if stream.peek() != "[":
+                stream.value()
+            else:
+                stream.pos += 1
+                wanted = key in keys
+                while stream.peek() != "]":
+                    item = stream.value()
+                    if wanted:
+                        yield key, item
+                    if stream.peek() == ",":
+                        stream.pos += 1
+                stream.pos += 1
+            if stream.peek() == ",":
+                stream.pos += 1
+            elif stream.peek() != "}":
+                raise ValueError(f"JSON inválido em '{Path(path).name}': esperado ',' ou '}}' após '{key}'.")
+
+class _BatchWriter:
+    """Escreve linhas num ficheiro em lotes de WRITE_BATCH_LINES."""
+    def __init__(self, f):
+        self.file = f
+        self.lines = []
+        self.count = 0
+
+    def write(self, line: str) -> None:
+        self.lines.append(line)
+        if len(self.lines) >= WRITE_BATCH_LINES:
+            self.flush()
+
+    def flush(self) -> None:
+        self.file.write("".join(self.lines))
+        self.count += len(self.lines)
+        self.lines.clear()
+
+@dataclass
+class ApiGraph:
+    """
+    Nós com coordenadas e pontas de todas as relações (-1 se a ponta não for um
+    desses nós), pela ordem do documento; os atributos restantes das relações
+    são relidos do ficheiro na escrita.
+    """
+    node_ids: List[str]
+    lon: np.ndarray
+    lat: np.ndarray
+    traffic_light: np.ndarray
+    edge_from: np.ndarray
+    edge_to: np.ndarray
+    input_nodes: int
+
+    @property
+    def node_count(self) -> int:
+        return len(self.node_ids)
+
+def load_api_graph(api_path: Path) -> ApiGraph:
+    """Lê em streaming os nós com coordenadas e as pontas das relações."""
+    node_index = {}
+    node_ids, lon, lat, traffic_light = [], array("d"), array("d"), array("b")
+    edge_from, edge_to = array("q"), array("q")
+    input_nodes = 0
+    deferred_edges = False
+
+    def add_edge(edge: dict) -> None:
+        edge_from.append(node_index.get(str(edge.get("startNodeId")), -1))
+        edge_to.append(node_index.get(str(edge.get("endNodeId")), -1))
+
+    for key, item in iter_json_arrays(api_path, ("nodes", "relationships")):
+        if key == "nodes":
+            input_nodes += 1
+            prop = item.get("properties", {})
+            if "lon" in prop and "lat" in prop:
+                node_index[str(item["id"])] = len(node_ids)
+                node_ids.append(str(item["id"]))
+                lon.append(prop["lon"])
+                lat.append(prop["lat"])
+                traffic_light.append(prop.get("highway") == "traffic_signals")
+        elif not node_index:
+            # Relações antes dos nós: só podem ser resolvidas numa segunda passagem.
+            deferred_edges = True
+        elif not deferred_edges:
+            add_edge(item)
+    if deferred_edges:
+        for _, item in iter_json_arrays(api_path, ("relationships",)):
+            add_edge(item)
+    return ApiGraph(node_ids, np.frombuffer(lon, dtype=np.float64), np.frombuffer(lat, dtype=np.float64),
+                    np.frombuffer(traffic_light, dtype=np.int8).astype(bool),
+                    np.frombuffer(edge_from, dtype=np.int64), np.frombuffer(edge_to, dtype=np.int64), input_nodes)
+
+def connected_labels(count: int, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Componentes ligadas (não dirigidas) dos pares (a, b): cada nó recebe o menor
+    índice da sua componente. Ligação das raízes e salto de ponteiros, vetorizados.
+    """
+    labels = np.arange(count)
+    while True:
+        label_a, label_b = labels[a], labels[b]
+        lowest = np.minimum(label_a, label_b)
+        hooked = labels.copy()
+        np.minimum.at(hooked, label_a, lowest)
+        np.minimum.at(hooked, label_b, lowest)
+        while True:
+            jumped = hooked[hooked]
+            if np.array_equal(jumped, hooked):
+                break
+            hooked = jumped
+        if np.array_equal(hooked, labels):
+            return labels
+        labels = hooked
+
+def close_pairs(x: np.ndarray, y: np.ndarray, tolerance: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pares de pontos a menos de `tolerance` (coordenadas métricas), com um hash em
+    grelha: com células do lado da tolerância, só a própria célula e as vizinhas
+    podem conter pontos próximos. Cada par é devolvido uma vez.
+    """
+    cell_x = np.floor(x / tolerance).astype(np.int64)
+    cell_y = np.floor(y / tolerance).astype(np.int64)
+    cell_x -= cell_x.min()
+    cell_y -= cell_y.min() - 1
+    width = int(cell_y.max()) + 2
+    keys = cell_x * width + cell_y
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    positions = np.arange(len(order))
+    firsts, seconds = [], []
+    # Metade das vizinhas (mais a própria célula): o par simétrico vem da outra ponta.
+    for dx, dy in ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1)):
+        target = sorted_keys + dx * width + dy
+        low = np.searchsorted(sorted_keys, target, side="left")
+        high = np.searchsorted(sorted_keys, target, side="right")
+        if dx == 0 and dy == 0:
+            low = np.maximum(low, positions + 1)
+        counts = np.maximum(high - low, 0)
+        total = int(counts.sum())
+        if not total:
+            continue
+        first = np.repeat(positions, counts)
+        second = np.repeat(low, counts) + np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        first, second = order[first], order[second]
+        near = np.hypot(x[first] - x[second], y[first] - y[second]) <= tolerance
+        firsts.append(first[near])
+        seconds.append(second[near])
+    if not firsts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(firsts), np.concatenate(seconds)
+
+def preprocess_graph(graph: ApiGraph, merge_tolerance_m: float = MERGE_TOLERANCE_M,
+                     min_component_nodes: int = MIN_COMPONENT_NODES) -> Tuple[np.ndarray, np.ndarray, dict]:
+    """
+    Limpa o grafo antes do netconvert e devolve (nó → nó representante ou -1 se
+    descartado, máscara das relações a escrever, relatório com as contagens).
+
+    Etapas: fusão dos nós a menos de `merge_tolerance_m` (o representante é o
+    primeiro do documento), remoção das relações com pontas em falta, dos
+    lacetes e duplicados criados pela fusão, e das componentes ligadas com
+    menos de `min_component_nodes` nós.
+    """
+    count = graph.node_count
+    report = {"input_nodes": graph.input_nodes, "input_relationships": len(graph.edge_from),
+              "nodes_without_coordinates": graph.input_nodes - count,
+              "merge_tolerance_m": merge_tolerance_m, "min_component_nodes": min_component_nodes}
+
+    representative = np.arange(count)
+    if merge_tolerance_m > 0 and count:
+        # Projeção equirretangular local: exata o suficiente à escala da tolerância.
+        lat0 = np.radians(graph.lat.mean())
+        x = np.radians(graph.lon) * EARTH_RADIUS_M * np.cos(lat0)
+        y = np.radians(graph.lat) * EARTH_RADIUS_M
+        first, second = close_pairs(x, y, merge_tolerance_m)
+        representative = connected_labels(count, first, second)
+    report["merged_nodes"] = int(count - np.count_nonzero(representative == np.arange(count)))
+
+    edge_from, edge_to = graph.edge_from, graph.edge_to
+    keep = (edge_from >= 0) & (edge_to >= 0)
+    report["dangling_relationships"] = int(len(keep) - np.count_nonzero(keep))
+    mapped_from = np.where(keep, representative[np.maximum(edge_from, 0)], -1)
+    mapped_to = np.where(keep, representative[np.maximum(edge_to, 0)], -1)
+    loops = keep & (mapped_from == mapped_to)
+    keep &= ~loops
+    # Fica a primeira relação de cada par (origem, destino) após a fusão.
+    candidates = np.flatnonzero(keep)
+    _, first_index = np.unique(mapped_from[candidates] * count + mapped_to[candidates], return_index=True)
+    unique = np.zeros(len(keep), dtype=bool)
+    unique[candidates[first_index]] = True
+    report["self_loops"] = int(np.count_nonzero(loops))
+    report["duplicate_edges"] = int(np.count_nonzero(keep & ~unique))
+    keep &= unique
+
+    node_map = representative.copy()
+    is_representative = representative == np.arange(count)
+    report["small_components"] = report["small_component_nodes"] = report["small_component_edges"] = 0
+    if min_component_nodes > 1 and count:
+        component = connected_labels(count, mapped_from[keep], mapped_to[keep])[representative]
+        sizes = np.bincount(component[is_representative], minlength=count)
+        small = sizes[component] < min_component_nodes
+        kept_edges = keep.copy()
+        kept_edges[keep] = ~small[mapped_from[keep]]
+        report["small_components"] = int(np.count_nonzero((sizes > 0) & (sizes < min_component_nodes)))
+        report["small_component_nodes"] = int(np.count_nonzero(small & is_representative))
+        report["small_component_edges"] = int(np.count_nonzero(keep & ~kept_edges))
+        node_map[small] = -1
+        keep = kept_edges
+
+    report["output_nodes"] = int(np.count_nonzero(is_representative & (node_map >= 0)))
+    report["output_edges"] = int(np.count_nonzero(keep))
+    return node_map, keep, report
+
+def write_plain_xml(api_path: Path, nodes_file: Path, edges_file: Path, merge_tolerance_m: float = MERGE_TOLERANCE_M,
+                    min_component_nodes: int = MIN_COMPONENT_NODES) -> dict:
+    """
+    Escreve o nod.xml e o edg.xml a partir da exportação da API, depois de
+    `preprocess_graph`, e devolve o relatório do pré-processamento. As
+    relações são relidas em streaming para a escrita.
+    """
+    graph = load_api_graph(api_path)
+    node_map, edge_keep, report = preprocess_graph(graph, merge_tolerance_m, min_component_nodes)
+    node_ids = graph.node_ids
+    valid = node_map >= 0
+    # Um nó fundido é semáforo se algum dos nós originais o era.
+    traffic_light = np.bincount(node_map[valid], weights=graph.traffic_light[valid], minlength=graph.node_count) > 0
+    edge_from, edge_to = graph.edge_from.tolist(), graph.edge_to.tolist()
+    node_map_list = node_map.tolist()
+    lon, lat = graph.lon.tolist(), graph.lat.tolist()
+
+    with open(nodes_file, "w", encoding="utf-8") as nodes_f, open(edges_file, "w", encoding="utf-8") as edges_f:
+        nodes, edges = _BatchWriter(nodes_f), _BatchWriter(edges_f)
+        nodes_f.write("<nodes>\n")
+        for index in np.flatnonzero(valid & (node_map == np.arange(graph.node_count))).tolist():
+            node_type = "traffic_light" if traffic_light[index] else "priority"
+            nodes.write(f'    <node id="{node_ids[index]}" x="{lon[index]}" y="{lat[index]}" type="{node_type}"/>\n')
+        nodes.flush()
+        nodes_f.write("</nodes>")
+
+        edges_f.write("<edges>\n")
+        keep = edge_keep.tolist()
+        ordinal = 0
+        for _, edge in iter_json_arrays(api_path, ("relationships",)):
+            if keep[ordinal]:
+                edges.write(f'    <edge id="{edge["id"]}" from="{node_ids[node_map_list[edge_from[ordinal]]]}" '
+                            f'to="{node_ids[node_map_list[edge_to[ordinal]]]}" numLanes="1" speed="13.89"/>\n')
+            ordinal += 1
+        edges.flush()
+        edges_f.write("</edges>")
+    logger.info(f"Grafo da API pré-processado: {report['input_nodes']} → {report['output_nodes']} nós, "
+                f"{report['input_relationships']} → {report['output_edges']} arestas "
+                f"({report['merged_nodes']} nós fundidos, {report['dangling_relationships']} relações sem pontas, "
+                f"{report['small_components']} componentes pequenas).")
+    return report
+
+def _timed_netconvert(nodes_file: Path, edges_file: Path, net_file: Path, options: list) -> float:
+    netconvert = Path(os.environ["SUMO_HOME"]) / "bin" / "netconvert"
+    start = time.perf_counter()
+    subprocess.run([str(netconvert), "--node-files", str(nodes_file), "--edge-files", str(edges_file),
+                    "-o", str(net_file), *options], check=True, capture_output=True)
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    from tcc_sumo.tools.scenario_generator import NETCONVERT_OPTIONS
+    from tcc_sumo.utils.helpers import ensure_sumo_home, setup_logging
+    parser = argparse.ArgumentParser(description="Compara o netconvert do cenário 'api' com e sem pré-processamento do grafo.")
+    parser.add_argument("input", type=Path, help="Exportação da API (ex.: scenarios/base_files/dados_api.json).")
+    parser.add_argument("--tolerance", type=float, default=MERGE_TOLERANCE_M, help="Distância de fusão dos nós (m).")
+    parser.add_argument("--min-component-nodes", type=int, default=MIN_COMPONENT_NODES,
+                        help="Nós mínimos de uma componente ligada.")
+    args = parser.parse_args()
+
+    setup_logging()
+    ensure_sumo_home()
+    rows = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        for label, tolerance, min_nodes in (("sem pré-processamento", 0.0, 0),
+                                            ("com pré-processamento", args.tolerance, args.min_component_nodes)):
+            nodes_file, edges_file = tmp / "api.nod.xml", tmp / "api.edg.xml"
+            report = write_plain_xml(args.input, nodes_file, edges_file, tolerance, min_nodes)
+            seconds = _timed_netconvert(nodes_file, edges_file, tmp / "api.net.xml", NETCONVERT_OPTIONS["api"])
+            rows[label] = (report["output_nodes"], report["output_edges"], seconds)
+    print(f"{'':<24}{'nós':>10}{'arestas':>10}{'netconvert (s)':>16}")
+    for label, (nodes, edges, seconds) in rows.items():
+        print(f"{label:<24}{nodes:>10}{edges:>10}{seconds:>16.2f}")
+    (raw_nodes, raw_edges, raw_s), (nodes, edges, seconds) = rows.values()
+    print(f"{'redução':<24}{1 - nodes / max(raw_nodes, 1):>10.1%}{1 - edges / max(raw_edges, 1):>10.1%}"
+          f"{1 - seconds / max(raw_s, 1e-9):>16.1%}")
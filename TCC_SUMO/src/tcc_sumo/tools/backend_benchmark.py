@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de passos/segundo dos backends TraCI ('socket' e 'libsumo').
+
+PILAR DE QUALIDADE: Mensurabilidade
+DESCRIÇÃO: Executa o mesmo controlador sobre os cenários gerados com cada
+backend e reporta a taxa de passos por segundo. Como o backend do `traci` é
+fixado no primeiro import, cada medição corre num subprocesso Python próprio.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tcc_sumo.utils.helpers import get_logger, setup_logging, select_traci_backend, TRACI_BACKENDS, PROJECT_ROOT
+
+logger = get_logger("BackendBenchmark")
+
+def load_config() -> dict:
+    with open(PROJECT_ROOT / "config" / "config.yaml", 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f)
+
+def run_worker(scenario: str, backend: str, mode: str, max_steps: int, result_file: Path) -> None:
+    """Mede uma combinação cenário/backend no processo atual e grava o resultado em JSON."""
+    config = load_config()
+    select_traci_backend(backend, "sumo")
+    import traci
+    from tcc_sumo.simulation.traci_connection import TraciConnection
+    from tcc_sumo.traffic_logic.controllers import AdaptiveController, StaticController
+
+    # Os outputs vão para um diretório temporário para não sobrepor os da última simulação.
+    with tempfile.TemporaryDirectory(prefix="tcc_bench_") as tmp_dir:
+        connection = TraciConnection(
+            "sumo",
+            str(PROJECT_ROOT / config['scenarios'][scenario]),
+            config.get('traci_port', 8813),
+            backend,
+            extra_args=["--no-step-log",
+                        "--tripinfo-output", Path(tmp_dir) / "tripinfo.xml",
+                        "--emission-output", Path(tmp_dir) / "emissions.xml",
+                        "--queue-output", Path(tmp_dir) / "queueinfo.xml"]
+        )
+        controller = AdaptiveController() if mode == 'ADAPTIVE' else StaticController()
+        connection.start()
+        try:
+            controller.setup()
+            step = 0
+            start = time.perf_counter()
+            while step < max_steps and traci.simulation.getMinExpectedNumber() > 0:
+                traci.simulationStep()
+                controller.manage_traffic_lights(step)
+                step += 1
+            elapsed = time.perf_counter() - start
+        finally:
+            connection.close()
+
+    result = {
+        "scenario": scenario, "backend": backend, "mode": mode, "steps": step,
+        "elapsed_s": round(elapsed, 3),
+        "steps_per_s": round(step / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+    result_file.write_text(json.dumps(result), encoding='utf-8')
+
+def run_benchmark(scenarios: list, backends: list, mode: str, max_steps: int) -> list:
+    """Executa cada combinação num subprocesso isolado e devolve os resultados."""
+    results = []
+    for scenario in scenarios:
+        for backend in backends:
+            logger.info(f"A medir cenário '{scenario}' com backend '{backend}' ({mode}, até {max_steps} passos)...")
+            with tempfile.TemporaryDirectory(prefix="tcc_bench_result_") as tmp_dir:
+                result_file = Path(tmp_dir) / "result.json"
+                cmd = [sys.executable, str(Path(__file__).resolve()), "--worker",
+                       "--scenarios", scenario, "--backends", backend, "--mode", mode,
+                       "--steps", str(max_steps), "--result-file", str(result_file)]
+                completed = subprocess.run(cmd, cwd=PROJECT_ROOT, capture_output=True, text=True, encoding='utf-8')
+                if completed.returncode != 0 or not result_file.exists():
+                    logger.error(f"Benchmark falhou para '{scenario}'/'{backend}':\n{completed.stderr.strip()}")
+                    continue
+                results.append(json.loads(result_file.read_text(encoding='utf-8')))
+    return results
+
+def print_report(results: list) -> None:
+    print(f"{'Cenário':<10} {'Backend':<9} {'Passos':>8} {'Tempo (s)':>10} {'Passos/s':>10}")
+    for r in results:
+        print(f"{r['scenario']:<10} {r['backend']:<9} {r['steps']:>8} {r['elapsed_s']:>10.2f} {r['steps_per_s']:>10.2f}")
+    for scenario in dict.fromkeys(r['scenario'] for r in results):
+        rates = {r['backend']: r['steps_per_s'] for r in results if r['scenario'] == scenario}
+        if rates.get('socket') and rates.get('libsumo'):
+            print(f"[{scenario}] libsumo é {rates['libsumo'] / rates['socket']:.2f}x o socket.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de passos/segundo dos backends TraCI.")
+    parser.add_argument("--scenarios", nargs="+", default=['osm', 'api'])
+    parser.add_argument("--backends", nargs="+", default=list(TRACI_BACKENDS), choices=TRACI_BACKENDS)
+    parser.add_argument("--mode", type=str, default='ADAPTIVE', choices=['STATIC', 'ADAPTIVE'])
+    parser.add_argument("--steps", type=int, default=3600, help="Número máximo de passos por medição.")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    setup_logging()
+    if args.worker:
+        run_worker(args.scenarios[0], args.backends[0], args.mode, args.steps, args.result_file)
+    else:
+        results = run_benchmark(args.scenarios, args.backends, args.mode, args.steps)
+        output_file = PROJECT_ROOT / "logs" / "backend_benchmark.json"
+        output_file.write_text(json.dumps(results, indent=4), encoding='utf-8')
+        print_report(results)
+        logger.info(f"Resultados do benchmark salvos em '{output_file}'.")
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+Executor paralelo da matriz de experiências: cenário × modo × densidade × semente.
+
+PILAR DE QUALIDADE: Escalabilidade
+DESCRIÇÃO: Cada combinação corre num processo próprio de um pool, com uma porta
+TraCI livre e um diretório de output isolado, para que várias simulações possam
+correr ao mesmo tempo sem disputar a porta 8813 nem sobrescrever os ficheiros de
+'scenarios/from_<tipo>/'. Os cenários de cada densidade são gerados uma única vez
+e partilhados por todos os modos e sementes. No fim, os resultados de todas as
+execuções são reunidos num único conjunto de dados (JSON e CSV).
+
+Com `--warmup-steps N` (arranque a quente), o período de enchimento da rede é
+simulado uma única vez por cenário/densidade/semente e gravado num checkpoint;
+as continuações STATIC e ADAPTIVE partem em paralelo desse mesmo estado. Cada
+comparação custa metade e o delta A/B deixa de incluir o ruído do aquecimento.
+"""
+import argparse
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tcc_sumo.utils.helpers import (get_logger, setup_logging, ensure_sumo_home, select_traci_backend,
+                                    find_free_port, PROJECT_ROOT)
+
+logger = get_logger("ExperimentRunner")
+
+EXPERIMENTS_DIR = PROJECT_ROOT / "experiments"
+BASE_FILES = {'osm': "osm_bbox.osm.xml", 'api': "dados_api.json"}
+
+def load_config() -> dict:
+    with open(PROJECT_ROOT / "config" / "config.yaml", 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f)
+
+def _isolate_job_output(log_dir: Path, name: str) -> None:
+    """Redireciona logs e consola do processo filho para ficheiros no diretório do job."""
+    log_dir.mkdir(parents=True, exist_ok=True)
+    logging.basicConfig(
+        filename=log_dir / f"{name}.log", level=logging.INFO, encoding='utf-8', force=True,
+        format="[%(asctime)s] [%(levelname)-8s] [%(name)-25s] : %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
+    )
+    console = open(log_dir / f"{name}.console.log", 'a', encoding='utf-8', buffering=1)
+    sys.stdout = sys.stderr = console
+
+def generate_job_scenario(scenario: str, vehicle_count: int, scenario_dir: str) -> str:
+    """Gera (num processo filho) o cenário de uma densidade e devolve o caminho do .sumocfg."""
+    from tcc_sumo.tools import scenario_generator
+    scenario_dir = Path(scenario_dir)
+    # O gerador recria o diretório de saída, por isso os logs ficam ao lado dele.
+    _isolate_job_output(scenario_dir.parent, f"{scenario_dir.name}.generation")
+    base_file = PROJECT_ROOT / "scenarios" / "base_files" / BASE_FILES[scenario]
+    scenario_generator.generate_scenario(scenario, base_file, scenario_dir, vehicle_count)
+    return str(scenario_dir / f"{scenario}.sumocfg")
+
+def _job_config() -> dict:
+    """Configuração de um processo filho: SUMO sem GUI e porta TraCI livre."""
+    config = load_config()
+    config['sumo_executable'] = "sumo"
+    config['traci_port'] = find_free_port()
+    # As simulações já correm em paralelo: a análise de cada uma fica num só processo.
+    config['analysis_workers'] = 1
+    select_traci_backend(config.get('traci_backend', 'socket'), config['sumo_executable'])
+    return config
+
+def run_warmup(job: dict) -> str:
+    """
+    Simula (num processo filho) o aquecimento da rede e grava-o num checkpoint.
+
+    O aquecimento corre com os programas fixos do SUMO; o estado gravado inclui
+    os geradores aleatórios, para que todas as continuações partam do mesmo ponto.
+    Devolve o diretório do checkpoint.
+    """
+    warmup_dir = Path(job['output_dir'])
+    _isolate_job_output(warmup_dir, "warmup")
+    config = _job_config()
+    import traci
+    from tcc_sumo.simulation.checkpoint import CheckpointManager, SAVE_STATE_ARGS
+    from tcc_sumo.simulation.traci_connection import TraciConnection
+    from tcc_sumo.tools.output_formats import sumo_output_args
+    from tcc_sumo.traffic_logic.controllers import AdaptiveController
+
+    connection = TraciConnection(
+        config['sumo_executable'], job['sumocfg'], config['traci_port'], config.get('traci_backend', 'socket'),
+        extra_args=["--no-step-log", "--seed", job['seed'], *SAVE_STATE_ARGS,
+                    *sumo_output_args(warmup_dir.resolve(), config.get('output_format', 'xml'))]
+    )
+    connection.start()
+    try:
+        # O passo N do SimulationManager termina no instante N+1: o checkpoint do passo
+        # `warmup_steps - 1` faz as continuações começarem exatamente no passo `warmup_steps`.
+        start_time = traci.simulation.getTime()
+        traci.simulationStep(start_time + job['warmup_steps'] * traci.simulation.getDeltaT())
+        checkpoints = CheckpointManager(warmup_dir / "checkpoints", interval_steps=0)
+        # O início de cada fase vem do SUMO, para o ADAPTIVE não forçar trocas em todos os semáforos na retoma.
+        checkpoint_step = job['warmup_steps'] - 1
+        checkpoints.save(checkpoint_step, {"controller": AdaptiveController.state_from_sumo(checkpoint_step)})
+    finally:
+        connection.close()
+    return str(checkpoints.directory)
+
+def run_job(job: dict) -> dict:
+    """Executa (num processo filho) uma simulação da matriz e devolve o registo de resultados."""
+    job_dir = Path(job['output_dir'])
+    _isolate_job_output(job_dir, "simulation")
+    if job.get('warmup_checkpoint'):
+        # Cada continuação recebe a sua cópia do checkpoint e retoma-o como um '--resume'.
+        shutil.copytree(job['warmup_checkpoint'], job_dir / "checkpoints", dirs_exist_ok=True)
+
+    config = _job_config()
+    config['scenarios'] = {job['scenario']: job['sumocfg']}
+    from tcc_sumo.simulation.manager import SimulationManager
+
+    manager = SimulationManager(config, job['scenario'], job['mode'], output_dir=str(job_dir),
+                                seed=job['seed'], consolidate=False, resume=bool(job.get('warmup_checkpoint')))
+    manager.run()
+    return {
+        "scenario": job['scenario'], "mode": job['mode'], "vehicle_count": job['vehicle_count'],
+        "seed": job['seed'], "warmup_steps": job.get('warmup_steps', 0),
+        "output_dir": str(job_dir), "steps": manager.step,
+        "status": "ok" if manager.results else "failed",
+        **manager.results,
+    }
+
+def run_matrix(scenarios: list, modes: list, densities: list, seeds: list, workers: int,
+               warmup_steps: int = 0) -> Path:
+    """
+    Gera os cenários e executa toda a matriz no pool; devolve o diretório da experiência.
+    Com `warmup_steps` > 0, as simulações de cada semente partem de um aquecimento partilhado.
+    """
+    run_dir = EXPERIMENTS_DIR / datetime.now().strftime('%Y%m%d_%H%M%S')
+    run_dir.mkdir(parents=True)
+    total_jobs = len(scenarios) * len(modes) * len(densities) * len(seeds)
+    logger.info(f"Experiência em '{run_dir}': {total_jobs} simulações com até {workers} processos em paralelo.")
+
+    records = []
+    # 'spawn' + um job por processo: cada simulação começa com um `traci` limpo
+    # (obrigatório para o libsumo, que só suporta uma simulação por processo).
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, max_tasks_per_child=1) as pool:
+        pending = {}
+        for scenario, density in itertools.product(scenarios, densities):
+            scenario_dir = run_dir / "scenarios" / f"{scenario}_{density}"
+            future = pool.submit(generate_job_scenario, scenario, density, str(scenario_dir))
+            pending[future] = ('generate', {"scenario": scenario, "vehicle_count": density})
+
+        # As simulações de uma densidade são lançadas assim que o seu cenário fica pronto.
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, info = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Falha em {kind} {info}: {e}")
+                    # Cada simulação que já não vai correr fica registada como falhada.
+                    if kind == 'run':
+                        records.append({**info, "status": "failed", "error": str(e)})
+                    elif kind == 'warmup':
+                        records.extend({**info, "mode": mode, "status": "failed", "error": str(e)} for mode in modes)
+                    else:
+                        records.extend({**info, "mode": mode, "seed": seed, "warmup_steps": warmup_steps,
+                                        "status": "failed", "error": str(e)}
+                                       for mode, seed in itertools.product(modes, seeds))
+                    logger.info(f"[{len(records)}/{total_jobs}] {info['scenario']} {info['vehicle_count']} veículos: "
+                                f"falha em {kind}.")
+                    continue
+
+                if kind == 'generate':
+                    logger.info(f"Cenário '{info['scenario']}' com {info['vehicle_count']} veículos gerado.")
+                    if warmup_steps > 0:
+                        for seed in seeds:
+                            job = {**info, "seed": seed, "sumocfg": result, "warmup_steps": warmup_steps,
+                                   "output_dir": str(run_dir / "warmups" / f"{info['scenario']}_{info['vehicle_count']}_s{seed}")}
+                            pending[pool.submit(run_warmup, job)] = ('warmup', job)
+                    else:
+                        for mode, seed in itertools.product(modes, seeds):
+                            job = {**info, "mode": mode, "seed": seed, "sumocfg": result,
+                                   "output_dir": str(run_dir / "runs" / f"{info['scenario']}_{mode}_{info['vehicle_count']}_s{seed}")}
+                            pending[pool.submit(run_job, job)] = ('run', job)
+                elif kind == 'warmup':
+                    logger.info(f"Aquecimento de {warmup_steps} passos de '{info['scenario']}' ({info['vehicle_count']} veículos, "
+                                f"semente {info['seed']}) gravado. A lançar as continuações.")
+                    for mode in modes:
+                        job = {**info, "mode": mode, "warmup_checkpoint": result,
+                               "output_dir": str(run_dir / "runs" / f"{info['scenario']}_{mode}_{info['vehicle_count']}_s{info['seed']}")}
+                        pending[pool.submit(run_job, job)] = ('run', job)
+                else:
+                    records.append(result)
+                    logger.info(f"[{len(records)}/{total_jobs}] {info['scenario']} {info['mode']} "
+                                f"{info['vehicle_count']} veículos, semente {info['seed']}: {result['status']}.")
+
+    save_results(records, run_dir)
+    return run_dir
+
+def save_results(records: list, run_dir: Path) -> None:
+    """Grava o conjunto de dados consolidado da experiência em JSON e CSV."""
+    records.sort(key=lambda r: (r.get('scenario'), r.get('mode'), r.get('vehicle_count'), r.get('seed')))
+    json_path = run_dir / "results.json"
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(records, f, indent=4, ensure_ascii=False)
+    pd.json_normalize(records, sep='.').to_csv(run_dir / "results.csv", index=False)
+    logger.info(f"Resultados de {len(records)} simulações consolidados em '{json_path}'.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Executa em paralelo a matriz cenário × modo × densidade × semente.")
+    parser.add_argument("--scenarios", nargs="+", default=['osm', 'api'], choices=list(BASE_FILES))
+    parser.add_argument("--modes", nargs="+", default=['STATIC', 'ADAPTIVE'], choices=['STATIC', 'ADAPTIVE'])
+    parser.add_argument("--densities", nargs="+", type=int, default=[5000], help="Valores de VEHICLE_COUNT.")
+    parser.add_argument("--seeds", nargs="+", type=int, default=[42], help="Sementes do SUMO (--seed).")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Número de processos em paralelo.")
+    parser.add_argument("--warmup-steps", type=int, default=0,
+                        help="Passos de aquecimento simulados uma única vez e partilhados por todos os modos (0 desativa).")
+    args = parser.parse_args()
+
+    setup_logging()
+    try:
+        ensure_sumo_home()
+        run_dir = run_matrix(args.scenarios, args.modes, args.densities, args.seeds, args.workers,
+                             args.warmup_steps)
+        print(f"[✓] Experiência concluída. Resultados em: {run_dir}")
+    except Exception as e:
+        logger.critical(f"Erro no executor de experiências: {e}", exc_info=True); sys.exit(1)
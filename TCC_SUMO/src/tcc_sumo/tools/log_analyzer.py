@@ -7,79 +7,309 @@ DESCRIÇÃO: Esta classe foca-se exclusivamente na tarefa de ler, analisar e
 agregar dados dos outputs do SUMO. A sua lógica pode ser reutilizada tanto pelo
 SimulationManager após uma simulação, como por scripts de análise independentes.
 """
-import xml.etree.ElementTree as ET
 import pandas as pd
-import json
+import multiprocessing
+import xml.etree.ElementTree as ET
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
 from datetime import datetime
+from typing import Dict, List, Tuple
 import os
+import sqlite3
 
+import numpy as np
+
+from tcc_sumo.tools.output_cache import (cache_dir_for, cache_is_current, convert_output, iter_output,
+                                         load_output, parallel_ranges, RANGE_READ_BYTES)
+from tcc_sumo.tools.output_formats import OutputReader, OUTPUT_READ_ERRORS
+from tcc_sumo.tools.queue_analyzer import analyze_queue_output, load_lane_junctions, QueueAnalyzer, QUEUE_DB_NAME
+from tcc_sumo.tools.results_store import ResultsStore, RESULTS_DB_NAME
+from tcc_sumo.tools.tripinfo_parsers import parse_tripinfo, TRIP_ANALYSIS_COLUMNS, TRIPINFO_LAYOUT
+from tcc_sumo.tools.vehicle_results import save_vehicle_results
 from tcc_sumo.utils.helpers import get_logger, PROJECT_ROOT
 
 logger = get_logger("LogAnalyzer")
 LOGS_DIR = PROJECT_ROOT / "logs"
+# Poluentes totalizados a partir do emissions.xml e divisor para a unidade do relatório.
+POLLUTANTS = {'CO2': 1_000_000, 'fuel': 1_000, 'NOx': 1_000_000, 'PMx': 1_000_000}
+
+@dataclass
+class EmissionAggregate:
+    """
+    Agregado do emissions.xml com memória proporcional ao número de veículos.
+
+    PILAR DE QUALIDADE: Escalabilidade
+    DESCRIÇÃO: Em vez de uma linha por veículo e por passo, guarda apenas o que a
+    análise usa: o total de cada poluente e, por veículo, o primeiro e o último
+    instante em que aparece (índice do veículo em `vehicle_index`).
+    """
+    totals: Dict[str, float] = field(default_factory=lambda: {poll: 0.0 for poll in POLLUTANTS})
+    vehicle_index: Dict[str, int] = field(default_factory=dict)
+    first_seen: array = field(default_factory=lambda: array('d'))
+    last_seen: array = field(default_factory=lambda: array('d'))
+    rows: int = 0
+
+    @property
+    def vehicle_count(self) -> int:
+        return len(self.vehicle_index)
+
+    def observe(self, vehicle_id: str, time: float) -> None:
+        index = self.vehicle_index.get(vehicle_id)
+        if index is None:
+            self.vehicle_index[vehicle_id] = len(self.first_seen)
+            self.first_seen.append(time)
+            self.last_seen.append(time)
+        else:
+            if time < self.first_seen[index]: self.first_seen[index] = time
+            if time > self.last_seen[index]: self.last_seen[index] = time
+
+    def add_row(self, time: float, attributes) -> None:
+        """Acumula uma linha <vehicle> do emissions (atributos como no XML)."""
+        get = attributes.get
+        self.observe(get('id'), time)
+        totals = self.totals
+        for poll in POLLUTANTS:
+            value = get(poll)
+            if value:
+                totals[poll] += float(value)
+        self.rows += 1
+
+    def merge(self, other: "EmissionAggregate") -> None:
+        """Junta um agregado parcial (ex.: de outro troço do ficheiro) a este."""
+        for poll, value in other.totals.items():
+            self.totals[poll] = self.totals.get(poll, 0.0) + value
+        for vehicle_id, index in other.vehicle_index.items():
+            self.observe(vehicle_id, other.first_seen[index])
+            self.observe(vehicle_id, other.last_seen[index])
+        self.rows += other.rows
+
+def aggregate_emission_range(xml_path: str, start: int, end: int) -> Tuple[EmissionAggregate, str | None]:
+    """
+    Agrega um troço de bytes do emissions.xml (ver `output_cache.xml_byte_ranges`).
+
+    Corre num processo separado: o troço é lido em blocos e dado a um parser
+    incremental dentro de uma raiz artificial. Devolve o agregado parcial e,
+    se o troço estiver malformado (ex.: ficheiro truncado), a mensagem de erro.
+    """
+    aggregate = EmissionAggregate()
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    parser.feed(b"<emission-export>")
+    root, time = None, 0.0
+    try:
+        with open(xml_path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                block = f.read(min(RANGE_READ_BYTES, remaining))
+                if not block:
+                    break
+                remaining -= len(block)
+                parser.feed(block)
+                for event, elem in parser.read_events():
+                    if event == 'start':
+                        if elem.tag == 'timestep':
+                            time = float(elem.get('time', 0))
+                        elif root is None:
+                            root = elem
+                    elif elem.tag == 'vehicle':
+                        aggregate.add_row(time, elem.attrib)
+                    elif elem.tag == 'timestep':
+                        elem.clear()
+                        root.clear()
+            parser.feed(b"</emission-export>")
+            for event, elem in parser.read_events():
+                if event == 'end' and elem.tag == 'vehicle':
+                    aggregate.add_row(time, elem.attrib)
+    except ET.ParseError as e:
+        return aggregate, str(e)
+    return aggregate, None
 
 class LogAnalyzer:
     """
     Analisa os ficheiros de log gerados pelo SUMO para extrair métricas de performance.
     """
-    def __init__(self, trip_info_path: str, emission_path: str, queue_info_path: str):
+    def __init__(self, trip_info_path: str, emission_path: str, queue_info_path: str,
+                 tripinfo_backend: str = "auto", use_cache: bool = True, workers: int = 0,
+                 net_path: str | None = None, queue_threshold_m: float = 50.0, queue_bucket_s: float = 300.0):
         # Ponto de manutenibilidade: Os caminhos são recebidos como argumentos,
         # tornando a classe mais testável e independente de uma estrutura fixa.
+        # O formato (XML, CSV, comprimidos ou não) é detetado pelo nome de cada ficheiro.
         self.trip_info_path = Path(trip_info_path) if trip_info_path else None
         self.emission_path = Path(emission_path) if emission_path else None
         self.queue_info_path = Path(queue_info_path) if queue_info_path else None
+        # Backend de leitura do tripinfo.xml (ver tripinfo_parsers.py).
+        self.tripinfo_backend = tripinfo_backend
+        # Lê os outputs pela cache colunar (ver output_cache.py), criada na primeira análise.
+        self.use_cache = use_cache
+        # Processos da análise (0 = um por CPU, até 8; 1 = tudo no processo atual).
+        self.workers = workers if workers > 0 else min(8, os.cpu_count() or 1)
+        # Rede do cenário (agrupa as filas por cruzamento), limiar do tamanho da fila e intervalo da série.
+        self.net_path = Path(net_path) if net_path else None
+        self.queue_threshold_m = queue_threshold_m
+        self.queue_bucket_s = queue_bucket_s
         logger.debug(f"LogAnalyzer inicializado para o cenário em '{self.trip_info_path.parent if self.trip_info_path else 'N/A'}'.")
 
-    def _parse_xml_to_dataframe(self, xml_path: Path, element_tag: str) -> pd.DataFrame:
+    def _has_output(self, xml_path: Path) -> bool:
+        """Um output está disponível se existir o XML ou, com a cache ativa, a sua cache colunar."""
+        if not xml_path:
+            return False
+        return xml_path.is_file() or (self.use_cache and (cache_dir_for(xml_path) / "meta.json").is_file())
+
+    def _parse_tripinfo(self, xml_path: Path) -> pd.DataFrame:
         """
-        Analisa um ficheiro XML genérico e converte-o para um DataFrame pandas.
+        Lê o tripinfo.xml para um DataFrame de colunas já tipadas (só as usadas na análise).
 
         PILAR DE QUALIDADE: Robustez
         DESCRIÇÃO: Utiliza um tratamento de exceções para lidar com ficheiros
         inexistentes ou malformados, evitando que o processo de análise falhe
         inesperadamente e registando um erro claro no log.
         """
-        if not xml_path or not xml_path.is_file():
+        if not self._has_output(xml_path):
             logger.warning(f"Ficheiro XML não encontrado em: {xml_path}")
             return pd.DataFrame()
         
-        logger.debug(f"A processar ficheiro XML: {xml_path}")
         try:
-            tree = ET.parse(xml_path)
-            root = tree.getroot()
-            data = [child.attrib for child in root.findall(element_tag)]
-            return pd.DataFrame(data)
-        except (ET.ParseError, FileNotFoundError) as e:
+            if self.use_cache:
+                logger.debug(f"A ler {xml_path} pela cache colunar.")
+                df = load_output(xml_path, "tripinfo", TRIP_ANALYSIS_COLUMNS)
+                # Textos como objetos, tal como devolvidos pelos backends de leitura do XML.
+                for name in TRIP_ANALYSIS_COLUMNS:
+                    if TRIPINFO_LAYOUT[name] is str:
+                        df[name] = df[name].astype(object)
+                return df
+            logger.debug(f"A processar ficheiro XML: {xml_path} (backend '{self.tripinfo_backend}')")
+            return parse_tripinfo(xml_path, TRIP_ANALYSIS_COLUMNS, self.tripinfo_backend)
+        except OUTPUT_READ_ERRORS as e:
             logger.error(f"Erro ao processar o ficheiro {xml_path.name}: {e}")
             return pd.DataFrame()
 
-    def _parse_emission_xml(self, xml_path: Path) -> pd.DataFrame:
+    def _aggregate_emissions(self, xml_path: Path) -> EmissionAggregate:
         """
-        Analisa o ficheiro de emissões de forma eficiente em termos de memória.
+        Agrega o ficheiro de emissões numa única passagem, em memória constante por linha.
 
         PILAR DE QUALIDADE: Eficiência
-        DESCRIÇÃO: Usa `ET.iterparse` para processar o XML de emissões, que pode
-        ser muito grande. Este método não carrega o ficheiro inteiro para a memória
-        de uma só vez, prevenindo problemas de consumo de recursos.
+        DESCRIÇÃO: Percorre em streaming o ficheiro de emissões (XML ou CSV,
+        comprimido ou não), que pode ser muito grande, e acumula diretamente
+        os totais de poluentes e o primeiro/último instante de cada veículo.
+        Nenhuma linha é guardada: com 75k veículos ao longo de horas a memória
+        depende só do número de veículos.
         """
-        if not xml_path or not xml_path.is_file(): return pd.DataFrame()
+        aggregate = EmissionAggregate()
+        if not self._has_output(xml_path): return aggregate
+        if self.use_cache:
+            try:
+                return self._aggregate_cached_emissions(xml_path)
+            except OUTPUT_READ_ERRORS as e:
+                logger.error(f"Erro ao processar o ficheiro de emissões {xml_path.name}: {e}")
+                return aggregate
         
-        logger.debug(f"A processar ficheiro de emissões XML: {xml_path}")
+        logger.debug(f"A processar ficheiro de emissões: {xml_path}")
         try:
-            records = []
-            for _, elem in ET.iterparse(xml_path):
-                if elem.tag == 'timestep':
-                    time = float(elem.get('time', 0))
-                    for vehicle in elem.findall('vehicle'):
-                        v_data = vehicle.attrib
-                        v_data['time'] = time
-                        records.append(v_data)
-                    elem.clear()  # Liberta a memória do elemento processado
-            return pd.DataFrame(records)
-        except (ET.ParseError, FileNotFoundError) as e:
+            for time, attributes in OutputReader(xml_path, "emissions").records():
+                aggregate.add_row(time, attributes)
+        except OUTPUT_READ_ERRORS as e:
             logger.error(f"Erro ao processar o ficheiro de emissões {xml_path.name}: {e}")
-            return pd.DataFrame()
+        return aggregate
+
+    def _emission_ranges(self, xml_path: Path) -> List[Tuple[int, int]]:
+        """
+        Troços do emissions para agregar (ou, com a cache, converter) em paralelo.
+
+        Vazio se o ficheiro não se dividir ou se a sua cache colunar já estiver
+        atualizada (nesse caso não há XML a ler).
+        """
+        if not xml_path or (self.use_cache and cache_is_current(xml_path)):
+            return []
+        return parallel_ranges(xml_path, "emissions", self.workers)
+
+    def _merge_emission_ranges(self, xml_path: Path, futures: list) -> EmissionAggregate:
+        """Junta, pela ordem do ficheiro, os agregados parciais de cada troço."""
+        aggregate = EmissionAggregate()
+        for future in futures:
+            partial, error = future.result()
+            aggregate.merge(partial)
+            if error:
+                logger.error(f"Erro ao processar o ficheiro de emissões {xml_path.name}: {error}")
+                break
+        return aggregate
+
+    def _read_outputs(self) -> Tuple[pd.DataFrame, EmissionAggregate, dict]:
+        """
+        Lê os três outputs: viagens, agregado de emissões e métricas de fila.
+
+        PILAR DE QUALIDADE: Eficiência
+        DESCRIÇÃO: Os três ficheiros são independentes e são lidos em simultâneo
+        num conjunto de processos. O emissions.xml, o maior, é ainda dividido em
+        troços de bytes alinhados com <timestep>, agregados em paralelo e juntos
+        pela ordem do ficheiro com `EmissionAggregate.merge`, o que dá o mesmo
+        resultado da leitura sequencial. Com a cache colunar ativa, cada
+        ficheiro é lido (ou convertido) pela cache num processo próprio; o
+        emissions.xml ainda por converter é convertido pelos mesmos troços, no
+        conjunto de processos partilhado, e depois agregado pela cache.
+        """
+        if self.workers <= 1:
+            return (self._parse_tripinfo(self.trip_info_path), self._aggregate_emissions(self.emission_path),
+                    self._calculate_queue_metrics(self.queue_info_path))
+
+        ranges = self._emission_ranges(self.emission_path)
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+            if ranges and self.use_cache:
+                logger.info(f"A converter '{self.emission_path.name}' para a cache em {len(ranges)} troços paralelos.")
+            elif ranges:
+                logger.info(f"A agregar '{self.emission_path.name}' em {len(ranges)} troços paralelos.")
+                emission_futures = [pool.submit(aggregate_emission_range, str(self.emission_path), start, end)
+                                    for start, end in ranges]
+            else:
+                emission_future = pool.submit(self._aggregate_emissions, self.emission_path)
+            trips_future = pool.submit(self._parse_tripinfo, self.trip_info_path)
+            queue_future = pool.submit(self._calculate_queue_metrics, self.queue_info_path)
+            if ranges and self.use_cache:
+                try:
+                    convert_output(self.emission_path, "emissions", self.workers, executor=pool)
+                except OUTPUT_READ_ERRORS as e:
+                    logger.error(f"Erro ao processar o ficheiro de emissões {self.emission_path.name}: {e}")
+                emissions = self._aggregate_emissions(self.emission_path)
+            elif ranges:
+                emissions = self._merge_emission_ranges(self.emission_path, emission_futures)
+            else:
+                emissions = emission_future.result()
+            return trips_future.result(), emissions, queue_future.result()
+
+    def _aggregate_cached_emissions(self, xml_path: Path) -> EmissionAggregate:
+        """
+        Mesmo agregado que `_aggregate_emissions`, calculado por colunas sobre a cache.
+
+        Os ids vêm codificados pelo dicionário do ficheiro, pelo que o primeiro e o
+        último instante de cada veículo se obtêm com `np.minimum.at`/`np.maximum.at`
+        sobre os códigos, grupo de linhas a grupo de linhas.
+        """
+        vehicle_ids = None
+        totals = {poll: 0.0 for poll in POLLUTANTS}
+        rows = 0
+        for chunk in iter_output(xml_path, "emissions", ["time", "id", *POLLUTANTS]):
+            if vehicle_ids is None:
+                vehicle_ids = chunk["id"].cat.categories
+                first_seen = np.full(len(vehicle_ids), np.inf)
+                last_seen = np.full(len(vehicle_ids), -np.inf)
+            codes, times = chunk["id"].cat.codes.to_numpy(), chunk["time"].to_numpy()
+            np.minimum.at(first_seen, codes, times)
+            np.maximum.at(last_seen, codes, times)
+            for poll in POLLUTANTS:
+                totals[poll] += float(np.nansum(chunk[poll].to_numpy()))
+            rows += len(chunk)
+
+        aggregate = EmissionAggregate(totals=totals, rows=rows)
+        if vehicle_ids is not None:
+            # Veículos por ordem de primeira aparição, como na leitura em streaming do XML.
+            seen = np.flatnonzero(np.isfinite(first_seen))
+            seen = seen[np.argsort(first_seen[seen], kind="stable")]
+            aggregate.vehicle_index = {vehicle_ids[code]: i for i, code in enumerate(seen)}
+            aggregate.first_seen = array('d', first_seen[seen])
+            aggregate.last_seen = array('d', last_seen[seen])
+        return aggregate
 
     def _calculate_trip_metrics(self, df: pd.DataFrame, total_vehicles_in_malha: int) -> tuple[dict, pd.DataFrame]:
         """
@@ -118,68 +348,84 @@ class LogAnalyzer:
             
         return metrics, completed_df
 
-    def _calculate_pollution_metrics(self, df: pd.DataFrame) -> dict:
-        """Calcula as métricas de poluição a partir dos dados de emissões."""
-        if df.empty or 'id' not in df.columns:
-            logger.warning("DataFrame de emissões vazio ou inválido. A saltar cálculo de poluição.")
+    def _calculate_pollution_metrics(self, emissions: EmissionAggregate) -> dict:
+        """Calcula as métricas de poluição a partir do agregado de emissões."""
+        if not emissions.vehicle_count:
+            logger.warning("Agregado de emissões vazio ou inválido. A saltar cálculo de poluição.")
             return {}
             
         pollution_metrics = {}
-        pollutants = {'CO2': 1_000_000, 'fuel': 1_000, 'NOx': 1_000_000, 'PMx': 1_000_000}
-
-        for poll in pollutants:
-            if poll in df.columns:
-                df[poll] = pd.to_numeric(df[poll], errors='coerce')
-
-        for poll, divisor in pollutants.items():
-            if poll in df.columns:
-                total_emission = df[poll].sum() / divisor
-                unit = 'kg' if poll != 'fuel' else 'L'
-                pollution_metrics[f"Total de {poll}"] = f"{total_emission:.2f} {unit}"
+        for poll, divisor in POLLUTANTS.items():
+            total_emission = emissions.totals[poll] / divisor
+            unit = 'kg' if poll != 'fuel' else 'L'
+            pollution_metrics[f"Total de {poll}"] = f"{total_emission:.2f} {unit}"
         return pollution_metrics
 
     def _calculate_queue_metrics(self, xml_path: Path) -> dict:
-        """Calcula as métricas de fila a partir do ficheiro queueinfo.xml."""
-        if not xml_path or not xml_path.is_file(): return {}
+        """
+        Calcula as métricas de fila a partir do ficheiro queueinfo (em qualquer formato).
+
+        A leitura única do ficheiro alimenta também a análise por faixa e por
+        cruzamento (ver queue_analyzer.py), gravada em 'queue_analytics.sqlite'.
+        """
+        if not self._has_output(xml_path): return {}
         try:
-            tree = ET.parse(xml_path)
-            root = tree.getroot()
-            total_queue, max_wait, count = 0.0, 0.0, 0
-            for timestep in root.findall('.//data'):
-                count += 1
-                for lane in timestep.findall('.//lane'):
-                    total_queue += float(lane.get('queueing_length', 0.0))
-                    max_wait = max(max_wait, float(lane.get('maxWaitingTime', 0.0)))
-            
-            # A média do tamanho da fila deve considerar o comprimento médio de um veículo (aprox. 5m)
-            avg_queue_vehicles = (total_queue / count / 5) if count > 0 else 0
-            
-            return {
-                "Tamanho Médio da Fila (veículos)": round(avg_queue_vehicles, 2),
-                "Tempo Máximo de Espera (s)": round(max_wait, 2)
-            }
-        except (ET.ParseError, FileNotFoundError) as e:
+            lane_junctions = load_lane_junctions(self.net_path) if self.net_path and self.net_path.is_file() else None
+            analyzer = analyze_queue_output(xml_path, self.queue_threshold_m, self.queue_bucket_s,
+                                            lane_junctions, use_cache=self.use_cache)
+            return self._save_queue_analysis(analyzer)
+        except (*OUTPUT_READ_ERRORS, sqlite3.Error) as e:
             logger.error(f"Erro ao processar ficheiro de filas {xml_path.name}: {e}")
             return {}
 
-    def run_analysis(self, simulation_metadata: dict, simulation_duration_seconds: int) -> dict:
+    def _save_queue_analysis(self, analyzer: QueueAnalyzer) -> dict:
+        """Grava a análise por faixa junto ao queueinfo e devolve as métricas globais."""
+        analyzer.save(self.queue_info_path.parent / QUEUE_DB_NAME)
+        return analyzer.global_metrics()
+
+    def run_analysis(self, simulation_metadata: dict, simulation_duration_seconds: int, consolidate: bool = True,
+                     live_outputs: tuple | None = None, collected_emissions: EmissionAggregate | None = None,
+                     simulation_start_s: float | None = None, step_length_s: float = 1.0) -> dict:
         """
         Orquestra todo o processo de análise dos ficheiros de output.
+
+        Com `consolidate=False` o registo não é acrescentado ao ficheiro consolidado;
+        quem executa várias simulações em paralelo recolhe e grava os registos.
+        `live_outputs` são os agregados (viagens, emissões, filas) já lidos durante
+        a simulação (ver live_ingest.py); nesse caso os outputs não são relidos.
+        `collected_emissions` substitui o agregado do emissions.xml quando este não
+        foi escrito e as emissões foram recolhidas no loop (ver kpi_collector.py).
+        `simulation_start_s` indica que a simulação terminou por já não haver
+        veículos: a duração passa a ir até à última chegada do tripinfo (mais um
+        passo, como no loop passo a passo), porque o loop por eventos só deteta o
+        fim nos pontos em que acorda.
         """
         if not self.trip_info_path:
              logger.critical("Caminho para trip_info_path não foi fornecido.")
              return {}
         
-        trip_df = self._parse_xml_to_dataframe(self.trip_info_path, ".//tripinfo")
-        emission_df = self._parse_emission_xml(self.emission_path)
+        if live_outputs is not None:
+            trip_df, emissions, queue_analyzer = live_outputs
+            try:
+                queue_metrics = self._save_queue_analysis(queue_analyzer)
+            except (OSError, sqlite3.Error) as e:
+                logger.error(f"Erro ao gravar a análise de filas: {e}")
+                queue_metrics = queue_analyzer.global_metrics()
+        else:
+            trip_df, emissions, queue_metrics = self._read_outputs()
+        if collected_emissions is not None:
+            emissions = collected_emissions
         
-        total_vehicles_in_malha = len(emission_df['id'].unique()) if not emission_df.empty and 'id' in emission_df.columns else len(trip_df)
+        total_vehicles_in_malha = emissions.vehicle_count or len(trip_df)
         
         metrics, completed_df = self._calculate_trip_metrics(trip_df, total_vehicles_in_malha)
+        last_arrival = trip_df["arrival"].max() if simulation_start_s is not None and not trip_df.empty else np.nan
+        if pd.notna(last_arrival):
+            simulation_duration_seconds = min(simulation_duration_seconds,
+                                              int(round((last_arrival - simulation_start_s) / step_length_s)) + 1)
         metrics["simulation_duration_seconds"] = simulation_duration_seconds
         
-        pollution = self._calculate_pollution_metrics(emission_df)
-        queue_metrics = self._calculate_queue_metrics(self.queue_info_path)
+        pollution = self._calculate_pollution_metrics(emissions)
         
         # Consolida todos os dados num único registo
         new_record = {
@@ -191,61 +437,37 @@ class LogAnalyzer:
         }
         
         # Lógica para guardar dados brutos por veículo
-        self._save_raw_vehicle_data(emission_df, completed_df)
+        self._save_raw_vehicle_data(emissions, completed_df)
         
         # Adiciona o novo registo ao ficheiro consolidado
-        self._append_to_consolidated_json(new_record)
+        if consolidate:
+            self._append_to_consolidated_json(new_record)
             
         return new_record
 
-    def _save_raw_vehicle_data(self, emission_df: pd.DataFrame, completed_df: pd.DataFrame):
-        """Salva um JSON com o status (completed/unfinished) de cada veículo."""
+    def _save_raw_vehicle_data(self, emissions: EmissionAggregate, completed_df: pd.DataFrame):
+        """Grava o status (completed/unfinished) de cada veículo em formato colunar (ver vehicle_results.py)."""
         if completed_df.empty or 'id' not in completed_df.columns:
             return
 
-        all_vehicle_ids = set(emission_df['id'].unique()) if not emission_df.empty and 'id' in emission_df.columns else set(completed_df['id'])
         completed_vehicle_ids = set(completed_df['id'])
-        
-        all_vehicles_data = []
-        completed_df_copy = completed_df.copy()
-        completed_df_copy['status'] = 'completed'
-        all_vehicles_data.extend(completed_df_copy.to_dict('records'))
-        
-        unfinished_ids = all_vehicle_ids - completed_vehicle_ids
-        if not emission_df.empty and unfinished_ids and 'id' in emission_df.columns:
-            unfinished_df = emission_df[emission_df['id'].isin(unfinished_ids)]
-            agg_data = unfinished_df.groupby('id').agg(startTime=('time','min'), endTime=('time','max')).reset_index()
-            agg_data['duration'] = agg_data['endTime'] - agg_data['startTime']
-            agg_data['status'] = 'unfinished'
-            all_vehicles_data.extend(agg_data[['id','duration','status']].to_dict('records'))
-            
-        raw_data_path = self.trip_info_path.parent / "raw_vehicle_data.json"
+        unfinished_ids = sorted(set(emissions.vehicle_index) - completed_vehicle_ids) if emissions.vehicle_count else []
+        # Duração observada de cada veículo não concluído: último - primeiro instante nas emissões.
+        indices = np.fromiter((emissions.vehicle_index[vehicle_id] for vehicle_id in unfinished_ids),
+                              dtype=np.int64, count=len(unfinished_ids))
+        durations = np.asarray(emissions.last_seen)[indices] - np.asarray(emissions.first_seen)[indices]
+
         try:
-            with open(raw_data_path, 'w', encoding='utf-8') as f:
-                json.dump(all_vehicles_data, f, indent=4)
-            logger.info(f"Dados brutos de {len(all_vehicles_data)} veículos salvos em: {raw_data_path}")
-        except IOError as e:
+            results_dir = save_vehicle_results(self.trip_info_path.parent, completed_df, unfinished_ids, durations)
+            logger.info(f"Dados brutos de {len(completed_df) + len(unfinished_ids)} veículos salvos em: {results_dir}")
+        except OSError as e:
             logger.error(f"Não foi possível guardar os dados brutos dos veículos: {e}")
 
     def _append_to_consolidated_json(self, new_record: dict):
-        """Adiciona um novo registo de simulação a um ficheiro JSON consolidado."""
-        json_path = LOGS_DIR / "consolidated_data.json"
-        records = []
-        if json_path.exists() and json_path.stat().st_size > 0:
-            try:
-                with open(json_path, 'r', encoding='utf-8') as f:
-                    records = json.load(f)
-                if not isinstance(records, list):
-                    records = []
-            except (IOError, json.JSONDecodeError) as e:
-                logger.warning(f"Não foi possível ler o ficheiro de dados consolidado existente. A criar um novo. Erro: {e}")
-                records = []
-        
-        records.append(new_record)
-        
+        """Acrescenta um novo registo de simulação à base de dados histórica (ver results_store.py)."""
+        db_path = LOGS_DIR / RESULTS_DB_NAME
         try:
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(records, f, indent=4, ensure_ascii=False)
-            logger.info(f"Dados consolidados atualizados em '{json_path}'.")
-        except IOError as e:
-            logger.error(f"Não foi possível escrever no ficheiro de dados consolidado: {e}")
\ No newline at end of file
+            ResultsStore(db_path).append(new_record)
+            logger.info(f"Dados consolidados atualizados em '{db_path}'.")
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"Não foi possível escrever na base de dados consolidada: {e}")
\ No newline at end of file
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Pré-filtro em streaming do OSM do cenário 'osm', antes do netconvert.
+
+PILAR DE QUALIDADE: Eficiência, Escalabilidade
+DESCRIÇÃO: O netconvert recebia o OSM completo da bbox, com edifícios, POIs,
+passeios e limites administrativos que descarta ou que não servem para o
+tráfego automóvel; numa bbox real o ficheiro tem centenas de MB. Aqui o OSM é
+lido com iterparse, elemento a elemento, em duas passagens:
+
+1. vias: guarda os ids das vias com 'highway' em DRIVABLE_HIGHWAYS (e que não
+   sejam áreas), os ids dos nós que referenciam e as relações de restrição de
+   viragem cujas vias membro ficaram;
+2. escrita: copia os nós referenciados (com as suas tags, ex.: semáforos), as
+   vias e as relações guardadas para um OSM reduzido.
+
+Os ids dos nós referenciados ficam num array NumPy ordenado e os nós são
+decididos em lotes (np.isin), pelo que a memória não cresce com o número de
+nós do ficheiro original. Aceita OSM comprimido ('.gz').
+"""
+import gzip
+import time
+import xml.etree.ElementTree as ET
+from array import array
+from pathlib import Path
+from xml.sax.saxutils import quoteattr
+
+import numpy as np
+
+from tcc_sumo.utils.helpers import get_logger
+
+logger = get_logger("OsmFilter")
+
+# Vias de veículos motorizados na tipologia do netconvert (osmNetconvert.typ.xml).
+DRIVABLE_HIGHWAYS = frozenset({
+    "motorway", "motorway_link", "trunk", "trunk_link", "primary", "primary_link",
+    "secondary", "secondary_link", "tertiary", "tertiary_link", "unclassified",
+    "residential", "living_street", "unsurfaced", "road", "service", "busway", "bus_guideway",
+})
+# Relações usadas pelo netconvert na construção da rede.
+KEPT_RELATION_TYPES = frozenset({"restriction"})
+# Nós acumulados antes de cada decisão em lote.
+NODE_BATCH = 20000
+
+def _open_osm(path: Path):
+    return gzip.open(path, "rb") if Path(path).suffix == ".gz" else open(path, "rb")
+
+def _top_level_elements(path: Path):
+    """
+    (elemento raiz, elemento) para cada filho direto da raiz, já completo. A raiz
+    é esvaziada após cada elemento (os seus atributos só são válidos no primeiro).
+    """
+    with _open_osm(path) as f:
+        events = ET.iterparse(f, events=("start", "end"))
+        _, root = next(events)
+        depth = 0
+        for event, element in events:
+            if event == "start":
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 0:
+                yield root, element
+                root.clear()
+
+def _tags(element: ET.Element) -> dict:
+    return {tag.get("k"): tag.get("v") for tag in element.iter("tag")}
+
+def _serialize(element: ET.Element) -> str:
+    element.tail = None
+    return f"  {ET.tostring(element, encoding='unicode')}\n"
+
+def filter_osm(input_path: Path, output_path: Path) -> dict:
+    """
+    Escreve em `output_path` só as vias transitáveis, os nós que referenciam e
+    as restrições de viragem entre elas. Devolve as contagens (lidos/escritos).
+    """
+    start = time.perf_counter()
+    kept_ways, node_refs, kept_relations = set(), array("q"), set()
+    totals = {"node": 0, "way": 0, "relation": 0}
+    for _, element in _top_level_elements(input_path):
+        if element.tag in totals:
+            totals[element.tag] += 1
+        if element.tag == "way":
+            tags = _tags(element)
+            if tags.get("highway") in DRIVABLE_HIGHWAYS and tags.get("area") != "yes":
+                kept_ways.add(int(element.get("id")))
+                node_refs.extend(int(nd.get("ref")) for nd in element.iter("nd"))
+        elif element.tag == "relation":
+            members = element.findall("member")
+            ways = [int(member.get("ref")) for member in members if member.get("type") == "way"]
+            if (_tags(element).get("type") in KEPT_RELATION_TYPES and ways
+                    and all(way in kept_ways for way in ways)):
+                kept_relations.add(int(element.get("id")))
+    kept_nodes = np.unique(np.frombuffer(node_refs, dtype=np.int64))
+    del node_refs
+
+    written = {"node": 0, "way": 0, "relation": 0}
+    with open(output_path, "w", encoding="utf-8") as out:
+        pending_nodes = []
+
+        def flush_nodes():
+            ids = np.fromiter((int(node.get("id")) for node in pending_nodes), dtype=np.int64, count=len(pending_nodes))
+            keep = np.isin(ids, kept_nodes)
+            out.write("".join(_serialize(node) for node, kept in zip(pending_nodes, keep.tolist()) if kept))
+            written["node"] += int(keep.sum())
+            pending_nodes.clear()
+
+        header_written = False
+        for root, element in _top_level_elements(input_path):
+            if not header_written:
+                attributes = "".join(f" {name}={quoteattr(value)}" for name, value in root.attrib.items())
+                out.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<osm{attributes}>\n')
+                header_written = True
+            if element.tag == "node":
+                pending_nodes.append(element)
+                if len(pending_nodes) >= NODE_BATCH:
+                    flush_nodes()
+                continue
+            if pending_nodes:
+                flush_nodes()
+            if element.tag == "way":
+                kept = int(element.get("id")) in kept_ways
+            elif element.tag == "relation":
+                kept = int(element.get("id")) in kept_relations
+            else:
+                # Metadados do ficheiro (bounds, note, meta) seguem como estão.
+                kept = True
+            if kept:
+                out.write(_serialize(element))
+                if element.tag in written:
+                    written[element.tag] += 1
+        if pending_nodes:
+            flush_nodes()
+        out.write("</osm>\n")
+
+    report = {"input_bytes": Path(input_path).stat().st_size, "output_bytes": Path(output_path).stat().st_size,
+              **{f"input_{tag}s": count for tag, count in totals.items()},
+              **{f"output_{tag}s": count for tag, count in written.items()},
+              "filter_s": round(time.perf_counter() - start, 3)}
+    logger.info(f"OSM filtrado em {report['filter_s']:.1f}s: {totals['node']} → {written['node']} nós, "
+                f"{totals['way']} → {written['way']} vias, {totals['relation']} → {written['relation']} relações "
+                f"({report['input_bytes'] / 1e6:.1f} → {report['output_bytes'] / 1e6:.1f} MB).")
+    return report
@@ -0,0 +1,413 @@
+# -*- coding: utf-8 -*-
+"""
+Cache colunar tipada dos outputs do SUMO (tripinfo, emissões e filas).
+
+PILAR DE QUALIDADE: Eficiência
+DESCRIÇÃO: Cada análise e cada dashboard voltavam a ler o XML bruto. Aqui cada
+output é convertido uma única vez, em streaming, para colunas NumPy tipadas
+gravadas em disco por grupos de linhas ('row groups'), no diretório
+'.output_cache/<ficheiro>/' ao lado do output. Os textos repetidos (ids de
+veículos, lanes) são codificados por dicionário. A cache é identificada pelo
+tamanho, data de modificação e conteúdo inicial/final do ficheiro de origem:
+se o XML mudar, é reconstruída; se o XML for apagado ou comprimido, a cache
+continua a ser usada.
+
+Todos os leitores passam por `load_output`/`iter_output`, que suportam:
+  - projeção de colunas: só os ficheiros .npy das colunas pedidas são lidos;
+  - filtros com 'predicate pushdown': os grupos de linhas cujo mínimo/máximo
+    não satisfaz o filtro nem chegam a ser lidos.
+O formato segue a organização do Parquet (colunas, grupos, estatísticas), mas
+usa apenas NumPy, que já é dependência do projeto.
+
+Um XML sem compressão grande (tipicamente o emissions.xml) pode ser convertido
+em paralelo: é dividido em troços de bytes alinhados com o elemento pai
+(<timestep>), cada processo converte o seu troço com dicionários próprios e os
+troços são depois juntos, pela ordem do ficheiro, com os códigos traduzidos
+para os dicionários globais. As linhas e os dicionários são os da conversão
+sequencial; só a divisão em grupos de linhas muda (cada troço tem os seus).
+"""
+import hashlib
+import json
+import mmap
+import multiprocessing
+import os
+import shutil
+from array import array
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from tcc_sumo.tools.output_formats import IncrementalOutputParser, OutputReader, OUTPUT_KINDS, detect_format
+from tcc_sumo.tools.tripinfo_parsers import TRIPINFO_LAYOUT
+from tcc_sumo.utils.helpers import get_logger
+
+logger = get_logger("OutputCache")
+
+CACHE_DIR_NAME = ".output_cache"
+CACHE_FORMAT_VERSION = 1
+ROW_GROUP_SIZE = 1_000_000
+# Troço mínimo de um XML convertido por um processo e bloco de leitura de cada troço.
+MIN_RANGE_BYTES = 16 * 1024 * 1024
+RANGE_READ_BYTES = 1024 * 1024
+
+# Esquema de cada output: coluna que recebe o instante do elemento "pai" e
+# colunas. 'f8' = real, 'i8' = inteiro, 'dict' = texto codificado por dicionário.
+SCHEMAS: Dict[str, dict] = {
+    "tripinfo": {
+        "time_column": None,
+        "columns": {name: {str: "dict", int: "i8"}.get(kind, "f8") for name, kind in TRIPINFO_LAYOUT.items()},
+    },
+    "emissions": {
+        "time_column": "time",
+        "columns": {"time": "f8", "id": "dict", "CO2": "f8", "CO": "f8", "HC": "f8", "NOx": "f8",
+                    "PMx": "f8", "fuel": "f8", "electricity": "f8", "noise": "f8", "waiting": "f8",
+                    "speed": "f8", "lane": "dict"},
+    },
+    "queueinfo": {
+        "time_column": "timestep",
+        "columns": {"timestep": "f8", "id": "dict", "queueing_time": "f8", "queueing_length": "f8",
+                    "queueing_length_experimental": "f8"},
+    },
+}
+
+Filter = Tuple[str, str, object]
+_DTYPES = {"f8": np.float64, "i8": np.int64, "dict": np.int32}
+_ARRAY_CODES = {"f8": "d", "i8": "q", "dict": "i"}
+_OPERATORS = {
+    "==": np.equal, "!=": np.not_equal, "<": np.less, "<=": np.less_equal,
+    ">": np.greater, ">=": np.greater_equal,
+}
+
+def source_key(path: Path) -> str:
+    """Identificador do ficheiro de origem: tamanho, mtime e 64 KB iniciais e finais."""
+    stat = path.stat()
+    digest = hashlib.sha1(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    with open(path, "rb") as f:
+        digest.update(f.read(65536))
+        if stat.st_size > 65536:
+            f.seek(max(65536, stat.st_size - 65536))
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def cache_dir_for(path: Path) -> Path:
+    path = Path(path)
+    return path.parent / CACHE_DIR_NAME / path.name
+
+def _read_meta(cache_dir: Path) -> dict | None:
+    meta_path = cache_dir / "meta.json"
+    if not meta_path.is_file():
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    return meta if meta.get("format_version") == CACHE_FORMAT_VERSION else None
+
+class _ColumnarWriter:
+    """Acumula linhas em colunas tipadas e grava um grupo de linhas a cada ROW_GROUP_SIZE."""
+    def __init__(self, directory: Path, columns: Dict[str, str]):
+        self.directory = directory
+        self.columns = columns
+        self.dictionaries: Dict[str, Dict[str, int]] = {name: {} for name, kind in columns.items() if kind == "dict"}
+        self.row_groups: List[dict] = []
+        self._reset()
+
+    def _reset(self) -> None:
+        self.buffers = {name: array(_ARRAY_CODES[kind]) for name, kind in self.columns.items()}
+        self.rows = 0
+
+    def append(self, values: Dict[str, str], time: float | None, time_column: str | None) -> None:
+        for name, kind in self.columns.items():
+            if name == time_column:
+                self.buffers[name].append(time)
+            elif kind == "dict":
+                dictionary = self.dictionaries[name]
+                value = values.get(name, "")
+                code = dictionary.get(value)
+                if code is None:
+                    code = dictionary[value] = len(dictionary)
+                self.buffers[name].append(code)
+            elif kind == "i8":
+                value = values.get(name)
+                self.buffers[name].append(int(value) if value else 0)
+            else:
+                value = values.get(name)
+                self.buffers[name].append(float(value) if value else np.nan)
+        self.rows += 1
+        if self.rows >= ROW_GROUP_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.rows:
+            return
+        index = len(self.row_groups)
+        stats = {}
+        for name, buffer in self.buffers.items():
+            column = np.frombuffer(buffer, dtype=_DTYPES[self.columns[name]])
+            np.save(self.directory / f"rg{index:05d}.{name}.npy", column)
+            if self.columns[name] != "f8" or not np.isnan(column).all():
+                stats[name] = [float(np.nanmin(column)), float(np.nanmax(column))]
+        self.row_groups.append({"rows": self.rows, "stats": stats})
+        self._reset()
+
+def xml_byte_ranges(path: Path, kind: str, parts: int) -> List[Tuple[int, int]]:
+    """
+    Divide um output XML em até `parts` troços de bytes, cada um a começar num elemento pai.
+
+    Os troços cobrem os elementos pai do ficheiro (ex.: <timestep>), sem o
+    cabeçalho nem a etiqueta de fecho da raiz, e podem ser lidos de forma independente.
+    """
+    root_tag, _, parent_tag, _ = OUTPUT_KINDS[kind][2]
+    parent_start, root_end = f"<{parent_tag} ".encode(), f"</{root_tag}>".encode()
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        first = buffer.find(parent_start)
+        if first == -1:
+            return []
+        end = buffer.rfind(root_end)
+        end = len(buffer) if end == -1 else end
+        size = max(1, (end - first) // max(1, parts))
+        starts = [first]
+        while True:
+            start = buffer.find(parent_start, starts[-1] + size, end)
+            if start == -1:
+                break
+            starts.append(start)
+    return list(zip(starts, starts[1:] + [end]))
+
+def parallel_ranges(path: Path, kind: str, workers: int) -> List[Tuple[int, int]]:
+    """Troços para converter `path` em `workers` processos (vazio se o ficheiro não compensar a divisão)."""
+    path = Path(path)
+    if workers <= 1 or OUTPUT_KINDS[kind][2][2] is None or not path.is_file():
+        return []
+    # Só o XML sem compressão permite saltar diretamente para um byte do ficheiro.
+    size = path.stat().st_size
+    if detect_format(path) != "xml" or size < 2 * MIN_RANGE_BYTES:
+        return []
+    return xml_byte_ranges(path, kind, min(workers, size // MIN_RANGE_BYTES))
+
+def convert_range(path: str, kind: str, start: int, end: int, part_dir: str) -> dict:
+    """
+    Converte um troço de bytes de um output XML (ver `xml_byte_ranges`) em `part_dir`.
+
+    Corre num processo separado: o troço é lido em blocos e dado a um parser
+    incremental dentro de uma raiz artificial. Devolve os grupos de linhas, os
+    dicionários locais do troço e o número de elementos pai.
+    """
+    schema = SCHEMAS[kind]
+    root_tag = OUTPUT_KINDS[kind][2][0]
+    writer = _ColumnarWriter(Path(part_dir), schema["columns"])
+    parser = IncrementalOutputParser(kind, "xml")
+
+    def blocks():
+        yield f"<{root_tag}>".encode()
+        with open(path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                block = f.read(min(RANGE_READ_BYTES, remaining))
+                if not block:
+                    break
+                remaining -= len(block)
+                yield block
+        yield f"</{root_tag}>".encode()
+
+    for block in blocks():
+        for time, values in parser.feed(block):
+            writer.append(values, time, schema["time_column"])
+    writer.flush()
+    return {"row_groups": writer.row_groups, "parent_count": parser.parent_count,
+            "dictionaries": {name: list(dictionary) for name, dictionary in writer.dictionaries.items()}}
+
+def _merge_parts(tmp_dir: Path, columns: Dict[str, str], parts: List[dict]) -> Tuple[List[dict], Dict[str, Dict[str, int]]]:
+    """
+    Junta em `tmp_dir`, pela ordem do ficheiro, os grupos de linhas dos troços convertidos.
+
+    Os códigos das colunas de texto são traduzidos dos dicionários de cada troço
+    para dicionários globais, com os valores pela ordem da primeira ocorrência
+    (como na conversão sequencial), e as estatísticas dessas colunas recalculadas.
+    """
+    dictionaries: Dict[str, Dict[str, int]] = {name: {} for name, kind in columns.items() if kind == "dict"}
+    row_groups: List[dict] = []
+    for number, part in enumerate(parts):
+        part_dir = tmp_dir / f"part{number:05d}"
+        remaps = {}
+        for name, values in part["dictionaries"].items():
+            dictionary = dictionaries[name]
+            remaps[name] = np.array([dictionary.setdefault(value, len(dictionary)) for value in values],
+                                    dtype=_DTYPES["dict"])
+        for index, group in enumerate(part["row_groups"]):
+            target = len(row_groups)
+            stats = dict(group["stats"])
+            for name in columns:
+                source = part_dir / f"rg{index:05d}.{name}.npy"
+                destination = tmp_dir / f"rg{target:05d}.{name}.npy"
+                if name in remaps:
+                    column = remaps[name][np.load(source)]
+                    np.save(destination, column)
+                    stats[name] = [float(column.min()), float(column.max())]
+                else:
+                    os.replace(source, destination)
+            row_groups.append({"rows": group["rows"], "stats": stats})
+        shutil.rmtree(part_dir, ignore_errors=True)
+    return row_groups, dictionaries
+
+def convert_output(path: Path, kind: str, workers: int = 1, executor: Executor | None = None) -> Path:
+    """
+    Converte um output do SUMO (XML ou CSV, comprimido ou não) para a cache colunar, em streaming.
+
+    Com `workers` > 1, um XML sem compressão grande é convertido por troços em
+    paralelo, no `executor` dado ou num conjunto de processos próprio.
+    """
+    path = Path(path)
+    schema = SCHEMAS[kind]
+    cache_dir = cache_dir_for(path)
+    tmp_dir = cache_dir.with_name(cache_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    ranges = parallel_ranges(path, kind, workers)
+    if ranges:
+        part_dirs = [tmp_dir / f"part{number:05d}" for number in range(len(ranges))]
+        for part_dir in part_dirs:
+            part_dir.mkdir()
+        pool = executor or ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            futures = [pool.submit(convert_range, str(path), kind, start, end, str(part_dir))
+                       for (start, end), part_dir in zip(ranges, part_dirs)]
+            parts = [future.result() for future in futures]
+        finally:
+            if executor is None:
+                pool.shutdown()
+        row_groups, dictionaries = _merge_parts(tmp_dir, schema["columns"], parts)
+        parent_count = sum(part["parent_count"] for part in parts)
+    else:
+        writer = _ColumnarWriter(tmp_dir, schema["columns"])
+        reader = OutputReader(path, kind)
+        for time, values in reader.records():
+            writer.append(values, time, schema["time_column"])
+        writer.flush()
+        row_groups, dictionaries, parent_count = writer.row_groups, writer.dictionaries, reader.parent_count
+
+    meta = {
+        "format_version": CACHE_FORMAT_VERSION, "kind": kind, "source": path.name,
+        "source_key": source_key(path), "columns": schema["columns"],
+        "rows": sum(group["rows"] for group in row_groups),
+        "parent_count": parent_count, "row_groups": row_groups,
+        "dictionaries": {name: list(dictionary) for name, dictionary in dictionaries.items()},
+    }
+    # meta.json é gravado por último: a sua presença marca a cache como completa.
+    with open(tmp_dir / "meta.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(tmp_dir, cache_dir)
+    logger.info(f"Cache colunar de '{path.name}' criada: {meta['rows']} linhas em {len(row_groups)} grupos"
+                + (f" ({len(ranges)} troços paralelos)." if ranges else "."))
+    return cache_dir
+
+def cache_is_current(path: Path) -> bool:
+    """Se a cache de um output existe e corresponde ao ficheiro atual (ou o ficheiro já não existe)."""
+    path = Path(path)
+    meta = _read_meta(cache_dir_for(path))
+    return meta is not None and (not path.is_file() or meta["source_key"] == source_key(path))
+
+def ensure_cache(path: Path, kind: str) -> dict:
+    """Devolve os metadados da cache de um output, (re)convertendo-o se necessário."""
+    path = Path(path)
+    cache_dir = cache_dir_for(path)
+    meta = _read_meta(cache_dir)
+    if path.is_file():
+        if meta is None or meta["source_key"] != source_key(path):
+            convert_output(path, kind)
+            meta = _read_meta(cache_dir)
+    elif meta is None:
+        raise FileNotFoundError(f"Output '{path}' não encontrado e sem cache colunar.")
+    else:
+        logger.debug(f"'{path.name}' não existe; a usar a cache colunar existente.")
+    meta["directory"] = str(cache_dir)
+    return meta
+
+def _group_may_match(stats: dict, filters: Sequence[Filter]) -> bool:
+    """Decide, pelas estatísticas mínimo/máximo, se um grupo de linhas pode ter linhas válidas."""
+    for column, op, value in filters:
+        if column not in stats:
+            continue
+        low, high = stats[column]
+        if op == "in":
+            if not any(low <= v <= high for v in value):
+                return False
+        elif (op == "==" and not low <= value <= high) or (op == "<" and not low < value) \
+                or (op == "<=" and not low <= value) or (op == ">" and not high > value) \
+                or (op == ">=" and not high >= value):
+            return False
+    return True
+
+def _encode_filters(meta: dict, filters: Sequence[Filter]) -> List[Filter]:
+    """Traduz os valores dos filtros sobre colunas de texto para os códigos do dicionário."""
+    encoded = []
+    for column, op, value in filters:
+        if column not in meta["columns"]:
+            raise ValueError(f"Coluna desconhecida no filtro: '{column}'.")
+        if op not in _OPERATORS and op != "in":
+            raise ValueError(f"Operador de filtro inválido: '{op}'.")
+        if meta["columns"][column] == "dict":
+            if op not in ("==", "!=", "in"):
+                raise ValueError(f"A coluna de texto '{column}' só aceita filtros '==', '!=' ou 'in'.")
+            lookup = {name: code for code, name in enumerate(meta["dictionaries"][column])}
+            if op == "in":
+                value = [lookup[v] for v in value if v in lookup]
+            else:
+                value = lookup.get(value, -1)
+        encoded.append((column, op, value))
+    return encoded
+
+def iter_output(path: Path, kind: str, columns: Sequence[str] | None = None,
+                filters: Sequence[Filter] | None = None) -> Iterator[pd.DataFrame]:
+    """
+    Percorre um output grupo a grupo (memória limitada a um grupo de linhas).
+
+    `filters` usa o formato do pyarrow: [("time", ">=", 3600), ("id", "in", ["a", "b"])].
+    As colunas de texto vêm como `pd.Categorical` sobre o dicionário completo do ficheiro.
+    """
+    meta = ensure_cache(path, kind)
+    cache_dir = Path(meta["directory"])
+    names = list(meta["columns"]) if columns is None else list(columns)
+    unknown = set(names) - set(meta["columns"])
+    if unknown:
+        raise ValueError(f"Colunas desconhecidas em '{kind}': {sorted(unknown)}")
+    filters = _encode_filters(meta, filters or [])
+    categories = {name: pd.Index(meta["dictionaries"][name], dtype=object)
+                  for name in names if meta["columns"][name] == "dict"}
+
+    for index, group in enumerate(meta["row_groups"]):
+        if not _group_may_match(group["stats"], filters):
+            continue
+        load = lambda name: np.load(cache_dir / f"rg{index:05d}.{name}.npy", mmap_mode="r")
+        mask = None
+        for column, op, value in filters:
+            data = load(column)
+            condition = np.isin(data, value) if op == "in" else _OPERATORS[op](data, value)
+            mask = condition if mask is None else mask & condition
+        frame = {}
+        for name in names:
+            data = load(name)
+            data = np.asarray(data[mask]) if mask is not None else np.array(data)
+            frame[name] = pd.Categorical.from_codes(data, categories=categories[name]) if name in categories else data
+        yield pd.DataFrame(frame)
+
+def load_output(path: Path, kind: str, columns: Sequence[str] | None = None,
+                filters: Sequence[Filter] | None = None) -> pd.DataFrame:
+    """Lê um output (projeção + filtros) para um único DataFrame de colunas tipadas."""
+    chunks = list(iter_output(path, kind, columns, filters))
+    if not chunks:
+        meta = ensure_cache(path, kind)
+        names = list(meta["columns"]) if columns is None else list(columns)
+        return pd.DataFrame({name: pd.Series(dtype="category" if meta["columns"][name] == "dict"
+                                             else _DTYPES[meta["columns"][name]]) for name in names})
+    return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+
+def output_info(path: Path, kind: str) -> dict:
+    """Metadados da cache (linhas, nº de elementos pai, colunas e tamanho dos dicionários)."""
+    meta = ensure_cache(path, kind)
+    return {"rows": meta["rows"], "parent_count": meta["parent_count"], "columns": meta["columns"],
+            "dictionary_sizes": {name: len(values) for name, values in meta["dictionaries"].items()}}
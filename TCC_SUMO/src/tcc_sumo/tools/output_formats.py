@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+Formatos dos outputs do SUMO (XML, XML comprimido, CSV e CSV comprimido).
+
+PILAR DE QUALIDADE: Eficiência, Coesão
+DESCRIÇÃO: O SUMO escreve nativamente os outputs em gzip (nome terminado em
+'.gz') e em CSV (nome terminado em '.csv', com colunas '<elemento>_<atributo>'
+separadas por ';'). O emissions.xml é de longe o maior volume de escrita de
+uma execução; em 'xml.gz' ou 'csv.gz' fica várias vezes menor. Este módulo
+concentra o que depende do formato: os nomes dos ficheiros e argumentos do
+SUMO, a deteção do formato de um ficheiro e um leitor em streaming que devolve
+os mesmos registos qualquer que seja o formato.
+"""
+import csv
+import gzip
+import io
+import os
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Iterator, Mapping, Tuple
+
+OUTPUT_FORMATS = ("xml", "xml.gz", "csv", "csv.gz")
+# Formatos que podem ser lidos enquanto o SUMO ainda os escreve (ver IncrementalOutputParser).
+LIVE_FORMATS = ("xml", "csv")
+
+# Opção do SUMO, nome base do ficheiro e (raiz, registo, pai, atributo de tempo do pai) de cada output.
+OUTPUT_KINDS = {
+    "tripinfo": ("--tripinfo-output", "tripinfo", ("tripinfos", "tripinfo", None, None)),
+    "emissions": ("--emission-output", "emissions", ("emission-export", "vehicle", "timestep", "time")),
+    "queueinfo": ("--queue-output", "queueinfo", ("queue-export", "lane", "data", "timestep")),
+}
+
+# Erros possíveis ao ler um output (malformado, truncado ou inexistente), em qualquer formato.
+OUTPUT_READ_ERRORS = (ET.ParseError, csv.Error, EOFError, OSError, ValueError)
+
+def output_file_name(kind: str, output_format: str = "xml") -> str:
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Formato de output inválido: '{output_format}'. Opções: {', '.join(OUTPUT_FORMATS)}.")
+    return f"{OUTPUT_KINDS[kind][1]}.{output_format}"
+
+def sumo_output_args(output_dir: Path, output_format: str = "xml", kinds=None) -> list:
+    """Argumentos da linha de comando do SUMO que enviam os outputs `kinds` (todos por omissão) para `output_dir`."""
+    args = []
+    for kind, (option, _, _) in OUTPUT_KINDS.items():
+        if kinds is None or kind in kinds:
+            args += [option, Path(output_dir) / output_file_name(kind, output_format)]
+    return args
+
+def sumocfg_without_outputs(config_file: Path, kinds) -> Path:
+    """
+    Cópia do .sumocfg sem os outputs `kinds` (o SUMO não permite anular na linha de
+    comando um output definido no ficheiro). Fica no mesmo diretório, para que os
+    caminhos relativos continuem válidos.
+    """
+    config_file = Path(config_file)
+    tree = ET.parse(config_file)
+    options = {OUTPUT_KINDS[kind][0].lstrip("-") for kind in kinds}
+    for section in tree.getroot():
+        for element in list(section):
+            if element.tag in options:
+                section.remove(element)
+    target = config_file.with_name(f"{config_file.stem}.no_{'_'.join(sorted(kinds))}.sumocfg")
+    # Nome temporário por processo: várias execuções em paralelo podem gerar a mesma cópia.
+    tmp_path = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+    tree.write(tmp_path, encoding="utf-8", xml_declaration=True)
+    os.replace(tmp_path, target)
+    return target
+
+def detect_format(path: Path) -> str:
+    """Formato de um output pelo nome do ficheiro (como o próprio SUMO o decide)."""
+    name = Path(path).name.lower()
+    for output_format in sorted(OUTPUT_FORMATS, key=len, reverse=True):
+        if name.endswith("." + output_format):
+            return output_format
+    raise ValueError(f"Formato de output não reconhecido: '{Path(path).name}'.")
+
+def find_output(directory: Path, kind: str) -> Path | None:
+    """O output mais recente de um tipo em `directory`, em qualquer formato suportado."""
+    candidates = [Path(directory) / output_file_name(kind, output_format) for output_format in OUTPUT_FORMATS]
+    existing = [path for path in candidates if path.is_file()]
+    return max(existing, key=lambda path: path.stat().st_mtime_ns) if existing else None
+
+def open_output(path: Path):
+    """Abre um output em modo binário, descomprimindo em streaming se for '.gz'."""
+    return gzip.open(path, "rb") if str(path).lower().endswith(".gz") else open(path, "rb")
+
+class OutputReader:
+    """
+    Percorre em streaming os registos de um output, em qualquer formato.
+
+    Cada registo é devolvido como (instante do elemento pai, atributos); nos
+    CSV as colunas vazias são omitidas, equivalendo a atributos ausentes. No
+    fim, `parent_count` tem o número de elementos pai (ex.: <timestep> ou
+    <data>), incluindo os que não têm registos.
+    """
+    def __init__(self, path: Path, kind: str):
+        self.path = Path(path)
+        self.kind = kind
+        self.format = detect_format(self.path)
+        _, self.record_tag, self.parent_tag, self.parent_attr = OUTPUT_KINDS[kind][2]
+        self.parent_count = 0
+
+    def records(self) -> Iterator[Tuple[float | None, Mapping[str, str]]]:
+        self.parent_count = 0
+        reader = self._csv_records if self.format.startswith("csv") else self._xml_records
+        yield from reader()
+
+    def _xml_records(self):
+        with open_output(self.path) as f:
+            context = ET.iterparse(f, events=("start", "end"))
+            _, root = next(context)
+            time = None
+            for event, elem in context:
+                if event == "start":
+                    if elem.tag == self.parent_tag:
+                        time = float(elem.get(self.parent_attr, 0))
+                        self.parent_count += 1
+                    continue
+                if elem.tag == self.record_tag:
+                    yield time, elem.attrib
+                    if self.parent_tag is None:
+                        elem.clear()
+                        root.clear()
+                elif elem.tag == self.parent_tag:
+                    # Liberta a memória do elemento processado e a referência na raiz.
+                    elem.clear()
+                    root.clear()
+
+    def _csv_records(self):
+        with open_output(self.path) as raw, io.TextIOWrapper(raw, encoding="utf-8", newline="") as f:
+            reader = csv.reader(f, delimiter=";")
+            header = next(reader, None)
+            if header is None:
+                return
+            rows = _CsvRows(header, self.record_tag, self.parent_tag, self.parent_attr)
+            for row in reader:
+                record = rows.record(row)
+                if record is not None:
+                    yield record
+            self.parent_count = rows.parent_count
+
+class _CsvRows:
+    """Converte as linhas de um output CSV em registos (instante do pai, atributos)."""
+    def __init__(self, header: list, record_tag: str, parent_tag: str | None, parent_attr: str | None):
+        prefix = record_tag + "_"
+        self.columns = [(index, name[len(prefix):]) for index, name in enumerate(header) if name.startswith(prefix)]
+        self.parent_index = header.index(f"{parent_tag}_{parent_attr}") if parent_tag else None
+        self.id_index = header.index(prefix + "id")
+        self.time, self.last_parent = None, None
+        self.parent_count = 0
+
+    def record(self, row: list):
+        if self.parent_index is not None:
+            value = row[self.parent_index]
+            if value != self.last_parent:
+                self.last_parent, self.time = value, float(value)
+                self.parent_count += 1
+        # Um elemento pai sem registos ocupa uma linha com as colunas do registo vazias.
+        if not row[self.id_index]:
+            return None
+        return self.time, {name: row[index] for index, name in self.columns if row[index]}
+
+class IncrementalOutputParser:
+    """
+    Versão incremental do OutputReader, para outputs que o SUMO ainda está a escrever.
+
+    `feed` recebe os bytes acrescentados ao ficheiro desde a chamada anterior,
+    cortados em qualquer ponto, e devolve os registos que ficaram completos. Só
+    os formatos sem compressão (LIVE_FORMATS) podem ser lidos assim.
+    """
+    def __init__(self, kind: str, output_format: str):
+        if output_format not in LIVE_FORMATS:
+            raise ValueError(f"Formato '{output_format}' não pode ser lido durante a simulação. Opções: {', '.join(LIVE_FORMATS)}.")
+        self.kind = kind
+        self.format = output_format
+        _, self.record_tag, self.parent_tag, self.parent_attr = OUTPUT_KINDS[kind][2]
+        self._parser = ET.XMLPullParser(events=("start", "end")) if output_format == "xml" else None
+        self._root = None
+        self._time = None
+        self._xml_parents = 0
+        self._csv_rows: _CsvRows | None = None
+        self._partial_line = b""
+
+    @property
+    def parent_count(self) -> int:
+        if self._parser is not None:
+            return self._xml_parents
+        return self._csv_rows.parent_count if self._csv_rows else 0
+
+    def feed(self, data: bytes) -> Iterator[Tuple[float | None, Mapping[str, str]]]:
+        if self._parser is not None:
+            yield from self._feed_xml(data)
+        else:
+            yield from self._feed_csv(data)
+
+    def _feed_xml(self, data: bytes):
+        self._parser.feed(data)
+        for event, elem in self._parser.read_events():
+            if event == "start":
+                if self._root is None:
+                    self._root = elem
+                elif elem.tag == self.parent_tag:
+                    self._time = float(elem.get(self.parent_attr, 0))
+                    self._xml_parents += 1
+                continue
+            if elem.tag == self.record_tag:
+                yield self._time, elem.attrib
+                if self.parent_tag is None:
+                    elem.clear()
+                    self._root.clear()
+            elif elem.tag == self.parent_tag:
+                elem.clear()
+                self._root.clear()
+
+    def _feed_csv(self, data: bytes):
+        data = self._partial_line + data
+        end = data.rfind(b"\n") + 1
+        self._partial_line = data[end:]
+        lines = data[:end].decode("utf-8").splitlines()
+        for row in csv.reader(lines, delimiter=";"):
+            if not row:
+                continue
+            if self._csv_rows is None:
+                self._csv_rows = _CsvRows(row, self.record_tag, self.parent_tag, self.parent_attr)
+                continue
+            record = self._csv_rows.record(row)
+            if record is not None:
+                yield record
@@ -0,0 +1,372 @@
+# -*- coding: utf-8 -*-
+"""
+Análise de filas por faixa e por cruzamento a partir do queueinfo do SUMO.
+
+PILAR DE QUALIDADE: Eficiência, Mensurabilidade
+DESCRIÇÃO: Antes, o queueinfo.xml era carregado inteiro para produzir apenas
+dois números globais. Aqui o ficheiro é percorrido uma única vez, em lotes
+(ou lido da cache colunar), e cada lote atualiza acumuladores vetorizados por
+faixa e por cruzamento: média e percentis do tamanho da fila, tempo máximo de
+espera, tempo acima de um limiar e uma série temporal por intervalos. Os
+percentis vêm de histogramas de classes fixas (5 m ≈ um veículo), por isso a
+memória depende do número de faixas e nunca do número de passos.
+
+Os resultados ficam num SQLite indexado ('queue_analytics.sqlite', ao lado dos
+outputs), de onde os dashboards obtêm as piores faixas sem reler o ficheiro.
+"""
+import argparse
+import math
+import sqlite3
+import sys
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tcc_sumo.tools.output_cache import iter_output, output_info
+from tcc_sumo.tools.output_formats import OutputReader, open_output
+from tcc_sumo.utils.helpers import get_logger
+
+logger = get_logger("QueueAnalyzer")
+
+QUEUE_DB_NAME = "queue_analytics.sqlite"
+# Classes do histograma do tamanho da fila: a classe 0 é "sem fila", as restantes têm
+# LENGTH_BIN_M metros (a última acumula tudo o que exceder o alcance).
+LENGTH_BIN_M = 5.0
+LENGTH_BINS = 256
+PERCENTILES = (50, 95)
+BATCH_ROWS = 65536
+
+LANE_METRICS = ("mean_length_m", "p50_length_m", "p95_length_m", "max_length_m",
+                "max_waiting_s", "time_over_threshold_s")
+JUNCTION_METRICS = ("mean_total_m", "p50_total_m", "p95_total_m", "max_total_m",
+                    "max_waiting_s", "time_over_threshold_s")
+
+def load_lane_junctions(net_path: Path) -> Dict[str, str]:
+    """Cruzamento de cada faixa da rede: o nó de chegada da aresta (ou o próprio, nas faixas internas)."""
+    lane_junctions = {}
+    with open_output(net_path) as f:
+        for _, elem in ET.iterparse(f):
+            if elem.tag != "edge":
+                continue
+            if elem.get("function") == "internal":
+                junction = elem.get("id")[1:].rsplit("_", 1)[0]
+            else:
+                junction = elem.get("to")
+            if junction:
+                for lane in elem.iter("lane"):
+                    lane_junctions[lane.get("id")] = junction
+            elem.clear()
+    return lane_junctions
+
+def net_file_from_sumocfg(sumocfg_path: Path) -> Path | None:
+    """A rede (net-file) declarada num .sumocfg, relativa ao diretório do próprio ficheiro."""
+    sumocfg_path = Path(sumocfg_path)
+    try:
+        net_file = ET.parse(sumocfg_path).find("input/net-file")
+    except (ET.ParseError, OSError):
+        return None
+    if net_file is None or not net_file.get("value"):
+        return None
+    return sumocfg_path.parent / net_file.get("value").split(",")[0]
+
+class _GroupStats:
+    """Acumuladores de um conjunto de grupos (faixas ou cruzamentos), indexados pelo código do grupo."""
+    def __init__(self):
+        self.size = 0
+        self.samples = np.zeros(0, dtype=np.int64)
+        self.total = np.zeros(0)
+        self.max_length = np.zeros(0)
+        self.max_wait = np.zeros(0)
+        self.over_threshold = np.zeros(0, dtype=np.int64)
+        self.histogram = np.zeros((0, LENGTH_BINS), dtype=np.int64)
+
+    def _grow(self, size: int) -> None:
+        if size <= self.size:
+            return
+        extra = size - self.size
+        self.samples = np.concatenate([self.samples, np.zeros(extra, dtype=np.int64)])
+        self.total = np.concatenate([self.total, np.zeros(extra)])
+        self.max_length = np.concatenate([self.max_length, np.zeros(extra)])
+        self.max_wait = np.concatenate([self.max_wait, np.zeros(extra)])
+        self.over_threshold = np.concatenate([self.over_threshold, np.zeros(extra, dtype=np.int64)])
+        self.histogram = np.vstack([self.histogram, np.zeros((extra, LENGTH_BINS), dtype=np.int64)])
+        self.size = size
+
+    def add(self, codes: np.ndarray, lengths: np.ndarray, waits: np.ndarray, threshold_m: float) -> None:
+        if not len(codes):
+            return
+        self._grow(int(codes.max()) + 1)
+        size = self.size
+        self.samples += np.bincount(codes, minlength=size)
+        self.total += np.bincount(codes, weights=lengths, minlength=size)
+        np.maximum.at(self.max_length, codes, lengths)
+        np.maximum.at(self.max_wait, codes, waits)
+        self.over_threshold += np.bincount(codes[lengths >= threshold_m], minlength=size)
+        bins = np.where(lengths > 0, np.minimum(lengths // LENGTH_BIN_M + 1, LENGTH_BINS - 1), 0).astype(np.int64)
+        self.histogram += np.bincount(codes * LENGTH_BINS + bins, minlength=size * LENGTH_BINS).reshape(size, LENGTH_BINS)
+
+    def percentile(self, p: float, steps: int) -> np.ndarray:
+        """Percentil `p` do tamanho por grupo, contando como "sem fila" os passos sem registo."""
+        if not self.size or steps <= 0:
+            return np.zeros(self.size)
+        counts = self.histogram.copy()
+        counts[:, 0] += np.maximum(0, steps - self.samples)
+        rank = math.ceil(steps * p / 100)
+        index = np.argmax(counts.cumsum(axis=1) >= rank, axis=1)
+        return np.where(index == 0, 0.0, np.minimum(index * LENGTH_BIN_M, self.max_length))
+
+class QueueAnalyzer:
+    """
+    Acumula, lote a lote, as estatísticas de filas por faixa, por cruzamento e por intervalo de tempo.
+    """
+    def __init__(self, threshold_m: float = 50.0, bucket_s: float = 300.0,
+                 lane_junctions: Dict[str, str] | None = None):
+        self.threshold_m = threshold_m
+        self.bucket_s = bucket_s
+        self.lane_junctions = lane_junctions or {}
+        self.lane_names: List[str] = []
+        self.junction_names: List[str] = []
+        self._junction_index: Dict[str, int] = {}
+        self._lane_junction = np.zeros(0, dtype=np.int64)
+        self.lanes = _GroupStats()
+        self.junctions = _GroupStats()
+        self.series_total = np.zeros(0)
+        self.series_max_lane = np.zeros(0)
+        self.total_length = 0.0
+        self.max_wait = 0.0
+        self.interval_s: float | None = None
+        self.steps = 0
+        self._last_time: float | None = None
+        self._pending = None
+        # Registos recebidos por `add_records`, ainda por acumular.
+        self._lane_index: Dict[str, int] = {}
+        self._buffers = ([], [], [], [])
+
+    def _map_junctions(self, lane_names: List[str]) -> None:
+        """Estende o mapa faixa → cruzamento às faixas novas (-1 = cruzamento desconhecido)."""
+        self.lane_names = lane_names
+        known = len(self._lane_junction)
+        if len(lane_names) <= known:
+            return
+        codes = []
+        for lane in lane_names[known:]:
+            junction = self.lane_junctions.get(lane)
+            if junction is None:
+                codes.append(-1)
+                continue
+            code = self._junction_index.get(junction)
+            if code is None:
+                code = self._junction_index[junction] = len(self.junction_names)
+                self.junction_names.append(junction)
+            codes.append(code)
+        self._lane_junction = np.concatenate([self._lane_junction, np.array(codes, dtype=np.int64)])
+
+    def add_batch(self, times: np.ndarray, lane_codes: np.ndarray, lengths: np.ndarray,
+                  waits: np.ndarray, lane_names: List[str]) -> None:
+        """
+        Acumula um lote de registos <lane>, pela ordem do ficheiro.
+
+        `lane_codes` indexa `lane_names`, que só pode crescer entre lotes.
+        """
+        if not len(times):
+            return
+        self._map_junctions(lane_names)
+        lengths, waits = np.nan_to_num(lengths), np.nan_to_num(waits)
+        self.lanes.add(lane_codes, lengths, waits, self.threshold_m)
+        self.total_length += float(lengths.sum())
+        self.max_wait = max(self.max_wait, float(waits.max()))
+        self._observe_interval(times)
+
+        buckets = (times // self.bucket_s).astype(np.int64)
+        size = int(buckets.max()) + 1
+        if size > len(self.series_total):
+            extra = size - len(self.series_total)
+            self.series_total = np.concatenate([self.series_total, np.zeros(extra)])
+            self.series_max_lane = np.concatenate([self.series_max_lane, np.zeros(extra)])
+        self.series_total += np.bincount(buckets, weights=lengths, minlength=len(self.series_total))
+        np.maximum.at(self.series_max_lane, buckets, lengths)
+
+        # O total de um cruzamento soma as faixas do mesmo passo: o último passo do lote
+        # pode continuar no lote seguinte e fica pendente.
+        batch = (times, lane_codes, lengths, waits)
+        if self._pending is not None:
+            batch = tuple(np.concatenate([old, new]) for old, new in zip(self._pending, batch))
+        complete = batch[0] < batch[0][-1]
+        self._pending = tuple(column[~complete] for column in batch)
+        self._add_junction_steps(*(column[complete] for column in batch))
+
+    def add_records(self, records) -> None:
+        """Acumula registos (instante, atributos de <lane>) tal como lidos do output, em lotes de BATCH_ROWS."""
+        times, codes, lengths, waits = self._buffers
+        lane_index, lane_names = self._lane_index, self.lane_names
+        for time, lane in records:
+            lane_id = lane.get("id")
+            code = lane_index.get(lane_id)
+            if code is None:
+                code = lane_index[lane_id] = len(lane_names)
+                lane_names.append(lane_id)
+            times.append(time)
+            codes.append(code)
+            lengths.append(float(lane.get("queueing_length", 0.0)))
+            waits.append(float(lane.get("queueing_time", 0.0)))
+            if len(times) >= BATCH_ROWS:
+                self.flush_records()
+
+    def flush_records(self) -> None:
+        """Acumula já os registos de `add_records` em espera."""
+        times, codes, lengths, waits = self._buffers
+        if times:
+            self.add_batch(np.array(times), np.array(codes, dtype=np.int64), np.array(lengths),
+                           np.array(waits), self.lane_names)
+        for buffer in self._buffers:
+            buffer.clear()
+
+    def _observe_interval(self, times: np.ndarray) -> None:
+        """Intervalo entre registos do output (menor diferença entre instantes consecutivos)."""
+        distinct = np.unique(times)
+        if self._last_time is not None and distinct[0] > self._last_time:
+            distinct = np.concatenate([[self._last_time], distinct])
+        if len(distinct) > 1:
+            interval = float(np.diff(distinct).min())
+            self.interval_s = interval if self.interval_s is None else min(self.interval_s, interval)
+        self._last_time = float(distinct[-1])
+
+    def _add_junction_steps(self, times, lane_codes, lengths, waits) -> None:
+        junctions = self._lane_junction[lane_codes] if len(lane_codes) else lane_codes
+        known = junctions >= 0
+        if not known.any():
+            return
+        times, junctions, lengths, waits = times[known], junctions[known], lengths[known], waits[known]
+        _, step = np.unique(times, return_inverse=True)
+        width = len(self.junction_names)
+        keys, group = np.unique(step * width + junctions, return_inverse=True)
+        totals = np.bincount(group, weights=lengths)
+        max_waits = np.zeros(len(keys))
+        np.maximum.at(max_waits, group, waits)
+        self.junctions.add(keys % width, totals, max_waits, self.threshold_m)
+
+    def finish(self, steps: int) -> None:
+        """Fecha a análise com o número total de passos do output (incluindo os sem filas)."""
+        self.flush_records()
+        if self._pending is not None:
+            self._add_junction_steps(*self._pending)
+            self._pending = None
+        self.steps = steps
+
+    # --- Resultados ---
+
+    def global_metrics(self, steps: int | None = None) -> dict:
+        """As métricas globais do registo de análise (`steps` permite calculá-las a meio da leitura)."""
+        steps = self.steps if steps is None else steps
+        # A média do tamanho da fila deve considerar o comprimento médio de um veículo (aprox. 5m)
+        avg_queue_vehicles = (self.total_length / steps / 5) if steps > 0 else 0
+        return {
+            "Tamanho Médio da Fila (veículos)": round(avg_queue_vehicles, 2),
+            "Tempo Máximo de Espera (s)": round(self.max_wait, 2)
+        }
+
+    def _group_rows(self, stats: _GroupStats, names: List[str]) -> list:
+        interval = self.interval_s or 1.0
+        steps = max(self.steps, 1)
+        p50, p95 = (stats.percentile(p, self.steps) for p in PERCENTILES)
+        return [(names[i], float(stats.total[i] / steps), float(p50[i]), float(p95[i]), float(stats.max_length[i]),
+                 float(stats.max_wait[i]), float(stats.over_threshold[i] * interval))
+                for i in range(stats.size)]
+
+    def save(self, db_path: Path) -> None:
+        """Grava as estatísticas num SQLite com índices por métrica (substitui o anterior)."""
+        db_path = Path(db_path)
+        tmp_path = db_path.with_suffix(".tmp")
+        tmp_path.unlink(missing_ok=True)
+        interval = self.interval_s or 1.0
+        duration = self.steps * interval
+        series = []
+        for bucket, (total, max_lane) in enumerate(zip(self.series_total, self.series_max_lane)):
+            covered = min(self.bucket_s, max(interval, duration - bucket * self.bucket_s))
+            series.append((bucket * self.bucket_s, float(total * interval / covered), float(max_lane)))
+        lane_junction = {lane: self.junction_names[code] for lane, code in zip(self.lane_names, self._lane_junction) if code >= 0}
+
+        with sqlite3.connect(tmp_path) as db:
+            db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value REAL)")
+            db.executemany("INSERT INTO meta VALUES (?, ?)", [
+                ("steps", self.steps), ("interval_s", interval), ("threshold_m", self.threshold_m),
+                ("bucket_s", self.bucket_s), ("total_length_m", self.total_length), ("max_waiting_s", self.max_wait)])
+            db.execute(f"CREATE TABLE lanes (lane TEXT PRIMARY KEY, junction TEXT, {', '.join(m + ' REAL' for m in LANE_METRICS)})")
+            db.executemany(f"INSERT INTO lanes VALUES (?, ?, {', '.join('?' * len(LANE_METRICS))})",
+                           [(row[0], lane_junction.get(row[0]), *row[1:]) for row in self._group_rows(self.lanes, self.lane_names)])
+            db.execute(f"CREATE TABLE junctions (junction TEXT PRIMARY KEY, {', '.join(m + ' REAL' for m in JUNCTION_METRICS)})")
+            db.executemany(f"INSERT INTO junctions VALUES (?, {', '.join('?' * len(JUNCTION_METRICS))})",
+                           self._group_rows(self.junctions, self.junction_names))
+            db.execute("CREATE TABLE series (bucket_start_s REAL PRIMARY KEY, mean_total_queue_m REAL, max_lane_queue_m REAL)")
+            db.executemany("INSERT INTO series VALUES (?, ?, ?)", series)
+            db.execute("CREATE INDEX lanes_junction ON lanes (junction)")
+            for metric in LANE_METRICS:
+                db.execute(f"CREATE INDEX lanes_{metric} ON lanes ({metric} DESC)")
+            for metric in JUNCTION_METRICS:
+                db.execute(f"CREATE INDEX junctions_{metric} ON junctions ({metric} DESC)")
+        tmp_path.replace(db_path)
+        logger.info(f"Análise de filas de {len(self.lane_names)} faixas e {len(self.junction_names)} cruzamentos "
+                    f"salva em '{db_path}'.")
+
+def analyze_queue_output(path: Path, threshold_m: float = 50.0, bucket_s: float = 300.0,
+                         lane_junctions: Dict[str, str] | None = None, use_cache: bool = True) -> QueueAnalyzer:
+    """Percorre o queueinfo uma única vez (pela cache colunar ou em streaming) e devolve o analisador."""
+    analyzer = QueueAnalyzer(threshold_m, bucket_s, lane_junctions)
+    columns = ["timestep", "id", "queueing_time", "queueing_length"]
+    if use_cache:
+        lane_names = None
+        for chunk in iter_output(path, "queueinfo", columns):
+            if lane_names is None:
+                lane_names = list(chunk["id"].cat.categories)
+            analyzer.add_batch(chunk["timestep"].to_numpy(), chunk["id"].cat.codes.to_numpy().astype(np.int64),
+                               chunk["queueing_length"].to_numpy(), chunk["queueing_time"].to_numpy(), lane_names)
+        analyzer.finish(output_info(path, "queueinfo")["parent_count"])
+        return analyzer
+
+    reader = OutputReader(path, "queueinfo")
+    analyzer.add_records(reader.records())
+    analyzer.finish(reader.parent_count)
+    return analyzer
+
+def _worst(db_path: Path, table: str, metrics: tuple, metric: str, limit: int) -> list:
+    if metric not in metrics:
+        raise ValueError(f"Métrica inválida: '{metric}'. Opções: {', '.join(metrics)}.")
+    with sqlite3.connect(f"file:{Path(db_path)}?mode=ro", uri=True) as db:
+        db.row_factory = sqlite3.Row
+        rows = db.execute(f"SELECT * FROM {table} ORDER BY {metric} DESC LIMIT ?", (limit,)).fetchall()
+    return [dict(row) for row in rows]
+
+def worst_lanes(db_path: Path, metric: str = "p95_length_m", limit: int = 10) -> list:
+    """As `limit` faixas com maior valor de `metric` (consulta pelo índice, sem ler o queueinfo)."""
+    return _worst(db_path, "lanes", LANE_METRICS, metric, limit)
+
+def worst_junctions(db_path: Path, metric: str = "p95_total_m", limit: int = 10) -> list:
+    """Os `limit` cruzamentos com maior valor de `metric`."""
+    return _worst(db_path, "junctions", JUNCTION_METRICS, metric, limit)
+
+if __name__ == "__main__":
+    from tcc_sumo.utils.helpers import setup_logging
+    parser = argparse.ArgumentParser(description="Análise de filas por faixa e cruzamento a partir do queueinfo.")
+    parser.add_argument("--queue", type=Path, required=True, help="Output de filas (queueinfo.xml, .xml.gz, .csv...).")
+    parser.add_argument("--net", type=Path, help="Rede do cenário (.net.xml), para agrupar as faixas por cruzamento.")
+    parser.add_argument("--threshold", type=float, default=50.0, help="Limiar do tamanho da fila, em metros.")
+    parser.add_argument("--bucket", type=float, default=300.0, help="Intervalo da série temporal, em segundos.")
+    parser.add_argument("--top", type=int, default=10, help="Número de faixas e cruzamentos a listar.")
+    args = parser.parse_args()
+
+    setup_logging()
+    lane_junctions = load_lane_junctions(args.net) if args.net else None
+    analyzer = analyze_queue_output(args.queue, args.threshold, args.bucket, lane_junctions, use_cache=False)
+    db_path = args.queue.parent / QUEUE_DB_NAME
+    analyzer.save(db_path)
+    print(f"{'Faixa':<30} {'Média (m)':>10} {'p95 (m)':>9} {'Máx (m)':>9} {'Espera máx (s)':>15}")
+    for row in worst_lanes(db_path, limit=args.top):
+        print(f"{row['lane']:<30} {row['mean_length_m']:>10.1f} {row['p95_length_m']:>9.1f} "
+              f"{row['max_length_m']:>9.1f} {row['max_waiting_s']:>15.1f}")
+    if lane_junctions:
+        print(f"\n{'Cruzamento':<30} {'Média (m)':>10} {'p95 (m)':>9} {'Máx (m)':>9}")
+        for row in worst_junctions(db_path, limit=args.top):
+            print(f"{row['junction']:<30} {row['mean_total_m']:>10.1f} {row['p95_total_m']:>9.1f} {row['max_total_m']:>9.1f}")
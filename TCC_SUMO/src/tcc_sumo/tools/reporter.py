@@ -1,13 +1,11 @@
 # -*- coding: utf-8 -*-
 """Módulo responsável por toda a lógica de relatórios da simulação."""
 
-import json
 import logging
 import os
 import sys
-from collections import defaultdict
 from datetime import datetime
-from typing import Any, Dict, List
+from typing import Any, Dict
 
 if 'SUMO_HOME' in os.environ:
     tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
@@ -15,7 +13,8 @@ if 'SUMO_HOME' in os.environ:
 else:
     sys.exit("ERRO: Declare a variável de ambiente 'SUMO_HOME'.")
 
-import traci
+from tcc_sumo.simulation.kpi_collector import KpiCollector
+from tcc_sumo.tools.results_store import ResultsStore
 
 logger = logging.getLogger(__name__)
 
@@ -23,46 +22,35 @@ logger = logging.getLogger(__name__)
 class Reporter:
     """Coleta dados da simulação e gera relatórios de alto nível."""
 
-    def __init__(self):
-        self.arrived_vehicles = set()
-        self.completed_trips_data: List[Dict[str, float]] = []
-        self.co2_emissions_mg: Dict[str, float] = defaultdict(float)
+    def __init__(self, collector: KpiCollector | None = None):
+        # O coletor pode ser partilhado com o SimulationManager (que já o atualiza a cada passo).
+        self.collector = collector or KpiCollector()
+        self._collector_ready = collector is not None
         logger.info("Instância do Reporter criada.")
 
     def collect_data_step(self):
-        """Coleta dados em tempo real a cada passo da simulação."""
-        arrived_ids_this_step = traci.simulation.getArrivedIDList()
-        for vehicle_id in arrived_ids_this_step:
-            if vehicle_id not in self.arrived_vehicles:
-                try:
-                    # Corrigido: getTripInfo não existe em traci.vehicle.
-                    # Os dados de duração e perda de tempo são melhor analisados
-                    # a partir dos arquivos de saída XML.
-                    self.completed_trips_data.append({
-                        "duration": 0,
-                        "timeLoss": 0,
-                        "waitingTime": traci.vehicle.getWaitingTime(vehicle_id),
-                    })
-                    self.arrived_vehicles.add(vehicle_id)
-                except traci.TraCIException:
-                    logger.debug(f"Não foi possível obter dados para o veículo {vehicle_id}.")
-
-        for vehicle_id in traci.vehicle.getIDList():
-            self.co2_emissions_mg[vehicle_id] += traci.vehicle.getCO2Emission(vehicle_id)
+        """
+        Coleta dados em tempo real a cada passo da simulação (chamar após cada simulationStep).
+
+        Os valores vêm das subscrições TraCI do KpiCollector: os veículos que
+        chegaram já não são consultados (o que falhava com getWaitingTime).
+        """
+        if not self._collector_ready:
+            self.collector.setup()
+            self._collector_ready = True
+        self.collector.collect_step()
 
     def _calculate_metrics(self) -> Dict[str, float]:
         """Processa os dados brutos e calcula as métricas consolidadas."""
-        num_trips = len(self.completed_trips_data)
-        avg_duration = sum(d['duration'] for d in self.completed_trips_data) / num_trips if num_trips else 0
-        avg_time_loss = sum(d['timeLoss'] for d in self.completed_trips_data) / num_trips if num_trips else 0
-        avg_waiting_time = sum(d['waitingTime'] for d in self.completed_trips_data) / num_trips if num_trips else 0
-        total_co2_mg = sum(self.co2_emissions_mg.values())
+        trips = self.collector.trip_summary()
+        num_trips = trips["completed_trips"]
+        total_co2_mg = self.collector.emission_aggregate().totals["CO2"]
         total_co2_kg = total_co2_mg / 1_000_000.0
         avg_co2_kg = total_co2_kg / num_trips if num_trips else 0
 
         return {
-            "completed_trips": num_trips, "avg_duration": avg_duration, "avg_time_loss": avg_time_loss,
-            "avg_waiting_time": avg_waiting_time, "total_co2_kg": total_co2_kg,
+            "completed_trips": num_trips, "avg_duration": trips["avg_duration"], "avg_time_loss": trips["avg_time_loss"],
+            "avg_waiting_time": trips["avg_waiting_time"], "total_co2_kg": total_co2_kg,
             "avg_co2_kg_per_vehicle": avg_co2_kg,
         }
 
@@ -120,18 +108,6 @@ class Reporter:
             f.write(report_template)
 
     def _update_consolidated_json(self, config: Dict[str, Any], data: Dict[str, Any]):
-        """Atualiza o arquivo de dados consolidado (`consolidated_data.json`)."""
+        """Acrescenta o registo à base de dados consolidada (`consolidated_data.sqlite`)."""
         path = os.path.join(config['output_paths']['dashboards'], config['output_paths']['consolidated_data'])
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        records = []
-        if os.path.exists(path) and os.path.getsize(path) > 0:
-            try:
-                with open(path, 'r', encoding='utf-8') as f:
-                    records = json.load(f)
-                if not isinstance(records, list):
-                    records = []
-            except (IOError, json.JSONDecodeError):
-                records = []
-        records.append(data)
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(records, f, indent=4, ensure_ascii=False)
\ No newline at end of file
+        ResultsStore(path).append(data)
\ No newline at end of file
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Base de dados histórica dos resultados das simulações.
+
+PILAR DE QUALIDADE: Eficiência, Robustez
+DESCRIÇÃO: O antigo consolidated_data.json era lido por inteiro, acrescido de
+um registo e reescrito a cada simulação (custo que cresce com o histórico), e
+duas execuções em simultâneo podiam perder registos ou corromper o ficheiro.
+Aqui cada registo é uma linha acrescentada a uma tabela SQLite, numa transação
+com bloqueio exclusivo do ficheiro; a leitura do último registo e as consultas
+por cenário, modo e data usam índices, sem ler o histórico. Na primeira
+abertura, o JSON existente é importado uma única vez e guardado como
+'<nome>.json.migrated'.
+"""
+import argparse
+import json
+import sqlite3
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tcc_sumo.utils.helpers import get_logger
+
+logger = get_logger("ResultsStore")
+
+RESULTS_DB_NAME = "consolidated_data.sqlite"
+# Tempo máximo de espera (s) pelo bloqueio do ficheiro quando outra execução está a escrever.
+LOCK_TIMEOUT_S = 30.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    analysis_timestamp TEXT,
+    scenario TEXT,
+    mode TEXT,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_scenario_mode ON runs (scenario, mode, id);
+CREATE INDEX IF NOT EXISTS runs_mode ON runs (mode, id);
+CREATE INDEX IF NOT EXISTS runs_timestamp ON runs (analysis_timestamp);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+class ResultsStore:
+    """
+    Registos de análise (os mesmos dicionários do antigo JSON), apenas acrescentados.
+    """
+    def __init__(self, db_path: Path, legacy_json: Path | None = None):
+        self.db_path = Path(db_path)
+        self.legacy_json = Path(legacy_json) if legacy_json else self.db_path.with_suffix(".json")
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+        self._migrate_legacy_json()
+
+    @contextmanager
+    def _connect(self, write: bool = False):
+        """
+        Ligação de curta duração; com `write`, dentro de uma transação com bloqueio exclusivo.
+
+        O BEGIN IMMEDIATE obtém o bloqueio de escrita do ficheiro antes de qualquer leitura;
+        outra execução que queira escrever espera por ele (até LOCK_TIMEOUT_S).
+        """
+        db = sqlite3.connect(self.db_path, timeout=LOCK_TIMEOUT_S, isolation_level=None)
+        try:
+            if write:
+                db.execute("BEGIN IMMEDIATE")
+            yield db
+            if write:
+                db.execute("COMMIT")
+        except BaseException:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+
+    def _migrate_legacy_json(self) -> None:
+        """Importa (uma única vez) os registos do consolidated_data.json existente."""
+        if not self.legacy_json.is_file():
+            return
+        with self._connect(write=True) as db:
+            # Outra execução pode ter feito a migração enquanto esta esperava pelo bloqueio.
+            if db.execute("SELECT 1 FROM meta WHERE key = 'migrated_from'").fetchone():
+                return
+            records = []
+            try:
+                with open(self.legacy_json, 'r', encoding='utf-8') as f:
+                    records = json.load(f)
+                if not isinstance(records, list):
+                    records = []
+            except (IOError, json.JSONDecodeError) as e:
+                logger.warning(f"Não foi possível ler '{self.legacy_json}' para migração: {e}")
+            db.executemany("INSERT INTO runs (analysis_timestamp, scenario, mode, record) VALUES (?, ?, ?, ?)",
+                           [self._row(record) for record in records if isinstance(record, dict)])
+            db.execute("INSERT INTO meta VALUES ('migrated_from', ?)", (str(self.legacy_json),))
+        self.legacy_json.replace(self.legacy_json.with_suffix(".json.migrated"))
+        logger.info(f"{len(records)} registos migrados de '{self.legacy_json}' para '{self.db_path}'.")
+
+    @staticmethod
+    def _row(record: dict) -> tuple:
+        return (record.get("analysis_timestamp"), record.get("scenario"), record.get("mode"),
+                json.dumps(record, ensure_ascii=False))
+
+    def append(self, record: dict) -> int:
+        """Acrescenta um registo e devolve o seu id (a ordem de inserção)."""
+        with self._connect(write=True) as db:
+            return db.execute("INSERT INTO runs (analysis_timestamp, scenario, mode, record) VALUES (?, ?, ?, ?)",
+                              self._row(record)).lastrowid
+
+    def _select(self, scenario: str | None, mode: str | None, since: str | None, until: str | None,
+                newest_first: bool, limit: int | None) -> List[dict]:
+        clauses, params = [], []
+        for column, value in (("scenario", scenario), ("mode", mode)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("analysis_timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("analysis_timestamp < ?")
+            params.append(until)
+        sql = "SELECT record FROM runs"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY id DESC" if newest_first else " ORDER BY id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._connect() as db:
+            return [json.loads(record) for (record,) in db.execute(sql, params)]
+
+    def latest(self, scenario: str | None = None, mode: str | None = None) -> dict | None:
+        """O último registo (opcionalmente de um cenário/modo), obtido pelo índice sem percorrer o histórico."""
+        records = self._select(scenario, mode, None, None, newest_first=True, limit=1)
+        return records[0] if records else None
+
+    def query(self, scenario: str | None = None, mode: str | None = None, since: str | None = None,
+              until: str | None = None, limit: int | None = None) -> List[dict]:
+        """Registos por ordem de inserção; `since`/`until` filtram o analysis_timestamp (ISO 8601)."""
+        return self._select(scenario, mode, since, until, newest_first=False, limit=limit)
+
+    def count(self) -> int:
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    def export_json(self, json_path: Path) -> None:
+        """Exporta o histórico no formato do antigo consolidated_data.json (lista de registos)."""
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(self.query(), f, indent=4, ensure_ascii=False)
+        logger.info(f"Histórico exportado para '{json_path}'.")
+
+if __name__ == "__main__":
+    from tcc_sumo.utils.helpers import setup_logging, PROJECT_ROOT
+    parser = argparse.ArgumentParser(description="Consulta da base de dados histórica das simulações.")
+    parser.add_argument("--db", type=Path, default=PROJECT_ROOT / "logs" / RESULTS_DB_NAME, help="Ficheiro SQLite.")
+    parser.add_argument("--scenario", help="Filtra por cenário.")
+    parser.add_argument("--mode", help="Filtra por modo (ex.: STATIC, ADAPTIVE).")
+    parser.add_argument("--since", help="Apenas registos a partir desta data (ISO 8601).")
+    parser.add_argument("--latest", action="store_true", help="Mostra apenas o último registo.")
+    parser.add_argument("--export", type=Path, help="Exporta o histórico completo para um JSON.")
+    args = parser.parse_args()
+
+    setup_logging()
+    store = ResultsStore(args.db)
+    if args.export:
+        store.export_json(args.export)
+    elif args.latest:
+        print(json.dumps(store.latest(args.scenario, args.mode), indent=4, ensure_ascii=False))
+    else:
+        for record in store.query(args.scenario, args.mode, args.since):
+            print(f"{record.get('analysis_timestamp')}  {record.get('scenario')}  {record.get('mode')}")
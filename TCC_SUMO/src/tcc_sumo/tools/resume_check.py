@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Comparação entre uma execução sem interrupção e a mesma execução retomada de um checkpoint.
+
+PILAR DE QUALIDADE: Fiabilidade
+DESCRIÇÃO: Corre o mesmo cenário (mesma semente) duas vezes: uma até ao fim e
+outra que é morta (SIGKILL) logo após gravar o checkpoint do passo pedido e
+depois retomada com '--resume'. Compara, viagem a viagem, o tripinfo final de
+ambas. As viagens terminadas antes do checkpoint têm de ser idênticas e nenhuma
+viagem pode aparecer duas vezes (falha do corte/junção dos outputs ou veículos
+reinseridos na retoma); as que terminam depois são apenas reportadas, porque o
+estado gravado pelo SUMO não é completo e a retoma é aproximada.
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tcc_sumo.utils.helpers import get_logger, setup_logging, select_traci_backend, PROJECT_ROOT
+
+logger = get_logger("ResumeCheck")
+
+def load_config() -> dict:
+    with open(PROJECT_ROOT / "config" / "config.yaml", 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f)
+
+def sumocfg_with_end(config_file: Path, end_time: float) -> Path:
+    """Cópia do .sumocfg com o tempo final `end_time`, no mesmo diretório (caminhos relativos válidos)."""
+    config_file = Path(config_file)
+    tree = ET.parse(config_file)
+    time_section = tree.getroot().find("time")
+    if time_section is None:
+        time_section = ET.SubElement(tree.getroot(), "time")
+    end = time_section.find("end")
+    if end is None:
+        end = ET.SubElement(time_section, "end")
+    end.set("value", f"{end_time:g}")
+    target = config_file.with_name(f"{config_file.stem}.end_{end_time:g}.sumocfg")
+    tree.write(target, encoding="utf-8", xml_declaration=True)
+    return target
+
+def run_worker(scenario: str, sumocfg: str, mode: str, seed: int, output_dir: Path,
+               checkpoint_step: int, resume: bool) -> None:
+    """Executa uma simulação no processo atual (com checkpoints se `checkpoint_step` > 0)."""
+    config = load_config()
+    config['scenarios'] = {scenario: sumocfg}
+    config['sumo_executable'] = "sumo"
+    config['output_format'] = "xml"
+    config['checkpoint'] = {"interval_steps": checkpoint_step, "keep": 1}
+    select_traci_backend(config.get('traci_backend', 'socket'), "sumo")
+    from tcc_sumo.simulation.manager import SimulationManager
+
+    SimulationManager(config, scenario, mode, output_dir=str(output_dir), seed=seed,
+                      consolidate=False, resume=resume).run()
+
+def _worker_cmd(args, output_dir: Path, sumocfg: Path, checkpoint_step: int, resume: bool) -> list:
+    cmd = [sys.executable, str(Path(__file__).resolve()), "--worker", "--scenario", args.scenario,
+           "--mode", args.mode, "--seed", str(args.seed), "--sumocfg", str(sumocfg),
+           "--output-dir", str(output_dir), "--checkpoint-step", str(checkpoint_step)]
+    return cmd + (["--resume"] if resume else [])
+
+def run_interrupted(cmd: list, checkpoint_file: Path, timeout_s: float) -> None:
+    """Corre `cmd` e mata-o (com o SUMO) assim que o checkpoint esperado existir."""
+    process = subprocess.Popen(cmd, cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               start_new_session=True)
+    deadline = time.monotonic() + timeout_s
+    try:
+        while not checkpoint_file.is_file():
+            if process.poll() is not None:
+                raise RuntimeError("A simulação terminou antes de gravar o checkpoint.")
+            if time.monotonic() > deadline:
+                raise RuntimeError("Tempo esgotado à espera do checkpoint.")
+            time.sleep(0.2)
+    finally:
+        if process.poll() is None:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+
+def load_trips(output_dir: Path) -> tuple[dict, int]:
+    """Atributos de cada viagem do tripinfo por id, e o número total de registos."""
+    trips, records = {}, 0
+    for _, elem in ET.iterparse(output_dir / "tripinfo.xml"):
+        if elem.tag == "tripinfo":
+            trips[elem.get("id")] = dict(elem.attrib)
+            records += 1
+            elem.clear()
+    return trips, records
+
+def compare(full: dict, resumed: dict, resumed_records: int, checkpoint_time: float) -> dict:
+    """Diferenças entre as viagens das duas execuções, antes e depois do checkpoint."""
+    def split(trips):
+        before = {k: v for k, v in trips.items() if float(v["arrival"]) < checkpoint_time}
+        return before, {k: v for k, v in trips.items() if k not in before}
+
+    def mean(trips, attr):
+        return round(sum(float(v[attr]) for v in trips.values()) / len(trips), 2) if trips else 0.0
+
+    full_before, full_after = split(full)
+    resumed_before, resumed_after = split(resumed)
+    return {
+        "checkpoint_time": checkpoint_time,
+        "trips": {"full": len(full), "resumed": len(resumed)},
+        "duplicated_trips": resumed_records - len(resumed),
+        "before_checkpoint": {
+            "full": len(full_before), "resumed": len(resumed_before),
+            "differing": sum(full_before[k] != resumed_before.get(k) for k in full_before)
+                         + len(resumed_before.keys() - full_before.keys()),
+        },
+        "after_checkpoint": {
+            "full": len(full_after), "resumed": len(resumed_after),
+            "only_in_one": len(full_after.keys() ^ resumed_after.keys()),
+            "identical": sum(full_after[k] == resumed_after.get(k) for k in full_after),
+        },
+        "mean_duration_s": {"full": mean(full, "duration"), "resumed": mean(resumed, "duration")},
+        "mean_time_loss_s": {"full": mean(full, "timeLoss"), "resumed": mean(resumed, "timeLoss")},
+    }
+
+def run_check(args) -> dict:
+    config = load_config()
+    sumocfg = Path(config['scenarios'][args.scenario])
+    if not sumocfg.is_absolute():
+        sumocfg = PROJECT_ROOT / sumocfg
+    if args.steps:
+        sumocfg = sumocfg_with_end(sumocfg, args.steps)
+    with tempfile.TemporaryDirectory(prefix="tcc_resume_check_") as tmp_dir:
+        full_dir, resumed_dir = Path(tmp_dir) / "full", Path(tmp_dir) / "resumed"
+        logger.info(f"Execução sem interrupção de '{args.scenario}' ({args.mode}, semente {args.seed})...")
+        subprocess.run(_worker_cmd(args, full_dir, sumocfg, 0, False), cwd=PROJECT_ROOT, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        logger.info(f"Execução interrompida após o checkpoint do passo {args.checkpoint_step}...")
+        checkpoint_file = resumed_dir / "checkpoints" / f"state_{args.checkpoint_step:09d}.json"
+        run_interrupted(_worker_cmd(args, resumed_dir, sumocfg, args.checkpoint_step, False),
+                        checkpoint_file, args.timeout)
+        checkpoint_time = json.loads(checkpoint_file.read_text(encoding='utf-8'))["sim_time"]
+        logger.info("Retoma a partir do checkpoint...")
+        subprocess.run(_worker_cmd(args, resumed_dir, sumocfg, args.checkpoint_step, True), cwd=PROJECT_ROOT,
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        full, _ = load_trips(full_dir)
+        resumed, resumed_records = load_trips(resumed_dir)
+    return compare(full, resumed, resumed_records, checkpoint_time)
+
+def print_report(result: dict) -> bool:
+    """Imprime a comparação e devolve se a parte exata (antes do checkpoint) coincide."""
+    before, after = result["before_checkpoint"], result["after_checkpoint"]
+    print(f"Viagens: {result['trips']['full']} sem interrupção, {result['trips']['resumed']} com retoma "
+          f"({result['duplicated_trips']} duplicadas).")
+    print(f"Antes do checkpoint ({result['checkpoint_time']}s): {before['full']} / {before['resumed']} "
+          f"viagens, {before['differing']} diferentes.")
+    print(f"Depois do checkpoint: {after['full']} / {after['resumed']} viagens, {after['identical']} idênticas, "
+          f"{after['only_in_one']} só numa das execuções.")
+    print(f"Duração média: {result['mean_duration_s']['full']} / {result['mean_duration_s']['resumed']} s | "
+          f"Tempo perdido médio: {result['mean_time_loss_s']['full']} / {result['mean_time_loss_s']['resumed']} s")
+    return result["duplicated_trips"] == 0 and before["differing"] == 0 and before["full"] == before["resumed"]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara uma execução completa com a mesma execução retomada de um checkpoint.")
+    parser.add_argument("--scenario", type=str, default='osm')
+    parser.add_argument("--mode", type=str, default='ADAPTIVE', choices=['STATIC', 'ADAPTIVE'])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--steps", type=int, default=0, help="Tempo final da simulação (0 = o do .sumocfg).")
+    parser.add_argument("--checkpoint-step", type=int, default=1000, help="Passo do checkpoint a partir do qual se retoma.")
+    parser.add_argument("--timeout", type=float, default=3600.0, help="Espera máxima pelo checkpoint (s).")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--sumocfg", type=str, help=argparse.SUPPRESS)
+    parser.add_argument("--output-dir", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--resume", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    setup_logging()
+    if args.worker:
+        run_worker(args.scenario, args.sumocfg, args.mode, args.seed, args.output_dir, args.checkpoint_step, args.resume)
+    else:
+        result = run_check(args)
+        output_file = PROJECT_ROOT / "logs" / "resume_check.json"
+        output_file.write_text(json.dumps(result, indent=4), encoding='utf-8')
+        ok = print_report(result)
+        logger.info(f"Comparação salva em '{output_file}'.")
+        sys.exit(0 if ok else 1)
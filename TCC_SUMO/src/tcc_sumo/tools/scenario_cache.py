@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Cache endereçada por conteúdo dos artefactos da geração de cenários.
+
+PILAR DE QUALIDADE: Eficiência, Reprodutibilidade
+DESCRIÇÃO: O gerador apagava o diretório do cenário e voltava a correr o
+netconvert e o randomTrips.py a cada invocação, mesmo quando só mudava o número
+de veículos. Aqui cada passo da geração (rede, rotas, sumocfg) fica guardado
+sob uma chave que é o hash SHA-256 das suas entradas: o conteúdo dos ficheiros
+de origem (ou a chave do passo anterior), as opções das ferramentas e a versão
+do SUMO. A rede de uma mesma área OSM é assim reutilizada por todas as
+densidades, e repetir uma geração já feita não corre nenhuma ferramenta.
+
+Os artefactos ficam em 'scenarios/.cache/<passo>/<chave>/' (ou no diretório da
+variável SCENARIO_CACHE_DIR) e são copiados para o diretório do cenário, que pode
+assim ser editado sem alterar a cache. Só os da rede, grandes e que nenhum passo
+seguinte altera, são colocados por hard link (com cópia como alternativa): o
+.net.xml de um cenário gerado partilha o conteúdo com a entrada da cache e não
+deve ser editado no próprio sítio (um editor que grava por substituição não a afeta).
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tcc_sumo.utils.helpers import get_logger, PROJECT_ROOT
+
+logger = get_logger("ScenarioCache")
+
+DEFAULT_CACHE_DIR = PROJECT_ROOT / "scenarios" / ".cache"
+# Versão do formato das entradas; alterá-la invalida a cache inteira.
+CACHE_VERSION = 1
+HASH_CHUNK_BYTES = 1024 * 1024
+
+@lru_cache(maxsize=None)
+def _file_digest(path: str, size: int, mtime_ns: int) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def file_digest(path: Path) -> str:
+    """SHA-256 do conteúdo de um ficheiro (calculado uma vez por processo e versão do ficheiro)."""
+    stat = Path(path).stat()
+    return _file_digest(str(Path(path).resolve()), stat.st_size, stat.st_mtime_ns)
+
+@lru_cache(maxsize=None)
+def sumo_version() -> str:
+    """Versão do SUMO em uso (primeira linha de 'netconvert --version')."""
+    netconvert = Path(os.environ["SUMO_HOME"]) / "bin" / "netconvert"
+    try:
+        result = subprocess.run([str(netconvert), "--version"], capture_output=True, text=True, encoding="utf-8")
+        return result.stdout.strip().splitlines()[0]
+    except (OSError, IndexError):
+        # Sem versão conhecida, as entradas ficam associadas ao próprio executável.
+        return f"desconhecida ({netconvert})"
+
+class ScenarioCache:
+    """
+    Artefactos de geração indexados por chave; `enabled=False` desativa a reutilização.
+    """
+    def __init__(self, root: Path | None = None, enabled: bool = True):
+        self.root = Path(root or os.environ.get("SCENARIO_CACHE_DIR") or DEFAULT_CACHE_DIR)
+        self.enabled = enabled
+
+    def key(self, step: str, options: dict, input_files: Iterable[Path] = (), parent_keys: Iterable[str] = ()) -> str:
+        """Chave de um passo: hash das entradas, das opções, das chaves anteriores e da versão do SUMO."""
+        payload = {
+            "version": CACHE_VERSION, "step": step, "sumo": sumo_version(), "options": options,
+            "inputs": [file_digest(path) for path in input_files], "parents": list(parent_keys),
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def _entry(self, step: str, key: str) -> Path:
+        return self.root / step / key
+
+    def fetch(self, step: str, key: str, target_dir: Path, link: bool = False) -> bool:
+        """
+        Coloca em `target_dir` os ficheiros de uma entrada; False se a entrada não existir.
+
+        Os ficheiros são copiados; com `link`, são hard links para a própria entrada
+        (só para artefactos que não são editados depois de gerados).
+        """
+        entry = self._entry(step, key)
+        meta_path = entry / "meta.json"
+        if not self.enabled or not meta_path.is_file():
+            return False
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        target_dir.mkdir(parents=True, exist_ok=True)
+        for name in meta["files"]:
+            target = target_dir / name
+            target.unlink(missing_ok=True)
+            if link:
+                try:
+                    os.link(entry / name, target)
+                    continue
+                except OSError:
+                    pass
+            shutil.copy2(entry / name, target)
+        logger.info(f"'{step}' reutilizado da cache ({key[:12]}): {', '.join(meta['files'])}.")
+        return True
+
+    def store(self, step: str, key: str, files: Iterable[Path], options: dict | None = None) -> None:
+        """
+        Guarda os ficheiros gerados por um passo.
+
+        A entrada é montada num diretório temporário e publicada com uma única
+        mudança de nome, com o meta.json presente: outra geração em paralelo vê
+        a entrada completa ou não a vê. Se outra publicar primeiro, fica a dela.
+        """
+        if not self.enabled:
+            return
+        entry = self._entry(step, key)
+        if (entry / "meta.json").is_file():
+            return
+        files = [Path(path) for path in files]
+        tmp_entry = entry.with_name(f"{entry.name}.{os.getpid()}.tmp")
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+        tmp_entry.mkdir(parents=True)
+        for path in files:
+            shutil.copy2(path, tmp_entry / path.name)
+        meta = {"step": step, "key": key, "sumo": sumo_version(), "options": options or {},
+                "files": [path.name for path in files]}
+        with open(tmp_entry / "meta.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=4, ensure_ascii=False, default=str)
+        try:
+            os.replace(tmp_entry, entry)
+        except OSError:
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+            if not (entry / "meta.json").is_file():
+                raise
+        logger.debug(f"'{step}' guardado na cache ({key[:12]}).")
+
+    def entries(self) -> list:
+        """Metadados de todas as entradas completas, com o tamanho em bytes."""
+        result = []
+        for meta_path in sorted(self.root.glob("*/*/meta.json")):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            meta["bytes"] = sum(path.stat().st_size for path in meta_path.parent.iterdir())
+            result.append(meta)
+        return result
+
+    def clear(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+        logger.info(f"Cache de cenários '{self.root}' apagada.")
+
+if __name__ == "__main__":
+    from tcc_sumo.utils.helpers import setup_logging
+    parser = argparse.ArgumentParser(description="Consulta da cache de geração de cenários.")
+    parser.add_argument("--dir", type=Path, default=None, help="Diretório da cache (por omissão, scenarios/.cache).")
+    parser.add_argument("--clear", action="store_true", help="Apaga todas as entradas.")
+    args = parser.parse_args()
+
+    setup_logging()
+    cache = ScenarioCache(args.dir)
+    if args.clear:
+        cache.clear()
+    else:
+        entries = cache.entries()
+        for meta in entries:
+            print(f"{meta['step']:<8} {meta['key'][:12]}  {meta['bytes'] / 1e6:8.1f} MB  {', '.join(meta['files'])}")
+        print(f"{len(entries)} entradas, {sum(meta['bytes'] for meta in entries) / 1e6:.1f} MB em '{cache.root}'.")
@@ -1,17 +1,37 @@
 import os
 import sys
 import json
+import time
 import subprocess
 from pathlib import Path
 import argparse
 import shutil
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tcc_sumo.tools.api_graph import MERGE_TOLERANCE_M, MIN_COMPONENT_NODES, write_plain_xml
+from tcc_sumo.tools.osm_filter import DRIVABLE_HIGHWAYS, filter_osm
+from tcc_sumo.tools.output_formats import OUTPUT_FORMATS, OUTPUT_KINDS, output_file_name
+from tcc_sumo.tools.scenario_cache import ScenarioCache
+from tcc_sumo.tools.trip_generator import generate_routes
 from tcc_sumo.utils.helpers import get_logger, setup_logging, ensure_sumo_home, PROJECT_ROOT
 
 setup_logging()
 logger = get_logger("ScenarioGenerator")
 
+# Opções do netconvert por tipo de cenário (fazem parte da chave da rede na cache).
+NETCONVERT_OPTIONS = {
+    'osm': ['--geometry.remove'],
+    'api': ['--geometry.remove', '--proj.utm', '--roundabouts.guess', '--junctions.join', '--no-turnarounds'],
+}
+# Pré-processamento do grafo da API antes do netconvert (ver api_graph.py).
+API_PREPROCESSING = {"merge_tolerance_m": MERGE_TOLERANCE_M, "min_component_nodes": MIN_COMPONENT_NODES}
+API_REPORT_NAME = "api_preprocessing.json"
+OSM_REPORT_NAME = "osm_filter.json"
+
+def cache_enabled() -> bool:
+    """A cache de geração está ativa, salvo com a variável SCENARIO_CACHE=0."""
+    return os.environ.get('SCENARIO_CACHE', '1') != '0'
+
 def run_simple_command(command):
     # PILAR DE QUALIDADE: Diagnósticabilidade
     # DESCRIÇÃO: Centraliza a execução de comandos externos, capturando as suas
@@ -43,71 +63,88 @@ def run_simple_command(command):
             logger.error(f"Saída STDERR do erro:\n{e.stderr.strip()}")
         raise 
 
-def generate_scenario(scenario_type: str, base_file_path: Path):
+def generate_scenario(scenario_type: str, base_file_path: Path, output_dir: Path | None = None, vehicle_count: int | None = None,
+                      output_format: str | None = None, use_cache: bool | None = None):
     # PILAR DE QUALIDADE: Manutenibilidade
     # DESCRIÇÃO: Orquestra a geração do cenário de forma modular, separando a
     # lógica de criação da malha da geração dos ficheiros de simulação.
-    output_dir = PROJECT_ROOT / "scenarios" / f"from_{scenario_type}"
+    # `output_dir` e `vehicle_count` permitem gerar várias densidades em
+    # diretórios isolados (ex.: pelo experiment_runner); por omissão mantém-se
+    # o diretório 'scenarios/from_<tipo>' e a variável VEHICLE_COUNT.
+    # `output_format` (ou a variável OUTPUT_FORMAT) escolhe o formato dos outputs.
+    # A rede, as rotas e o sumocfg vêm da cache de geração quando as entradas
+    # já foram vistas (ver scenario_cache.py); `use_cache=False` força a geração.
+    output_dir = output_dir or PROJECT_ROOT / "scenarios" / f"from_{scenario_type}"
     if output_dir.exists(): shutil.rmtree(output_dir)
     output_dir.mkdir(parents=True)
     logger.info(f"Diretório de saída para {scenario_type.upper()} limpo e recriado em '{output_dir}'.")
     
     net_file = output_dir / f"{scenario_type}.net.xml"
-    
+    cache = ScenarioCache(enabled=cache_enabled() if use_cache is None else use_cache)
+    net_options = {"type": scenario_type, "netconvert": NETCONVERT_OPTIONS[scenario_type]}
+    if scenario_type == 'api':
+        net_options["preprocessing"] = API_PREPROCESSING
+    else:
+        net_options["highways"] = sorted(DRIVABLE_HIGHWAYS)
+    net_key = cache.key("net", net_options, input_files=[base_file_path])
+    # A rede é partilhada com a cache por hard link (ver scenario_cache.py); rotas e sumocfg são cópias.
+    if not cache.fetch("net", net_key, output_dir, link=True):
+        build_network(scenario_type, base_file_path, output_dir, net_file)
+        cache.store("net", net_key, sorted(output_dir.iterdir()), net_options)
+
+    generate_common_files(output_dir, net_file, scenario_type, vehicle_count, output_format, cache, net_key)
+
+def build_network(scenario_type: str, base_file_path: Path, output_dir: Path, net_file: Path):
+    # PILAR DE QUALIDADE: Modularidade
+    # DESCRIÇÃO: Cria a malha viária com o netconvert a partir do ficheiro de
+    # origem (o OSM diretamente; os dados da API via ficheiros nod/edg).
     if scenario_type == 'osm':
+        # PILAR DE QUALIDADE: Eficiência
+        # DESCRIÇÃO: O netconvert recebe só as vias transitáveis e os seus nós
+        # (ver osm_filter.py); edifícios, POIs e passeios ficam de fora.
+        filtered_file = output_dir / "osm.filtered.osm.xml"
+        report = filter_osm(base_file_path, filtered_file)
+
+        start = time.perf_counter()
         run_simple_command([
             Path(os.environ["SUMO_HOME"]) / 'bin' / 'netconvert',
-            '--osm-files', base_file_path.relative_to(PROJECT_ROOT),
+            '--osm-files', filtered_file.relative_to(PROJECT_ROOT),
             '-o', net_file.relative_to(PROJECT_ROOT), 
-            '--geometry.remove'
+            *NETCONVERT_OPTIONS['osm']
         ])
+        report["netconvert_s"] = round(time.perf_counter() - start, 3)
+        os.remove(filtered_file); logger.debug(f"Ficheiro OSM filtrado intermediário '{filtered_file}' removido.")
+        with open(output_dir / OSM_REPORT_NAME, "w", encoding='utf-8') as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
+        logger.info(f"netconvert concluído em {report['netconvert_s']:.2f}s; relatório em '{OSM_REPORT_NAME}'.")
     elif scenario_type == 'api':
         nodes_file, edges_file = output_dir/"api.nod.xml", output_dir/"api.edg.xml"
         
         logger.info(f"Lendo dados da API de: {base_file_path.name}")
-        with open(base_file_path, "r", encoding='utf-8') as f: data = json.load(f)
-        
-        valid_node_ids = set()
-        with open(nodes_file, "w", encoding='utf-8') as f:
-            f.write('<nodes>\n')
-            for node in data.get("nodes",[]):
-                prop = node.get('properties',{})
-                if "lon" in prop and "lat" in prop:
-                    node_type = "traffic_light" if prop.get("highway")=="traffic_signals" else "priority"
-                    f.write(f'    <node id="{node["id"]}" x="{prop["lon"]}" y="{prop["lat"]}" type="{node_type}"/>\n')
-                    valid_node_ids.add(str(node["id"]))
-            f.write('</nodes>')
-        logger.debug(f"Ficheiro 'nod.xml' criado com {len(valid_node_ids)} nós.")
-        
-        with open(edges_file, "w", encoding='utf-8') as f:
-            f.write('<edges>\n')
-            for edge in data.get("relationships",[]):
-                if str(edge.get('startNodeId')) in valid_node_ids and str(edge.get('endNodeId')) in valid_node_ids:
-                    f.write(f'    <edge id="{edge["id"]}" from="{edge["startNodeId"]}" to="{edge["endNodeId"]}" numLanes="1" speed="13.89"/>\n')
-            f.write('</edges>')
-        logger.debug(f"Ficheiro 'edg.xml' criado.")
+        # Leitura em streaming: a memória fica limitada aos ids dos nós, não ao documento.
+        report = write_plain_xml(base_file_path, nodes_file, edges_file, **API_PREPROCESSING)
         
+        start = time.perf_counter()
         run_simple_command([
             Path(os.environ["SUMO_HOME"]) / 'bin' / 'netconvert',
             '--node-files', nodes_file.relative_to(PROJECT_ROOT),
             '--edge-files', edges_file.relative_to(PROJECT_ROOT),
             '-o', net_file.relative_to(PROJECT_ROOT), 
-            '--geometry.remove',
-            '--proj.utm',
-            '--roundabouts.guess', 
-            '--junctions.join', 
-            '--no-turnarounds' 
+            *NETCONVERT_OPTIONS['api']
         ])
+        report["netconvert_s"] = round(time.perf_counter() - start, 3)
+        with open(output_dir / API_REPORT_NAME, "w", encoding='utf-8') as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
+        logger.info(f"netconvert concluído em {report['netconvert_s']:.2f}s; relatório em '{API_REPORT_NAME}'.")
 
-    generate_common_files(output_dir, net_file, scenario_type)
-
-def generate_common_files(output_dir: Path, net_file: Path, scenario_name: str):
+def generate_common_files(output_dir: Path, net_file: Path, scenario_name: str, vehicle_count: int | None = None,
+                          output_format: str | None = None, cache: ScenarioCache | None = None, net_key: str | None = None):
     # PILAR DE QUALIDADE: Flexibilidade
     # DESCRIÇÃO: A lógica adapta-se à densidade de veículos configurada,
     # permitindo simular cenários de baixo fluxo ou de tráfego intenso.
-    routes_file, trips_file, config_file = (output_dir/f"{scenario_name}.rou.xml", output_dir/f"{scenario_name}.trips.xml", output_dir/f"{scenario_name}.sumocfg")
+    routes_file, config_file = output_dir/f"{scenario_name}.rou.xml", output_dir/f"{scenario_name}.sumocfg"
     
-    num_vehicles = os.environ.get('VEHICLE_COUNT', '50000')
+    num_vehicles = vehicle_count if vehicle_count is not None else os.environ.get('VEHICLE_COUNT', '50000')
     
     insertion_duration = 3600 
     if int(num_vehicles) > 100000:
@@ -116,28 +153,41 @@ def generate_common_files(output_dir: Path, net_file: Path, scenario_name: str):
     period = insertion_duration / int(num_vehicles) if int(num_vehicles) > 0 else 1
     period = max(0.05, period) 
 
-    logger.info(f"Gerando {num_vehicles} veículos para o cenário '{scenario_name}' com período de inserção ~{period:.3f}s.")
-    
-    run_simple_command([
-        "python3", Path(os.environ["SUMO_HOME"])/"tools"/'randomTrips.py',
-        "-n", net_file.relative_to(PROJECT_ROOT),
-        "-r", routes_file.relative_to(PROJECT_ROOT),
-        "-o", trips_file.relative_to(PROJECT_ROOT),
-        "-e", str(num_vehicles),
-        "--period", f"{period:.3f}",
-        "--fringe-factor", "10", 
-        "--validate",
-    ])
-    
-    if trips_file.exists():
-        os.remove(trips_file); logger.debug(f"Ficheiro de trips intermediário '{trips_file}' removido.")
+    # A chave das rotas parte da chave da rede (ou do conteúdo do .net.xml, se chamado diretamente).
+    cache = cache or ScenarioCache(enabled=cache_enabled())
+    net_inputs = {"parent_keys": [net_key]} if net_key else {"input_files": [net_file]}
+    # Mesma semântica do antigo 'randomTrips.py -e <veículos> --validate': '-e' é o instante final das partidas.
+    trip_options = {"end": float(num_vehicles), "period": float(f"{period:.3f}"), "fringe_factor": 10.0, "seed": 42}
+    routes_options = {"name": routes_file.name, "generator": "trip_generator", **trip_options}
+    routes_key = cache.key("routes", routes_options, **net_inputs)
+
+    if not cache.fetch("routes", routes_key, output_dir):
+        logger.info(f"Gerando {num_vehicles} veículos para o cenário '{scenario_name}' com período de inserção ~{period:.3f}s.")
+
+        # PILAR DE QUALIDADE: Escalabilidade
+        # DESCRIÇÃO: O randomTrips.py + duarouter encaminhava cada viagem isoladamente
+        # e não terminava em tempo útil acima de ~100k veículos; o gerador nativo
+        # lê a rede uma vez e calcula uma árvore de caminhos mínimos por origem.
+        generate_routes(net_file, routes_file, **trip_options)
+        cache.store("routes", routes_key, [routes_file], routes_options)
 
+    # PILAR DE QUALIDADE: Eficiência
+    # DESCRIÇÃO: O SUMO escolhe o formato pelo nome do ficheiro: '.gz' comprime em
+    # streaming e '.csv' escreve colunas; o emissions.xml é o maior volume de escrita.
+    output_format = output_format or os.environ.get('OUTPUT_FORMAT', 'xml')
+    config_options = {"name": config_file.name, "net": net_file.name, "routes": routes_file.name, "format": output_format}
+    config_key = cache.key("sumocfg", config_options, parent_keys=[routes_key])
+    if cache.fetch("sumocfg", config_key, output_dir):
+        return
+    outputs = "".join(f'<{option.lstrip("-")} value="{output_file_name(kind, output_format)}"/>'
+                      for kind, (option, _, _) in OUTPUT_KINDS.items())
     config_content = f"""<configuration>
     <input><net-file value="{net_file.name}"/><route-files value="{routes_file.name}"/></input>
-    <output><tripinfo-output value="tripinfo.xml"/><emission-output value="emissions.xml"/><queue-output value="queueinfo.xml"/></output>
+    <output>{outputs}</output>
 </configuration>"""
     with open(config_file, 'w', encoding='utf-8') as f: f.write(config_content)
-    logger.info(f"Ficheiro de configuração '{config_file}' criado.")
+    logger.info(f"Ficheiro de configuração '{config_file}' criado (outputs em '{output_format}').")
+    cache.store("sumocfg", config_key, [config_file], config_options)
 
 if __name__ == "__main__":
     # PILAR DE QUALIDADE: Usabilidade
@@ -146,6 +196,10 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Gerador de Cenários para Simulação de Tráfego SUMO.")
     parser.add_argument("--type", type=str, required=True, choices=['osm', 'api'])
     parser.add_argument("--input", type=str, required=True)
+    parser.add_argument("--output-format", type=str, choices=OUTPUT_FORMATS, default=None,
+                        help="Formato dos outputs do SUMO (por omissão, a variável OUTPUT_FORMAT ou 'xml').")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Gera todos os ficheiros sem consultar a cache de geração (scenarios/.cache).")
     args = parser.parse_args()
     try:
         ensure_sumo_home()
@@ -154,7 +208,7 @@ if __name__ == "__main__":
         logger.info(f"Iniciando geração de cenário do tipo '{args.type}' com o ficheiro de entrada '{args.input}'.")
         if not base_file.exists():
             logger.critical(f"O ficheiro de entrada '{base_file}' não foi encontrado."); sys.exit(1)
-        generate_scenario(args.type, base_file)
+        generate_scenario(args.type, base_file, output_format=args.output_format, use_cache=False if args.no_cache else None)
         logger.info(f"Geração do cenário '{args.type}' concluída com sucesso.")
     except Exception as e:
         logger.critical(f"Erro no pipeline de geração: {e}", exc_info=True); sys.exit(1)
\ No newline at end of file
@@ -1,5 +1,4 @@
 import argparse
-import json
 import re
 from pathlib import Path
 import pandas as pd
@@ -14,11 +13,17 @@ import os
 # forma independente, tornando-o mais versátil e menos propenso a erros de importação.
 try:
     from tcc_sumo.utils.helpers import get_logger, setup_logging, PROJECT_ROOT
+    from tcc_sumo.tools.queue_analyzer import QUEUE_DB_NAME, worst_lanes
+    from tcc_sumo.tools.results_store import ResultsStore, RESULTS_DB_NAME
+    from tcc_sumo.tools.vehicle_results import read_header
 except ImportError:
     # Fallback para execução direta
     src_path = Path(__file__).resolve().parents[2]
     sys.path.insert(0, str(src_path))
     from tcc_sumo.utils.helpers import get_logger, setup_logging, PROJECT_ROOT
+    from tcc_sumo.tools.queue_analyzer import QUEUE_DB_NAME, worst_lanes
+    from tcc_sumo.tools.results_store import ResultsStore, RESULTS_DB_NAME
+    from tcc_sumo.tools.vehicle_results import read_header
 
 setup_logging()
 logger = get_logger("TrafficAnalyzer")
@@ -122,26 +127,26 @@ def generate_traffic_dashboard():
     """Gera o dashboard de análise dos resultados da simulação."""
     logger.info("Iniciando geração do Dashboard de Tráfego.")
     
-    data_path = PROJECT_ROOT / "logs" / "consolidated_data.json"
-    if not data_path.exists():
-        logger.error("Ficheiro 'consolidated_data.json' não encontrado. Execute uma simulação primeiro.")
+    data_path = PROJECT_ROOT / "logs" / RESULTS_DB_NAME
+    if not data_path.exists() and not data_path.with_suffix(".json").exists():
+        logger.error(f"Base de dados '{RESULTS_DB_NAME}' não encontrada. Execute uma simulação primeiro.")
         print("[✗] Ficheiro de dados não encontrado. Execute uma simulação primeiro.")
         return
 
-    with open(data_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-        
-    data_record = data[-1] if isinstance(data, list) and data else {}
+    # Apenas o último registo é lido (pelo índice), não o histórico completo.
+    data_record = ResultsStore(data_path).latest() or {}
     
     metrics = data_record.get("metrics", {})
     pollution = data_record.get("pollution", {})
     queue_metrics = data_record.get("queue_metrics", {})
     
-    raw_data_path = PROJECT_ROOT / "scenarios" / f"from_{data_record.get('scenario')}" / "raw_vehicle_data.json"
-    raw_data = []
-    if raw_data_path.exists():
-        with open(raw_data_path, 'r', encoding='utf-8') as f:
-            raw_data = json.load(f)
+    scenario_dir = PROJECT_ROOT / "scenarios" / f"from_{data_record.get('scenario')}"
+    # Apenas o cabeçalho dos resultados por veículo é lido: o dashboard usa só as contagens.
+    vehicle_header = read_header(scenario_dir) or {"rows": 0, "counts": {"completed": 0, "unfinished": 0}}
+
+    # As piores faixas vêm do índice da análise de filas, sem reler o queueinfo.
+    queue_db_path = scenario_dir / QUEUE_DB_NAME
+    lanes = worst_lanes(queue_db_path, limit=10) if queue_db_path.exists() else []
 
     env = Environment(loader=FileSystemLoader(str(PROJECT_ROOT / "src/tcc_sumo/templates")))
     template = env.get_template("traffic_dashboard.html")
@@ -151,7 +156,9 @@ def generate_traffic_dashboard():
         metrics=metrics,
         pollution=pollution,
         queue_metrics=queue_metrics,
-        vehicle_count=len(raw_data)
+        vehicle_count=vehicle_header["rows"],
+        vehicle_counts=vehicle_header["counts"],
+        worst_lanes=lanes
     )
     
     output_path = PROJECT_ROOT / "output"
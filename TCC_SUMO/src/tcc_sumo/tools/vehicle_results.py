@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Resultados por veículo em formato colunar tipado.
+
+PILAR DE QUALIDADE: Eficiência, Escalabilidade
+DESCRIÇÃO: O antigo raw_vehicle_data.json convertia cada veículo num dicionário
+Python e gravava-o em JSON indentado; o dashboard descodificava o ficheiro
+inteiro apenas para contar os veículos. Aqui cada coluna é um ficheiro .npy
+(os textos codificados por dicionário) num diretório 'vehicle_results/' ao
+lado dos outputs, e um 'header.json' pequeno guarda as contagens. Quem só
+precisa das contagens lê o cabeçalho; quem precisa de dados carrega apenas as
+colunas pedidas, mapeadas em memória.
+"""
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Sequence
+
+import numpy as np
+import pandas as pd
+
+from tcc_sumo.utils.helpers import get_logger
+
+logger = get_logger("VehicleResults")
+
+VEHICLE_RESULTS_DIR = "vehicle_results"
+VEHICLE_RESULTS_VERSION = 1
+# Colunas e tipos ('f8' = real, NaN se ausente; 'i8' = inteiro, -1 se ausente;
+# 'dict' = texto codificado por dicionário em '<coluna>.dict.json').
+VEHICLE_COLUMNS: Dict[str, str] = {
+    "id": "dict", "status": "dict", "depart": "f8", "arrival": "f8", "duration": "f8",
+    "routeLength": "f8", "waitingTime": "f8", "waitingCount": "i8", "timeLoss": "f8",
+    "vType": "dict", "speed_mps": "f8",
+}
+STATUSES = ("completed", "unfinished")
+
+def results_dir_for(output_dir: Path) -> Path:
+    return Path(output_dir) / VEHICLE_RESULTS_DIR
+
+def _column(completed: pd.DataFrame, name: str, kind: str, unfinished_rows: int) -> np.ndarray:
+    """Coluna dos veículos concluídos seguida do valor "ausente" para os não concluídos."""
+    if kind == "i8":
+        values = completed[name].fillna(-1).to_numpy(np.int64) if name in completed else np.full(len(completed), -1)
+        return np.concatenate([values, np.full(unfinished_rows, -1, dtype=np.int64)])
+    values = (pd.to_numeric(completed[name], errors="coerce").to_numpy(np.float64) if name in completed
+              else np.full(len(completed), np.nan))
+    return np.concatenate([values, np.full(unfinished_rows, np.nan)])
+
+def save_vehicle_results(output_dir: Path, completed: pd.DataFrame, unfinished_ids: Sequence[str],
+                         unfinished_durations: np.ndarray) -> Path:
+    """
+    Grava os veículos concluídos (linhas do tripinfo) seguidos dos não concluídos
+    (id e duração observada nas emissões), substituindo resultados anteriores.
+    """
+    directory = results_dir_for(output_dir)
+    tmp_dir = directory.with_name(directory.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    unfinished_rows = len(unfinished_ids)
+    rows = len(completed) + unfinished_rows
+    texts = {
+        "id": np.concatenate([completed["id"].astype(str).to_numpy(object), np.asarray(unfinished_ids, dtype=object)]),
+        "status": np.repeat(np.array(STATUSES, dtype=object), [len(completed), unfinished_rows]),
+        "vType": np.concatenate([completed["vType"].astype(str).to_numpy(object) if "vType" in completed
+                                 else np.full(len(completed), "", dtype=object), np.full(unfinished_rows, "", dtype=object)]),
+    }
+    for name, kind in VEHICLE_COLUMNS.items():
+        if kind == "dict":
+            codes, dictionary = pd.factorize(texts[name])
+            np.save(tmp_dir / f"{name}.npy", codes.astype(np.int32))
+            with open(tmp_dir / f"{name}.dict.json", "w", encoding="utf-8") as f:
+                json.dump(list(dictionary), f, ensure_ascii=False)
+        else:
+            column = _column(completed, name, kind, unfinished_rows)
+            if name == "duration":
+                column[len(completed):] = unfinished_durations
+            np.save(tmp_dir / f"{name}.npy", column)
+
+    header = {
+        "format_version": VEHICLE_RESULTS_VERSION, "rows": rows,
+        "counts": {"completed": len(completed), "unfinished": unfinished_rows},
+        "columns": VEHICLE_COLUMNS,
+    }
+    # header.json é gravado por último: a sua presença marca os resultados como completos.
+    with open(tmp_dir / "header.json", "w", encoding="utf-8") as f:
+        json.dump(header, f, indent=4)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_dir, directory)
+    return directory
+
+def read_header(output_dir: Path) -> dict | None:
+    """Cabeçalho (número de veículos e contagens por estado), sem ler as colunas."""
+    header_path = results_dir_for(output_dir) / "header.json"
+    if not header_path.is_file():
+        return None
+    with open(header_path, "r", encoding="utf-8") as f:
+        header = json.load(f)
+    return header if header.get("format_version") == VEHICLE_RESULTS_VERSION else None
+
+def load_vehicle_results(output_dir: Path, columns: Sequence[str] | None = None, mmap: bool = True) -> pd.DataFrame:
+    """
+    Carrega apenas as colunas pedidas (todas por omissão).
+
+    Com `mmap`, as colunas numéricas ficam mapeadas em memória (só as páginas
+    acedidas são lidas); as de texto vêm como pd.Categorical sobre o dicionário.
+    """
+    header = read_header(output_dir)
+    if header is None:
+        raise FileNotFoundError(f"Resultados por veículo não encontrados em '{results_dir_for(output_dir)}'.")
+    names = list(header["columns"]) if columns is None else list(columns)
+    unknown = set(names) - set(header["columns"])
+    if unknown:
+        raise ValueError(f"Colunas desconhecidas nos resultados por veículo: {sorted(unknown)}")
+    directory = results_dir_for(output_dir)
+    data = {}
+    for name in names:
+        values = np.load(directory / f"{name}.npy", mmap_mode="r" if mmap else None)
+        if header["columns"][name] == "dict":
+            with open(directory / f"{name}.dict.json", "r", encoding="utf-8") as f:
+                dictionary = json.load(f)
+            values = pd.Categorical.from_codes(np.asarray(values), categories=pd.Index(dictionary, dtype=object))
+        data[name] = values
+    return pd.DataFrame(data, copy=False)
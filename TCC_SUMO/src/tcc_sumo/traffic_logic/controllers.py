@@ -8,13 +8,24 @@ específicas para cada modo de controlo, facilitando a adição de novas lógica
 """
 
 import traci
-from typing import List, Dict, Any, Set
+import traci.constants as tc
+from array import array
+from dataclasses import dataclass
+from typing import List, Dict, Any, Tuple
 from abc import ABC, abstractmethod
 from tcc_sumo.utils.helpers import get_logger
 
 logger = get_logger("TrafficController")
 
+# Resultado vazio partilhado para elementos sem dados de subscrição no passo.
+_NO_RESULT: Dict[int, Any] = {}
+
 class BaseController(ABC):
+    # Ponto de diagnosticabilidade: número de chamadas bloqueantes ao TraCI
+    # feitas pelo controlador no último passo (exposto nos logs de progresso).
+    traci_calls_last_step: int = 0
+    traci_calls_total: int = 0
+
     @abstractmethod
     def setup(self):
         pass
@@ -23,6 +34,23 @@ class BaseController(ABC):
     def manage_traffic_lights(self, step: int) -> None:
         pass
 
+    def next_wakeup_step(self, step: int) -> int | None:
+        """
+        Devolve o primeiro passo (>= `step`) em que o controlador precisa de atuar,
+        ou None se não precisar de voltar a atuar. O SimulationManager avança a
+        simulação diretamente até esse passo. Por omissão, atua em todos os passos.
+        """
+        return step
+
+    def get_state(self) -> Dict[str, Any]:
+        """Estado interno serializável (JSON) gravado nos checkpoints da simulação."""
+        return {'traci_calls_total': self.traci_calls_total}
+
+    def set_state(self, state: Dict[str, Any]) -> None:
+        """Restaura o estado gravado por `get_state`. Chamado depois de `setup()`."""
+        # Soma às chamadas já feitas neste processo (o setup da retoma também conta).
+        self.traci_calls_total += state.get('traci_calls_total', 0)
+
 class StaticController(BaseController):
     """
     Controlador para o modo Estático. Não realiza ações, pois os tempos
@@ -35,6 +63,69 @@ class StaticController(BaseController):
         # Ponto de eficiência: Nenhuma chamada ao TraCI é necessária a cada passo.
         pass
 
+    def next_wakeup_step(self, step: int) -> int | None:
+        # Os tempos são geridos pelo SUMO: o controlador nunca precisa de acordar.
+        return None
+
+@dataclass(frozen=True)
+class CompiledTrafficLight:
+    """
+    Representação pré-compilada e imutável do programa de um semáforo.
+
+    PILAR DE QUALIDADE: Eficiência
+    DESCRIÇÃO: Tudo o que depende apenas da lógica do semáforo (lanes verdes de
+    cada fase, próxima fase verde, durações) é calculado uma única vez. O ciclo
+    de decisão passa a fazer apenas indexação em arrays, sem construir conjuntos
+    nem percorrer as strings de estado das fases.
+    """
+    program_id: str
+    logic_hash: int
+    num_phases: int
+    is_green: bytes                   # 1 se a fase contém algum sinal verde
+    green_lanes: Tuple[array, ...]    # índices (na tabela de lanes) das lanes verdes por fase
+    next_green: array                 # próxima fase verde de cada fase (-1 se não existir)
+    min_durations: array
+    max_durations: array
+
+def logic_signature(logic, links) -> int:
+    """Calcula o hash que identifica o conteúdo de uma lógica e das suas ligações."""
+    phases = tuple((p.state, p.duration, p.minDur, p.maxDur) for p in logic.phases)
+    lanes = tuple(tuple(link[0] for link in group) for group in links)
+    return hash((logic.programID, phases, lanes))
+
+def compile_traffic_light(logic, links, lane_index: Dict[str, int], logic_hash: int) -> CompiledTrafficLight:
+    """Compila a lógica de um semáforo, registando novas lanes em `lane_index`."""
+    num_phases = len(logic.phases)
+    is_green = bytes(1 if 'g' in phase.state.lower() else 0 for phase in logic.phases)
+
+    green_lanes = []
+    for phase in logic.phases:
+        indices = set()
+        for i, link_group in enumerate(links):
+            if i < len(phase.state) and phase.state[i].lower() == 'g':
+                for link in link_group:
+                    indices.add(lane_index.setdefault(link[0], len(lane_index)))
+        green_lanes.append(array('i', sorted(indices)))
+
+    next_green = array('i', [-1] * num_phases)
+    for current_index in range(num_phases):
+        for i in range(1, num_phases):
+            next_index = (current_index + i) % num_phases
+            if is_green[next_index]:
+                next_green[current_index] = next_index
+                break
+
+    return CompiledTrafficLight(
+        program_id=logic.programID,
+        logic_hash=logic_hash,
+        num_phases=num_phases,
+        is_green=is_green,
+        green_lanes=tuple(green_lanes),
+        next_green=next_green,
+        min_durations=array('d', (phase.minDur for phase in logic.phases)),
+        max_durations=array('d', (phase.maxDur for phase in logic.phases)),
+    )
+
 class AdaptiveController(BaseController):
     """
     Controlador Adaptativo que ajusta os semáforos com base no fluxo de tráfego.
@@ -48,61 +139,173 @@ class AdaptiveController(BaseController):
         # podem desestabilizar o trânsito e causar congestionamento.
         self.traffic_light_ids: List[str] = []
         self.traffic_light_states: Dict[str, Dict[str, Any]] = {}
+        # Programa compilado de cada semáforo e tabela de lanes subscritas no SUMO
+        # (a posição de cada lane em `lane_ids` é o índice usado pelos programas).
+        self.programs: Dict[str, CompiledTrafficLight | None] = {}
+        self.lane_ids: List[str] = []
+        self.lane_index: Dict[str, int] = {}
+        self._compiled_cache: Dict[int, CompiledTrafficLight] = {}
         self.SWITCH_THRESHOLD = switch_threshold
         self.MIN_PHASE_TIME = min_phase_time
         logger.info(f"Controlador Adaptativo instanciado com limiar de troca de {switch_threshold} veículos e tempo mínimo de fase de {min_phase_time}s.")
 
     def setup(self):
+        # PILAR DE QUALIDADE: Eficiência
+        # DESCRIÇÃO: Em vez de consultar o SUMO semáforo a semáforo e lane a lane
+        # em cada passo, o controlador subscreve uma única vez as variáveis de que
+        # precisa. O SUMO devolve os resultados agregados junto com a resposta do
+        # simulationStep(), e cada passo passa a ler apenas esse snapshot local.
         try:
+            self.traci_calls_last_step = 0
             self.traffic_light_ids = traci.trafficlight.getIDList()
+            # getIDList e, por semáforo, getPhase, subscribe e getProgram.
+            setup_calls = 1 + 3 * len(self.traffic_light_ids)
             for tl_id in self.traffic_light_ids:
                 self.traffic_light_states[tl_id] = {
                     'current_phase_index': traci.trafficlight.getPhase(tl_id),
-                    'last_phase_change_step': 0
+                    'last_phase_change_step': 0,
+                    'program_id': None
                 }
-            logger.info(f"Controlador Adaptativo configurado para {len(self.traffic_light_ids)} semáforos.")
+                traci.trafficlight.subscribe(tl_id, [tc.TL_CURRENT_PROGRAM])
+                self._load_program(tl_id, traci.trafficlight.getProgram(tl_id))
+            # As chamadas de `_load_program` ficam em traci_calls_last_step, que o primeiro passo reinicia.
+            self.traci_calls_total += setup_calls + self.traci_calls_last_step
+            self.traci_calls_last_step = 0
+            logger.info(f"Controlador Adaptativo configurado para {len(self.traffic_light_ids)} semáforos "
+                        f"({len(self.lane_ids)} lanes subscritas, {len(self._compiled_cache)} programas compilados).")
         except traci.TraCIException as e:
             logger.critical(f"Falha CRÍTICA ao configurar o AdaptiveController: {e}")
             raise
 
+    def get_state(self) -> Dict[str, Any]:
+        state = super().get_state()
+        state['traffic_light_states'] = {
+            tl_id: {key: tl_state[key] for key in ('current_phase_index', 'last_phase_change_step')}
+            for tl_id, tl_state in self.traffic_light_states.items()
+        }
+        return state
+
+    def set_state(self, state: Dict[str, Any]) -> None:
+        # O programa ativo vem do estado do SUMO (já lido no setup); só a memória
+        # de decisão do controlador precisa de ser restaurada.
+        super().set_state(state)
+        for tl_id, saved in state.get('traffic_light_states', {}).items():
+            if tl_id in self.traffic_light_states:
+                self.traffic_light_states[tl_id].update(saved)
+
+    @staticmethod
+    def state_from_sumo(step: int) -> Dict[str, Any]:
+        """
+        Estado de `get_state` reconstruído a partir do SUMO no fim do passo `step`,
+        para checkpoints gravados sem controlador (ex.: o aquecimento partilhado).
+        O início de cada fase vem de getSpentDuration; com o valor por omissão (0),
+        todas as fases verdes pareceriam ter excedido o tempo máximo na retoma.
+        """
+        dt = traci.simulation.getDeltaT()
+        return {'traffic_light_states': {
+            tl_id: {'current_phase_index': traci.trafficlight.getPhase(tl_id),
+                    'last_phase_change_step': step - round(traci.trafficlight.getSpentDuration(tl_id) / dt)}
+            for tl_id in traci.trafficlight.getIDList()
+        }}
+
+    def _load_program(self, tl_id: str, program_id: str) -> None:
+        """
+        Compila o programa ativo de um semáforo e subscreve as lanes novas.
+
+        A compilação é reutilizada quando o hash da lógica coincide com um
+        programa já compilado, pelo que só há trabalho quando a lógica muda de facto.
+        """
+        logics = traci.trafficlight.getAllProgramLogics(tl_id)
+        links = traci.trafficlight.getControlledLinks(tl_id) or []
+        self.traci_calls_last_step += 2
+        self.traffic_light_states[tl_id]['program_id'] = program_id
+        if not logics:
+            self.programs[tl_id] = None
+            return
+
+        logic = next((l for l in logics if l.programID == program_id), logics[0])
+        logic_hash = logic_signature(logic, links)
+        compiled = self._compiled_cache.get(logic_hash)
+        if compiled is None:
+            compiled = compile_traffic_light(logic, links, self.lane_index, logic_hash)
+            self._compiled_cache[logic_hash] = compiled
+            for lane in self.lane_index.keys() - set(self.lane_ids):
+                traci.lane.subscribe(lane, [tc.LAST_STEP_VEHICLE_HALTING_NUMBER])
+                self.traci_calls_last_step += 1
+            # `lane_ids` segue a ordem dos índices atribuídos em `lane_index`.
+            self.lane_ids = sorted(self.lane_index, key=self.lane_index.get)
+        self.programs[tl_id] = compiled
+
+    def _switch_program(self, tl_id: str, program_id: str, step: int) -> None:
+        """
+        Troca de programa detetada na subscrição: compila o novo programa e
+        ressincroniza a fase com o SUMO, porque o índice da fase do programa
+        anterior pode não existir (ou ser outra fase) no novo.
+        """
+        self._load_program(tl_id, program_id)
+        state = self.traffic_light_states[tl_id]
+        state['current_phase_index'] = traci.trafficlight.getPhase(tl_id)
+        state['last_phase_change_step'] = step
+        self.traci_calls_last_step += 1
+
+    def next_wakeup_step(self, step: int) -> int | None:
+        # Só há decisão a tomar em fases verdes que já cumpriram MIN_PHASE_TIME;
+        # as restantes fases não mudam sem uma troca feita pelo próprio controlador.
+        wakeup = None
+        for tl_id in self.traffic_light_ids:
+            program = self.programs.get(tl_id)
+            state = self.traffic_light_states[tl_id]
+            if program is None or not program.is_green[state['current_phase_index']]:
+                continue
+            eligible = state['last_phase_change_step'] + self.MIN_PHASE_TIME
+            if eligible <= step:
+                return step
+            wakeup = eligible if wakeup is None else min(wakeup, eligible)
+        return wakeup
+
     def manage_traffic_lights(self, step: int) -> None:
+        self.traci_calls_last_step = 0
         if not self.traffic_light_ids:
             return
 
+        # Snapshot dos resultados das subscrições (sem ida e volta ao socket).
+        tl_results = traci.trafficlight.getAllSubscriptionResults()
+        lane_results = traci.lane.getAllSubscriptionResults()
+        halting = [lane_results.get(lane, _NO_RESULT).get(tc.LAST_STEP_VEHICLE_HALTING_NUMBER, 0) for lane in self.lane_ids]
+
         for tl_id in self.traffic_light_ids:
             try:
                 state = self.traffic_light_states[tl_id]
-                logics = traci.trafficlight.getAllProgramLogics(tl_id)
-                if not logics: continue
+                program_id = tl_results.get(tl_id, _NO_RESULT).get(tc.TL_CURRENT_PROGRAM)
+                if program_id is not None and program_id != state['program_id']:
+                    logger.debug(f"Semáforo {tl_id}: programa alterado para '{program_id}'. A recompilar lógica.")
+                    self._switch_program(tl_id, program_id, step)
+
+                program = self.programs[tl_id]
+                if program is None: continue
 
-                current_logic = logics[0]
                 current_phase_index = state['current_phase_index']
-                current_phase = current_logic.phases[current_phase_index]
                 time_in_phase = step - state['last_phase_change_step']
 
-                is_green_phase = 'g' in current_phase.state.lower()
-
                 # --- REVISÃO 2: LÓGICA DE DECISÃO MAIS ROBUSTA ---
                 # A IA só atua em fases verdes e após um tempo mínimo ter passado.
                 # A fase amarela é inviolável para garantir a segurança.
-                if not is_green_phase or time_in_phase < self.MIN_PHASE_TIME:
+                if not program.is_green[current_phase_index] or time_in_phase < self.MIN_PHASE_TIME:
                     continue
 
                 should_switch = False
                 # 1. Forçar a troca se o tempo máximo da fase for atingido.
-                if time_in_phase > current_phase.maxDur:
+                if time_in_phase > program.max_durations[current_phase_index]:
                     should_switch = True
                     logger.debug(f"Semáforo {tl_id}: Troca forçada por tempo máximo atingido ({time_in_phase}s).")
                 else:
                     # 2. Avaliar a troca com base na procura.
-                    green_lanes = self._get_green_lanes_for_phase(tl_id, current_phase_index)
-                    cars_on_green = sum(traci.lane.getLastStepHaltingNumber(lane) for lane in green_lanes)
+                    cars_on_green = sum(halting[i] for i in program.green_lanes[current_phase_index])
 
                     # Analisa a procura na PRÓXIMA fase que tiver um sinal verde
-                    next_green_phase_index = self._find_next_green_phase(current_logic, current_phase_index)
-                    if next_green_phase_index is not None:
-                        next_green_lanes = self._get_green_lanes_for_phase(tl_id, next_green_phase_index)
-                        cars_on_next = sum(traci.lane.getLastStepHaltingNumber(lane) for lane in next_green_lanes)
+                    next_green_phase_index = program.next_green[current_phase_index]
+                    if next_green_phase_index >= 0:
+                        cars_on_next = sum(halting[i] for i in program.green_lanes[next_green_phase_index])
 
                         # Troca apenas se a próxima fase tiver uma procura significativamente maior.
                         if cars_on_next > cars_on_green + self.SWITCH_THRESHOLD:
@@ -112,33 +315,13 @@ class AdaptiveController(BaseController):
                             logger.debug(f"Semáforo {tl_id}: Decidiu estender. Procura atual: {cars_on_green}.")
 
                 if should_switch:
-                    next_phase_index = (current_phase_index + 1) % len(current_logic.phases)
+                    next_phase_index = (current_phase_index + 1) % program.num_phases
                     traci.trafficlight.setPhase(tl_id, next_phase_index)
+                    self.traci_calls_last_step += 1
                     state['current_phase_index'] = next_phase_index
                     state['last_phase_change_step'] = step
 
             except traci.TraCIException as e:
                 logger.error(f"Erro ao controlar semáforo {tl_id} no passo {step}: {e}")
 
-    def _find_next_green_phase(self, logic, current_index: int) -> int | None:
-        """Encontra o índice da próxima fase que contenha um sinal verde."""
-        num_phases = len(logic.phases)
-        for i in range(1, num_phases):
-            next_index = (current_index + i) % num_phases
-            if 'g' in logic.phases[next_index].state.lower():
-                return next_index
-        return None
-
-    def _get_green_lanes_for_phase(self, tl_id: str, phase_index: int) -> List[str]:
-        lanes: Set[str] = set()
-        links = traci.trafficlight.getControlledLinks(tl_id)
-        if not links: return []
-
-        program_logic = traci.trafficlight.getAllProgramLogics(tl_id)[0]
-        phase_state = program_logic.phases[phase_index].state
-
-        for i, link_group in enumerate(links):
-            if i < len(phase_state) and phase_state[i].lower() in ('g', 'G'):
-                for link in link_group:
-                    lanes.add(link[0]) # Adiciona a lane de origem
-        return list(lanes)
\ No newline at end of file
+        self.traci_calls_total += self.traci_calls_last_step
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Motor de decisão adaptativo vetorizado para a rede inteira.
+
+PILAR DE QUALIDADE: Escalabilidade
+DESCRIÇÃO: Em vez de percorrer os semáforos um a um em Python, este motor mantém
+uma matriz de incidência lane→fase (em formato CSR) de todos os cruzamentos. Em
+cada passo junta os veículos parados de todas as lanes num único vetor NumPy e
+calcula todas as decisões de troca de uma só vez: procura no verde atual, procura
+no próximo verde e as máscaras de tempo mínimo/máximo de fase. As regras são
+exatamente as do AdaptiveController, pelo que as decisões são idênticas.
+"""
+
+import numpy as np
+import traci
+import traci.constants as tc
+
+from tcc_sumo.traffic_logic.controllers import AdaptiveController, _NO_RESULT
+from tcc_sumo.utils.helpers import get_logger
+
+logger = get_logger("TrafficController")
+
+class VectorizedAdaptiveController(AdaptiveController):
+    """
+    AdaptiveController com o ciclo de decisão vetorizado sobre todos os semáforos.
+
+    Reutiliza a compilação dos programas (CompiledTrafficLight) e as subscrições
+    do AdaptiveController; apenas o cálculo por passo é substituído.
+    """
+    def setup(self):
+        super().setup()
+        self._build_network_index()
+        logger.info(f"Motor vetorizado: {len(self._row_is_green) - 1} fases e {len(self.lane_ids)} lanes "
+                    f"em {len(self._lane_entries)} entradas de incidência.")
+
+    def set_state(self, state: dict) -> None:
+        super().set_state(state)
+        self._build_network_index()
+
+    def _build_network_index(self) -> None:
+        """Concatena os programas compilados de todos os semáforos em arrays globais."""
+        tl_count = len(self.traffic_light_ids)
+        phase_offset = np.zeros(tl_count, dtype=np.int64)
+        num_phases = np.zeros(tl_count, dtype=np.int64)
+        is_green, max_durations, next_green_row = [], [], []
+        entry_rows, entry_lanes = [], []
+
+        row = 0
+        for t, tl_id in enumerate(self.traffic_light_ids):
+            program = self.programs.get(tl_id)
+            if program is None:
+                phase_offset[t] = -1  # aponta para a linha vazia no fim
+                continue
+            phase_offset[t] = row
+            num_phases[t] = program.num_phases
+            for phase_index in range(program.num_phases):
+                is_green.append(program.is_green[phase_index])
+                max_durations.append(program.max_durations[phase_index])
+                next_index = program.next_green[phase_index]
+                next_green_row.append(row + next_index if next_index >= 0 else -1)
+                lanes = program.green_lanes[phase_index]
+                entry_rows.extend([row + phase_index] * len(lanes))
+                entry_lanes.extend(lanes)
+            row += program.num_phases
+
+        # Linha extra, nunca verde, para semáforos sem lógica.
+        is_green.append(0); max_durations.append(0.0); next_green_row.append(-1)
+        phase_offset[phase_offset < 0] = row
+
+        self._phase_offset = phase_offset
+        self._num_phases = num_phases
+        self._row_is_green = np.array(is_green, dtype=bool)
+        self._row_max_duration = np.array(max_durations, dtype=np.float64)
+        self._row_next_green = np.array(next_green_row, dtype=np.int64)
+        # Matriz de incidência em CSR "achatado": cada entrada liga uma linha (fase) a uma lane.
+        self._entry_rows = np.array(entry_rows, dtype=np.int64)
+        self._lane_entries = np.array(entry_lanes, dtype=np.int64)
+
+        # O estado por semáforo passa a viver em arrays; o dicionário continua sincronizado.
+        self._current_phase = np.array([self.traffic_light_states[tl]['current_phase_index']
+                                        for tl in self.traffic_light_ids], dtype=np.int64)
+        self._last_change = np.array([self.traffic_light_states[tl]['last_phase_change_step']
+                                      for tl in self.traffic_light_ids], dtype=np.int64)
+
+    def _current_rows(self) -> np.ndarray:
+        """Linha global da fase atual de cada semáforo."""
+        # Semáforos sem lógica (num_phases == 0) apontam sempre para a linha vazia.
+        return self._phase_offset + np.where(self._num_phases > 0, self._current_phase, 0)
+
+    def next_wakeup_step(self, step: int) -> int | None:
+        in_green = self._row_is_green[self._current_rows()]
+        if not in_green.any():
+            return None
+        return max(step, int((self._last_change[in_green] + self.MIN_PHASE_TIME).min()))
+
+    def manage_traffic_lights(self, step: int) -> None:
+        self.traci_calls_last_step = 0
+        if not self.traffic_light_ids:
+            return
+
+        tl_results = traci.trafficlight.getAllSubscriptionResults()
+        changed = [tl_id for tl_id, result in tl_results.items()
+                   if result.get(tc.TL_CURRENT_PROGRAM) not in (None, self.traffic_light_states[tl_id]['program_id'])]
+        if changed:
+            for tl_id in changed:
+                logger.debug(f"Semáforo {tl_id}: programa alterado. A recompilar lógica.")
+                try:
+                    # Ressincroniza a fase com o SUMO: o índice antigo apontaria para linhas de outro semáforo.
+                    self._switch_program(tl_id, tl_results[tl_id][tc.TL_CURRENT_PROGRAM], step)
+                except traci.TraCIException as e:
+                    logger.error(f"Erro ao recompilar o semáforo {tl_id} no passo {step}: {e}")
+            self._build_network_index()
+
+        lane_results = traci.lane.getAllSubscriptionResults()
+        halting = np.fromiter(
+            (lane_results.get(lane, _NO_RESULT).get(tc.LAST_STEP_VEHICLE_HALTING_NUMBER, 0) for lane in self.lane_ids),
+            dtype=np.float64, count=len(self.lane_ids))
+        # Procura (veículos parados nas lanes verdes) de todas as fases de todos os semáforos.
+        demand = np.bincount(self._entry_rows, weights=halting[self._lane_entries],
+                             minlength=len(self._row_is_green))
+
+        current_row = self._current_rows()
+        time_in_phase = step - self._last_change
+
+        active = self._row_is_green[current_row] & (time_in_phase >= self.MIN_PHASE_TIME)
+        forced = active & (time_in_phase > self._row_max_duration[current_row])
+        next_row = self._row_next_green[current_row]
+        has_next = next_row >= 0
+        cars_on_green = demand[current_row]
+        cars_on_next = np.where(has_next, demand[np.maximum(next_row, 0)], 0.0)
+        by_demand = active & ~forced & has_next & (cars_on_next > cars_on_green + self.SWITCH_THRESHOLD)
+
+        for t in np.flatnonzero(forced | by_demand):
+            tl_id = self.traffic_light_ids[t]
+            if by_demand[t]:
+                logger.info(f"Semáforo {tl_id}: Decidiu trocar. Procura atual: {int(cars_on_green[t])}, "
+                            f"Próxima procura: {int(cars_on_next[t])}.")
+            else:
+                logger.debug(f"Semáforo {tl_id}: Troca forçada por tempo máximo atingido ({time_in_phase[t]}s).")
+            next_phase_index = int((self._current_phase[t] + 1) % self._num_phases[t])
+            try:
+                traci.trafficlight.setPhase(tl_id, next_phase_index)
+                self.traci_calls_last_step += 1
+            except traci.TraCIException as e:
+                logger.error(f"Erro ao controlar semáforo {tl_id} no passo {step}: {e}")
+                continue
+            self._current_phase[t] = next_phase_index
+            self._last_change[t] = step
+            state = self.traffic_light_states[tl_id]
+            state['current_phase_index'] = next_phase_index
+            state['last_phase_change_step'] = step
+
+        self.traci_calls_total += self.traci_calls_last_step
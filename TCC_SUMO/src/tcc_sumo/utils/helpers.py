@@ -2,6 +2,8 @@
 import logging
 import logging.config
 import os
+import socket
+import sys
 import json
 from pathlib import Path
 
@@ -52,6 +54,36 @@ def ensure_sumo_home():
         logger.critical(error_msg)
         raise EnvironmentError(error_msg)
 
+TRACI_BACKENDS = ('socket', 'libsumo')
+
+def select_traci_backend(backend: str, sumo_executable: str) -> None:
+    # PILAR DE QUALIDADE: Eficiência
+    # DESCRIÇÃO: Com o backend 'libsumo' o SUMO corre dentro do próprio processo
+    # Python, eliminando a serialização e a latência do socket em cada chamada
+    # TraCI. O pacote `traci` decide a implementação no momento do primeiro
+    # import (variável LIBSUMO_AS_TRACI), por isso esta função tem de ser chamada
+    # antes de qualquer módulo que importe `traci`.
+    logger = get_logger("SUMO_CHECK")
+    if backend not in TRACI_BACKENDS:
+        raise ValueError(f"Backend TraCI '{backend}' inválido. Opções: {', '.join(TRACI_BACKENDS)}.")
+    if backend == 'libsumo':
+        if 'gui' in Path(sumo_executable).name.lower():
+            error_msg = (f"O backend 'libsumo' não suporta o modo gráfico ('{sumo_executable}'). "
+                         "Use 'sumo_executable: \"sumo\"' ou o backend 'socket'.")
+            logger.critical(error_msg)
+            raise ValueError(error_msg)
+        if 'traci' in sys.modules and 'LIBSUMO_AS_TRACI' not in os.environ:
+            raise RuntimeError("O módulo 'traci' já foi importado com o backend 'socket'; "
+                               "selecione o backend antes de importar o SimulationManager.")
+        os.environ['LIBSUMO_AS_TRACI'] = 'quiet'
+    logger.info(f"Backend TraCI selecionado: '{backend}'.")
+
+def find_free_port() -> int:
+    """Pede ao sistema operativo uma porta TCP livre (para execuções TraCI em paralelo)."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
 def format_time(seconds: float) -> str:
     # PILAR DE QUALIDADE: Usabilidade
     # DESCRIÇÃO: Converte dados numéricos numa representação compreensível